@@ -0,0 +1,95 @@
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .fastpath import read_plan
+from .pagination import KeysetPagination
+from .sparse import field_spec
+
+ARCHIVE_MODES = ('exclude', 'include', 'only')
+
+
+class ArchiveMixin:
+    """
+    ViewSet mixin reading archived rows when asked to: ``?archived=include``
+    lists them together with the live ones, in one ordering and pagination,
+    and ``?archived=only`` reads nothing else. Without the parameter, and
+    for every other action, only the live table is used.
+    """
+    archive_queryset = None
+    archive_serializer_class = None
+    archive_param = 'archived'
+    archive_actions = ('list', 'retrieve')
+
+    def archive_mode(self):
+        if self.action not in self.archive_actions:
+            return 'exclude'
+        mode = self.request.query_params.get(self.archive_param) or 'exclude'
+        if mode not in ARCHIVE_MODES:
+            raise serializers.ValidationError({self.archive_param: [f"Expected one of: {', '.join(ARCHIVE_MODES)}."]})
+        return mode
+
+    def use_archive(self):
+        self.queryset = self.archive_queryset
+        self.serializer_class = self.archive_serializer_class
+
+    def list(self, request, *args, **kwargs):
+        mode = self.archive_mode()
+        if mode == 'include':
+            return self.list_with_archive(request)
+        if mode == 'only':
+            self.use_archive()
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        mode = self.archive_mode()
+        if mode == 'include':
+            try:
+                return super().retrieve(request, *args, **kwargs)
+            except Http404:
+                pass
+        if mode != 'exclude':
+            self.use_archive()
+        return super().retrieve(request, *args, **kwargs)
+
+    def list_with_archive(self, request):
+        sources = []
+        for archived in (False, True):
+            if archived:
+                self.use_archive()
+            serializer_class = self.get_serializer_class()
+            plan = read_plan(serializer_class, field_spec(request))
+            sources.append((plan, serializer_class, self.filter_queryset(self.get_queryset())))
+
+        paginator = self.paginator
+        pages = None
+        if isinstance(paginator, KeysetPagination):
+            pages = [paginator.page_queryset(queryset, request) for _, _, queryset in sources]
+        if pages is None or pages[0] is None:
+            data = []
+            for plan, serializer_class, queryset in sources:
+                if plan is not None:
+                    data.extend(plan.read(queryset))
+                else:
+                    data.extend(self.render_rows(plan, serializer_class, queryset))
+            return Response(data)
+
+        keys = [field.attname for field in paginator.fields]
+        fetched = [
+            plan.fetch(page, keys) if plan is not None else list(page)
+            for (plan, _, _), page in zip(sources, pages)
+        ]
+        origin = {id(row): i for i, rows in enumerate(fetched) for row in rows}
+        rows = paginator.paginate_rows(paginator.merge_rows(*fetched))
+        data = [None] * len(rows)
+        for i, (plan, serializer_class, _) in enumerate(sources):
+            positions = [n for n, row in enumerate(rows) if origin[id(row)] == i]
+            rendered = self.render_rows(plan, serializer_class, [rows[n] for n in positions])
+            for n, item in zip(positions, rendered):
+                data[n] = item
+        return paginator.get_paginated_response(data)
+
+    def render_rows(self, plan, serializer_class, rows, queryset=None):
+        if plan is not None:
+            return plan.render(rows, queryset)
+        return serializer_class(rows, many=True, context=self.get_serializer_context()).data
@@ -0,0 +1,129 @@
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.views import View
+from graphene_django.views import GraphQLView, HttpError
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from orders.loaders import AsyncLoaders
+from orders.models import Customer, Product, Order
+
+from .documents import PreparedQueryMixin
+from .filters import ORDER_FILTERS, apply_query_filters
+from .pagination import KeysetPagination, OrderPagination
+from .queryplan import plan_queryset
+from .serializers import CustomerSerializer, ProductSerializer, OrderSerializer
+from .sparse import field_spec
+
+# Rows per round trip when streaming an unpaginated list out of the cursor
+ASYNC_CHUNK_SIZE = 2000
+
+
+class AsyncReadView(View):
+    """
+    Async list/retrieve for a model, answering with the same JSON as the
+    DRF viewset. Rows come from the async ORM with the serializer's query
+    plan applied, so serializing them never touches the database and the
+    event loop is free while a query runs.
+    """
+    model = None
+    serializer_class = None
+    query_filters = {}
+    pagination_class = KeysetPagination
+
+    async def get(self, request, pk=None):
+        request = Request(request)
+        context = {'request': request, 'view': self, 'field_spec': field_spec(request)}
+        # the cursor is read off the last row
+        required = [name.lstrip('-') for name in self.pagination_class.ordering]
+        try:
+            queryset = plan_queryset(self.model.objects.all(), self.serializer_class, required, context)
+        except serializers.ValidationError as exc:
+            return self.render(exc.detail, 400)
+        if pk is not None:
+            try:
+                obj = await queryset.aget(pk=pk)
+            except self.model.DoesNotExist:
+                return self.render({'detail': f'No {self.model._meta.object_name} matches the given query.'}, 404)
+            return self.render(self.serializer_class(obj, context=context).data)
+
+        try:
+            queryset = apply_query_filters(queryset, request.query_params, self.query_filters)
+        except serializers.ValidationError as exc:
+            return self.render(exc.detail, 400)
+        paginator = self.pagination_class()
+        try:
+            page = await paginator.apaginate_queryset(queryset, request)
+        except NotFound as exc:
+            return self.render({'detail': exc.detail}, 404)
+        if page is not None:
+            data = self.serializer_class(page, many=True, context=context).data
+            return self.render(paginator.get_paginated_response(data).data)
+        rows = [row async for row in queryset.aiterator(chunk_size=ASYNC_CHUNK_SIZE)]
+        return self.render(self.serializer_class(rows, many=True, context=context).data)
+
+    def render(self, data, status=200):
+        return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+class AsyncCustomerView(AsyncReadView):
+    model = Customer
+    serializer_class = CustomerSerializer
+
+
+class AsyncProductView(AsyncReadView):
+    model = Product
+    serializer_class = ProductSerializer
+
+
+class AsyncOrderView(AsyncReadView):
+    model = Order
+    serializer_class = OrderSerializer
+    query_filters = ORDER_FILTERS
+    pagination_class = OrderPagination
+
+
+class AsyncGraphQLView(PreparedQueryMixin, GraphQLView):
+    """
+    GraphQLView executing queries on the event loop: resolvers get
+    AsyncLoaders, which batch each level into one async ORM query.
+    """
+    view_is_async = True
+
+    def get_context(self, request):
+        request.loaders = AsyncLoaders()
+        return request
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ('get', 'post'):
+                raise HttpError(HttpResponseNotAllowed(['GET', 'POST'], 'GraphQL only supports GET and POST requests.'))
+            data = self.parse_body(request)
+            result, status_code = await self.aget_response(request, data)
+            return HttpResponse(status=status_code, content=result, content_type='application/json')
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(request, {'errors': [self.format_error(e)]})
+            return response
+
+    async def aget_response(self, request, data):
+        # a persisted query hash may be looked up in the database
+        query, variables, operation_name, _ = await sync_to_async(self.get_graphql_params)(request, data)
+        execution_result = self.execute_graphql_request(request, data, query, variables, operation_name)
+        if isawaitable(execution_result):
+            execution_result = await execution_result
+
+        response, status_code = {}, 200
+        if execution_result.errors:
+            response['errors'] = [self.format_error(e) for e in execution_result.errors]
+        if execution_result.errors and any(not getattr(e, 'path', None) for e in execution_result.errors):
+            status_code = 400
+        else:
+            response['data'] = execution_result.data
+        return self.json_encode(request, response), status_code
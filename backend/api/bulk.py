@@ -0,0 +1,141 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from orders.signals import post_bulk_write, pre_bulk_write
+
+BULK_BATCH_SIZE = 500
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that first looks in objects preloaded by a
+    BulkListSerializer, so validating N rows does not run N lookups.
+    """
+    prefetched = None
+
+    def to_internal_value(self, data):
+        if self.prefetched is not None and not isinstance(data, bool):
+            obj = self.prefetched.get(str(data))
+            if obj is not None:
+                return obj
+        return super().to_internal_value(data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    many=True serializer that resolves foreign keys with one query per
+    relation and writes with bulk_create/bulk_update.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.prefetch_related_fields(data)
+        return super().to_internal_value(data)
+
+    def prefetch_related_fields(self, data):
+        for name, field in self.child.fields.items():
+            if field.read_only or not isinstance(field, PrefetchedPrimaryKeyRelatedField):
+                continue
+            queryset = field.get_queryset()
+            pk_field = queryset.model._meta.pk
+            pks = set()
+            for row in data:
+                if not isinstance(row, dict) or isinstance(row.get(name), bool):
+                    continue
+                try:
+                    pks.add(pk_field.to_python(row.get(name)))
+                except DjangoValidationError:
+                    pass
+            pks.discard(None)
+            field.prefetched = {str(pk): obj for pk, obj in queryset.in_bulk(pks).items()}
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            if not hasattr(self, '_instances'):
+                self._instances = {str(obj.pk): obj for obj in self.instance}
+                self._matched, self._seen = [], set()
+            key = str(data.get('id')) if isinstance(data, dict) else None
+            if key not in self._instances:
+                raise serializers.ValidationError({'id': ['Unknown or missing id.']})
+            if key in self._seen:
+                raise serializers.ValidationError({'id': ['Duplicate id.']})
+            self._seen.add(key)
+            self.child.instance = self._instances[key]
+            self._matched.append(self.child.instance)
+        return super().run_child_validation(data)
+
+    @transaction.atomic
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        objs = []
+        for attrs in validated_data:
+            attrs.pop('id', None)
+            objs.append(model(**attrs))
+        objs = model.objects.bulk_create(objs, batch_size=BULK_BATCH_SIZE)
+        post_bulk_write.send(sender=model, instances=objs)
+        return objs
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        model = self.child.Meta.model
+        now = timezone.now()
+        # bulk_update skips pre_save, so auto_now columns are stamped by hand
+        auto_now = [f.name for f in model._meta.concrete_fields if getattr(f, 'auto_now', False)]
+        fields = set(auto_now)
+        for obj, attrs in zip(self._matched, validated_data):
+            attrs.pop('id', None)
+            for attr, value in attrs.items():
+                setattr(obj, attr, value)
+            for name in auto_now:
+                setattr(obj, name, now)
+            fields.update(attrs)
+        pre_bulk_write.send(sender=model, instances=self._matched)
+        model.objects.bulk_update(self._matched, sorted(fields), batch_size=BULK_BATCH_SIZE)
+        post_bulk_write.send(sender=model, instances=self._matched)
+        return self._matched
+
+
+class BulkDestroySerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+
+class BulkModelMixin:
+    """
+    ViewSet mixin adding bulk writes: POST a list to the list route (or to
+    ``bulk/``) to create many rows, PUT/PATCH a list of rows with ids to
+    ``bulk/`` to update them, and DELETE ``{"ids": [...]}`` to ``bulk/``.
+    """
+    def get_serializer(self, *args, **kwargs):
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=False, methods=['post', 'put', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        if request.method == 'POST':
+            return self.create(request)
+        if request.method == 'DELETE':
+            return self.bulk_destroy(request)
+        return self.bulk_update(request, partial=request.method == 'PATCH')
+
+    @transaction.atomic
+    def bulk_update(self, request, partial=False):
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError({'non_field_errors': ['Expected a list of items.']})
+        ids = {str(row.get('id')) for row in request.data if isinstance(row, dict)}
+        ids = [pk for pk in ids if pk.isdigit()]
+        instances = self.get_queryset().filter(pk__in=ids)
+        serializer = self.get_serializer(instances, data=request.data, many=True, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
+    @transaction.atomic
+    def bulk_destroy(self, request):
+        serializer = BulkDestroySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.get_queryset().filter(pk__in=serializer.validated_data['ids']).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
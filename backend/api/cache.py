@@ -0,0 +1,116 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from graphene_django.views import GraphQLView
+
+from orders.models import Customer, Product, Order, OrderItem
+from orders.versions import get_versions
+
+from .documents import PreparedQueryMixin
+from .replicas import on_primary, used_replica
+
+
+def _enabled():
+    return bool(settings.RESPONSE_CACHE_TIMEOUT)
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _timeout():
+    # a replica may not have replayed the write that bumped the versions yet
+    if used_replica():
+        return min(settings.RESPONSE_CACHE_TIMEOUT, settings.DATABASE_STICKY_SECONDS)
+    return settings.RESPONSE_CACHE_TIMEOUT
+
+
+def _fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+class CachedResponseMixin:
+    """
+    ViewSet mixin caching rendered list/retrieve responses.
+
+    Entries are keyed on the request and on the data versions of
+    ``cache_models``, which model signals bump on every write, so any change
+    to those tables is a miss. The same fingerprint is sent as a weak ETag
+    on responses read from the primary, and a matching If-None-Match is
+    answered with a 304 before any database or cache work beyond the
+    version lookup.
+    """
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not _enabled():
+            return handler(request, *args, **kwargs)
+
+        fingerprint = _fingerprint(
+            request.get_full_path(), request.accepted_media_type, get_versions(self.cache_models)
+        )
+        etag = 'W/' + quote_etag(fingerprint)
+        if_none_match = request.headers.get('If-None-Match', '')
+        # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+        if if_none_match.strip() == '*' or etag[2:] in {e.removeprefix('W/') for e in parse_etags(if_none_match)}:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        cache = _cache()
+        key = f'response:{fingerprint}'
+        # a client that has just written skips entries a replica may have filled
+        hit = None if on_primary() else cache.get(key)
+        if hit is not None:
+            content, content_type, from_replica = hit
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            # render now so the bytes, not the serializer output, are cached
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            from_replica = used_replica()
+            cache.set(key, (response.content, response['Content-Type'], from_replica), _timeout())
+        # a replica may not have replayed the write that bumped the versions,
+        # so what it rendered gets no ETag to keep revalidating stale rows with
+        if not from_replica:
+            response['ETag'] = etag
+        return response
+
+
+class CachedGraphQLView(PreparedQueryMixin, GraphQLView):
+    """
+    GraphQLView that caches successful results per query, variables and
+    operation, keyed on the data versions of every model in the schema.
+    """
+    cache_models = (Customer, Product, Order, OrderItem)
+
+    def get_response(self, request, data, show_graphiql=False):
+        if show_graphiql or not _enabled():
+            return super().get_response(request, data, show_graphiql)
+
+        query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        key = 'graphql:' + _fingerprint(query, variables, operation_name, get_versions(self.cache_models))
+        cache = _cache()
+        hit = None if on_primary() else cache.get(key)
+        if hit is not None:
+            return hit, 200
+
+        result, status_code = super().get_response(request, data, show_graphiql)
+        if status_code == 200 and result and '"errors":' not in result:
+            cache.set(key, result, _timeout())
+        return result, status_code
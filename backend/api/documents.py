@@ -0,0 +1,77 @@
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed
+from graphene_django.views import HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast
+
+from orders.documents import check_limits, persisted, prepare, query_hash
+
+from .replicas import read_from_replicas
+
+
+class PreparedQueryMixin:
+    """
+    GraphQLView mixin running queries from the document cache, accepting
+    persisted query hashes and refusing queries over the depth and cost
+    limits before they run. Queries read from a replica, mutations do not.
+    """
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+        entry = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+        sha = entry.get('sha256Hash') if isinstance(entry, dict) else None
+        if sha and query:
+            if query_hash(query) != sha:
+                raise HttpError(HttpResponseBadRequest('The sha256Hash does not match the query.'))
+        elif sha:
+            query = persisted.get(sha)
+            if query is None:
+                # the client sends the text along on its next try
+                raise HttpError(HttpResponse(), 'PersistedQueryNotFound')
+        if query and (sha or settings.GRAPHQL_PERSISTED_ONLY):
+            sha = sha or query_hash(query)
+            if settings.GRAPHQL_PERSISTED_ONLY and persisted.get(sha) is None:
+                raise HttpError(HttpResponseBadRequest('Only persisted queries are accepted.'))
+            persisted.remember(sha, query)
+        return query, variables, operation_name, id
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        if not query:
+            return super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        schema = self.schema.graphql_schema
+        rules = tuple(self.validation_rules) if self.validation_rules else None
+        document, errors = prepare(schema, query, rules)
+        if errors:
+            return ExecutionResult(data=None, errors=list(errors))
+
+        operation = get_operation_ast(document, operation_name)
+        if operation is not None:
+            if request.method.lower() == 'get' and operation.operation != OperationType.QUERY:
+                if show_graphiql:
+                    return None
+                raise HttpError(HttpResponseNotAllowed(
+                    ['POST'], f'Can only perform a {operation.operation.value} operation from a POST request.',
+                ))
+            errors = check_limits(schema, document, operation, variables)
+            if errors:
+                return ExecutionResult(data=None, errors=errors)
+            if operation.operation == OperationType.QUERY:
+                read_from_replicas()
+        try:
+            return execute(
+                schema, document,
+                root_value=self.get_root_value(request),
+                context_value=self.get_context(request),
+                variable_values=variables,
+                operation_name=operation_name,
+                middleware=self.get_middleware(request),
+                execution_context_class=self.execution_context_class,
+            )
+        except Exception as exc:
+            return ExecutionResult(errors=[exc])
@@ -0,0 +1,19 @@
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from orders.lifecycle import InvalidTransition
+from orders.stock import InsufficientStock
+
+
+def exception_handler(exc, context):
+    """
+    DRF exception handler that also answers domain errors raised below the
+    serializers, which would otherwise surface as a 500.
+    """
+    if isinstance(exc, InsufficientStock):
+        return Response({'detail': str(exc), 'products': exc.product_ids}, status=status.HTTP_409_CONFLICT)
+    if isinstance(exc, InvalidTransition):
+        # the order moved under the request, past what the serializer checked
+        return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+    return drf_exception_handler(exc, context)
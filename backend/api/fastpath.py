@@ -0,0 +1,384 @@
+import decimal
+from datetime import timedelta, timezone as dt_timezone
+from functools import lru_cache
+from itertools import chain
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.sql.constants import MULTI
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+from .pagination import KeysetPagination
+from .sparse import field_spec
+
+ZERO_OFFSET = timedelta(0)
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _decimal(field):
+    coerce = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce or field.localize or field.normalize_output or field.decimal_places is None:
+        return _fallback(field)
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.Context(prec=field.max_digits) if field.max_digits is not None else None
+    rounding = field.rounding
+
+    def convert(value, tz):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f'{value.quantize(quantum, rounding=rounding, context=context):f}'
+
+    def decoder(model_field, connection):
+        # SQLite hands out floats, which its converter quantizes to the
+        # column's places; with the field's places and digits the same,
+        # that quantize is the one convert would make
+        if (
+            connection.vendor != 'sqlite' or rounding is not None
+            or (model_field.decimal_places, model_field.max_digits) != (field.decimal_places, field.max_digits)
+        ):
+            return None
+        create_decimal = decimal.Context(prec=15).create_decimal_from_float
+        model_context = model_field.context
+
+        def decode(value, tz):
+            return f'{create_decimal(value).quantize(quantum, context=model_context):f}'
+        return decode
+    convert.decoder = decoder
+    return convert
+
+
+def _datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if hasattr(field, 'timezone') or not settings.USE_TZ or output_format is None or output_format.lower() != ISO_8601:
+        return _fallback(field)
+
+    def convert(value, tz):
+        if value.tzinfo is not tz:
+            if value.utcoffset() is None:
+                return field.to_representation(value)
+            value = value.astimezone(tz)
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+    def decoder(model_field, connection):
+        # SQLite hands out naive datetimes in the connection's time zone,
+        # which its converter makes aware
+        if connection.vendor != 'sqlite' or connection.timezone is not dt_timezone.utc:
+            return None
+        make_aware = connection.ops.convert_datetimefield_value
+
+        def decode(value, tz):
+            if tz is dt_timezone.utc and value.tzinfo is None:
+                return value.isoformat() + 'Z'
+            return convert(make_aware(value, None, connection), tz)
+        return decode
+    convert.decoder = decoder
+    return convert
+
+
+def _fallback(field):
+    def convert(value, tz):
+        return field.to_representation(value)
+    return convert
+
+
+# serializer field classes whose to_representation leaves database values
+# as they are
+_AS_IS = (serializers.IntegerField, serializers.CharField, serializers.ChoiceField)
+
+
+def _converter(field):
+    if isinstance(field, serializers.DecimalField):
+        return _decimal(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime(field)
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        if field.pk_field is not None:
+            raise Unsupported(field)
+        return None
+    if isinstance(field, serializers.BooleanField):
+        # to_representation maps the accepted spellings onto bools
+        return _fallback(field)
+    if type(field).to_representation is not serializers.CharField.to_representation and isinstance(field, serializers.CharField):
+        return _fallback(field)
+    if isinstance(field, _AS_IS):
+        return None
+    if isinstance(field, serializers.RelatedField) or isinstance(field, serializers.BaseSerializer):
+        raise Unsupported(field)
+    return _fallback(field)
+
+
+def _column(model, field):
+    """
+    The values() path of a field's source, following forward relations that
+    cannot be null, and the model field it ends at.
+    """
+    current, parts = model, []
+    attrs = field.source_attrs
+    for i, name in enumerate(attrs):
+        try:
+            attr = current._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise Unsupported(field)
+        if attr.many_to_many or attr.one_to_many or (attr.is_relation and not attr.concrete):
+            raise Unsupported(field)
+        parts.append(name)
+        if attr.is_relation:
+            if i < len(attrs) - 1 and attr.null:
+                raise Unsupported(field)
+            current = attr.related_model
+    if attr.is_relation and not isinstance(field, serializers.PrimaryKeyRelatedField):
+        raise Unsupported(field)
+    return '__'.join(parts), attr
+
+
+class ReadPlan:
+    """
+    A ModelSerializer's list output computed from values() rows: each field
+    is a column read and, where DRF would reformat the value, a converter
+    reproducing its to_representation. Reverse relations serialized with
+    many=True are fetched in one query per level and grouped in Python.
+
+    read() goes one step further for whole lists: it renders straight from
+    the rows the database driver returns, letting a converter that knows
+    the backend decode a column in place of the backend's converter.
+    """
+    def __init__(self, model, serializer):
+        self.model = model
+        self.pk = model._meta.pk.attname
+        self.fields = []
+        self.nested = []
+        self.decoders = {}
+        self.readers = {}
+        columns = {self.pk}
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+                raise Unsupported(field)
+            if isinstance(field, serializers.ListSerializer):
+                self.fields.append((name, None, None, len(self.nested)))
+                self.nested.append(self.child(field))
+                continue
+            column, model_field = _column(model, field)
+            convert = _converter(field)
+            if hasattr(convert, 'decoder') and column not in columns:
+                self.decoders[column] = convert.decoder, model_field
+            else:
+                # a column more than one field reads stays converted
+                self.decoders.pop(column, None)
+            columns.add(column)
+            self.fields.append((name, column, convert, None))
+        self.columns = sorted(columns)
+        self.rows = _compile(self.fields, self.pk)
+
+    def child(self, field):
+        if not isinstance(field.child, serializers.ModelSerializer):
+            raise Unsupported(field)
+        try:
+            related = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise Unsupported(field)
+        if not related.one_to_many:
+            raise Unsupported(field)
+        plan = ReadPlan(related.related_model, field.child)
+        fk = related.field.name
+        plan.columns = sorted(set(plan.columns) | {fk})
+        ordering = related.related_model._meta.ordering or [related.related_model._meta.pk.name]
+        return fk, ordering, plan
+
+    def fetch(self, queryset, extra=()):
+        return list(queryset.prefetch_related(None).values(*self.columns, *extra))
+
+    def render(self, rows, queryset=None, tz=None):
+        """
+        The serializer's output for ``rows``. Nested rows are looked up by
+        the parents' ids, or through ``queryset`` when it is the unsliced
+        queryset the rows came from, which saves sending every id back.
+        """
+        tz = _render_timezone(tz)
+        keys = self.keys(queryset, lambda: [row[self.pk] for row in rows])
+        return self.rows(rows, tz, self.groups(keys, tz))
+
+    def read(self, queryset, tz=None):
+        """
+        The serializer's output for the whole of ``queryset``, the same as
+        render(fetch(queryset), queryset).
+        """
+        return self.read_rows(queryset, _render_timezone(tz))[1]
+
+    def read_rows(self, queryset, tz, key=None):
+        """
+        The values of the column ``key``, the primary key by default, and
+        the output, for the rows of ``queryset``.
+        """
+        values = queryset.prefetch_related(None).values(*self.columns)
+        query = values.query
+        compiler = query.get_compiler(values.db)
+        results = compiler.execute_sql(MULTI)
+        names = [*query.extra_select, *query.values_select, *query.annotation_select]
+        reader = self.reader(compiler.connection, names)
+        converters = compiler.get_converters([select[0] for select in compiler.select[:compiler.col_count]])
+        for i in reader.decoded:
+            converters.pop(i, None)
+        rows = chain.from_iterable(results)
+        if converters:
+            rows = compiler.apply_converters(rows, converters)
+        rows = list(rows)
+        position = names.index(key or self.pk)
+        keys = self.keys(queryset, lambda: [row[position] for row in rows])
+        return [row[position] for row in rows], reader.rows(rows, tz, self.groups(keys, tz, read=True))
+
+    def reader(self, connection, names):
+        """
+        The rows function for tuples of ``names`` read off ``connection``,
+        and the positions it decodes from the driver's values itself.
+        """
+        key = connection.alias, tuple(names)
+        if key not in self.readers:
+            decoders = {}
+            for column, (decoder, model_field) in self.decoders.items():
+                decode = decoder(model_field, connection)
+                if decode is not None:
+                    decoders[column] = decode
+            positions = {name: i for i, name in enumerate(names)}
+            rows = _compile(self.fields, self.pk, positions, decoders)
+            self.readers[key] = _Reader(rows, {positions[column] for column in decoders})
+        return self.readers[key]
+
+    def keys(self, queryset, ids):
+        if not self.nested:
+            return None
+        if queryset is not None and not queryset.query.is_sliced:
+            return queryset.values(self.pk)
+        return ids()
+
+    def groups(self, keys, tz, read=False):
+        groups = []
+        for fk, ordering, plan in self.nested:
+            children = plan.model.objects.filter(**{f'{fk}__in': keys}).order_by(*ordering)
+            if read:
+                parents, data = plan.read_rows(children, tz, fk)
+            else:
+                rows = plan.fetch(children)
+                parents, data = [row[fk] for row in rows], plan.render(rows, tz=tz)
+            grouped = {}
+            for parent, item in zip(parents, data):
+                grouped.setdefault(parent, []).append(item)
+            groups.append(grouped)
+        return groups
+
+
+class _Reader:
+    __slots__ = ('rows', 'decoded')
+
+    def __init__(self, rows, decoded):
+        self.rows = rows
+        self.decoded = decoded
+
+
+def _render_timezone(tz):
+    if tz is None:
+        tz = timezone.get_current_timezone()
+        if tz.utcoffset(None) == ZERO_OFFSET:
+            # database backends hand out datetimes in dt_timezone.utc;
+            # leaving them there skips an astimezone() per value
+            tz = dt_timezone.utc
+    return tz
+
+
+def _compile(fields, pk, positions=None, decoders=None):
+    """
+    A function building the output dicts of a list of rows, generated from
+    the plan's fields so the per-field work is a dict display instead of a
+    loop over the plan. With ``positions``, the rows are tuples with each
+    column at its position, and columns in ``decoders`` are decoded from the
+    driver's values.
+    """
+    namespace, items = {}, []
+    decoders = decoders or {}
+    for i, (name, column, convert, nested) in enumerate(fields):
+        if nested is not None:
+            key = pk if positions is None else positions[pk]
+            items.append(f'{name!r}: groups[{nested}].get(row[{key!r}], [])')
+            continue
+        key = column if positions is None else positions[column]
+        convert = decoders.get(column, convert)
+        if convert is None:
+            items.append(f'{name!r}: row[{key!r}]')
+        else:
+            namespace[f'convert{i}'] = convert
+            items.append(f'{name!r}: None if (value := row[{key!r}]) is None else convert{i}(value, tz)')
+    source = 'def rows(rows, tz, groups):\n    return [{%s} for row in rows]\n' % ', '.join(items)
+    exec(compile(source, '<read plan>', 'exec'), namespace)
+    return namespace['rows']
+
+
+# plans are also kept per field spec, which requests choose
+READ_PLAN_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=READ_PLAN_CACHE_SIZE)
+def read_plan(serializer_class, spec=None):
+    """
+    The ReadPlan of a ModelSerializer class, trimmed to the FieldSpec
+    ``spec``, or None when one of its fields needs the full serializer.
+    """
+    if not issubclass(serializer_class, serializers.ModelSerializer):
+        return None
+    try:
+        return ReadPlan(serializer_class.Meta.model, serializer_class(context={'field_spec': spec}))
+    except Unsupported:
+        return None
+
+
+class FastListMixin:
+    """
+    ViewSet mixin answering list requests from values() rows through the
+    serializer's ReadPlan, with the same output as the serializer. Views
+    whose serializer or paginator the plan cannot follow use the regular
+    list.
+    """
+    def list(self, request, *args, **kwargs):
+        plan = read_plan(self.get_serializer_class(), field_spec(request))
+        paginator = self.paginator
+        if plan is None or (paginator is not None and not isinstance(paginator, KeysetPagination)):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = paginator.page_queryset(queryset, request) if paginator is not None else None
+        if page is None:
+            return Response(plan.read(queryset))
+        keys = [plan.model._meta.get_field(name.lstrip('-')).attname for name in paginator.ordering]
+        rows = paginator.paginate_rows(plan.fetch(page, keys))
+        return paginator.get_paginated_response(plan.render(rows))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer producing the same bytes from one shared encoder per
+    configuration instead of building a new one for every response.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = _encoder(self.encoder_class, self.ensure_ascii, self.strict, self.compact).encode(data)
+        return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+@lru_cache(maxsize=None)
+def _encoder(encoder_class, ensure_ascii, strict, compact):
+    return encoder_class(
+        ensure_ascii=ensure_ascii, allow_nan=not strict,
+        separators=SHORT_SEPARATORS if compact else LONG_SEPARATORS,
+    )
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.renderers import JSONRenderer
+
+from orders import outbox
+from orders.models import Product, Order, OrderItem
+
+FEED_TOPICS = tuple(outbox.topic(model) for model in (Order, OrderItem, Product))
+FEED_PAGE_SIZE = 100
+FEED_MAX_PAGE_SIZE = 1000
+# the longest a request waits for new events, and how often it looks
+FEED_MAX_WAIT = 30
+FEED_POLL_INTERVAL = 1
+# how long an event stream stays open before the client reconnects
+FEED_STREAM_SECONDS = 30
+
+
+def _number(params, name, default, maximum):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number.")
+    if value < 0:
+        raise ValueError(f"{name} must not be negative.")
+    return min(value, maximum)
+
+
+@sync_to_async
+def _read(after, topics, limit):
+    outbox.relay_all()
+    return list(outbox.feed(after, topics, limit))
+
+
+class ChangeFeedView(View):
+    """
+    The outbox as a change feed: the events after sequence ``after``, oldest
+    first, filtered by ``topic`` (a comma-separated list of order, orderitem
+    and product). Consumers resume from the ``last`` sequence of the previous
+    response, so each change is read once instead of rescanning the lists.
+
+    With ``wait`` seconds the request is held open until events arrive or the
+    wait runs out. With ``Accept: text/event-stream`` the events are sent as
+    server-sent events for FEED_STREAM_SECONDS, resuming from Last-Event-ID
+    when the client reconnects.
+    """
+    async def get(self, request):
+        params = request.GET
+        try:
+            after = _number(params, 'after', 0, float('inf'))
+            limit = _number(params, 'limit', FEED_PAGE_SIZE, FEED_MAX_PAGE_SIZE) or FEED_PAGE_SIZE
+            wait = _number(params, 'wait', 0, FEED_MAX_WAIT)
+        except ValueError as exc:
+            return self.render({'detail': str(exc)}, 400)
+        topics = [t for t in params.get('topic', '').split(',') if t]
+        unknown = set(topics) - set(FEED_TOPICS)
+        if unknown:
+            return self.render({'detail': f"Unknown topic {', '.join(sorted(unknown))}; use {', '.join(FEED_TOPICS)}."}, 400)
+
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            last_id = request.headers.get('Last-Event-ID', '')
+            if last_id.isdigit():
+                after = int(last_id)
+            seconds = FEED_STREAM_SECONDS if params.get('wait') in (None, '') else wait
+            response = StreamingHttpResponse(self.stream(after, topics, limit, seconds), content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            return response
+
+        deadline = time.monotonic() + wait
+        events = await _read(after, topics, limit)
+        while not events and time.monotonic() < deadline:
+            await asyncio.sleep(FEED_POLL_INTERVAL)
+            events = await _read(after, topics, limit)
+        last = events[-1]['sequence'] if events else after
+        next_url = None
+        if len(events) == limit:
+            query = params.copy()
+            query['after'] = last
+            next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+        return self.render({'events': events, 'last': last, 'next': next_url})
+
+    async def stream(self, after, topics, limit, seconds):
+        yield f'retry: {FEED_POLL_INTERVAL * 1000}\n\n'
+        deadline = time.monotonic() + seconds
+        while True:
+            events = await _read(after, topics, limit)
+            for event in events:
+                after = event['sequence']
+                data = json.dumps(event, cls=DjangoJSONEncoder, separators=(',', ':'))
+                yield f"id: {after}\nevent: {event['topic']}\ndata: {data}\n\n"
+            if time.monotonic() >= deadline:
+                return
+            if len(events) < limit:
+                # a comment, so proxies see traffic and the client a live stream
+                yield ': keepalive\n\n'
+                await asyncio.sleep(min(FEED_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+
+    def render(self, data, status=200):
+        return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
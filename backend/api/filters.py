@@ -0,0 +1,130 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+
+from orders.modelconfig import ORDER_STATUS, SHIPPING_METHODS
+
+
+def _int(value):
+    return int(value)
+
+
+def _statuses(value):
+    statuses = [s for s in value.split(',') if s]
+    valid = {choice for choice, _ in ORDER_STATUS}
+    if not statuses or not set(statuses) <= valid:
+        raise ValueError
+    return statuses
+
+
+def _shipping_methods(value):
+    methods = [m for m in value.split(',') if m]
+    valid = {choice for choice, _ in SHIPPING_METHODS}
+    if not methods or not set(methods) <= valid:
+        raise ValueError
+    return methods
+
+
+def _day(value):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError
+    return day
+
+
+def _moment(value, end=False):
+    day = parse_date(value)
+    if day is not None:
+        # a bare date_to covers the whole of that day
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _date_from(value):
+    return _moment(value)
+
+
+def _date_to(value):
+    return _moment(value, end=True)
+
+
+def _orders_with_product(queryset, value):
+    # the items of the queryset's model, which may be the archived orders
+    items = queryset.model._meta.get_field('items').related_model
+    return queryset.filter(pk__in=items.objects.filter(product=value).values('order'))
+
+
+ORDER_FILTERS = {
+    'customer': ('customer', _int),
+    'product': (_orders_with_product, _int),
+    'status': ('status__in', _statuses),
+    'date_from': ('date_and_time__gte', _date_from),
+    'date_to': ('date_and_time__lt', _date_to),
+    'since': ('updated_at__gt', _date_from),
+}
+
+ORDER_ITEM_FILTERS = {
+    'order': ('order', _int),
+    'order_id': ('order', _int),
+    'product': ('product', _int),
+    'product_id': ('product', _int),
+    'status': ('order__status__in', _statuses),
+    'date_from': ('order__date_and_time__gte', _date_from),
+    'date_to': ('order__date_and_time__lt', _date_to),
+}
+
+# over the daily rollups, so dates are whole days and date_to is inclusive
+ANALYTICS_FILTERS = {
+    'status': ('status__in', _statuses),
+    'shipping_method': ('shipping_method__in', _shipping_methods),
+    'date_from': ('day__gte', _day),
+    'date_to': ('day__lte', _day),
+}
+
+
+def apply_query_filters(queryset, params, filters):
+    """
+    Narrow a queryset by the query string parameters named in ``filters``,
+    a mapping of param -> (lookup or callable, parser). Unparseable values
+    are reported back as a 400 rather than silently ignored.
+    """
+    errors = {}
+    for param, (lookup, parse) in filters.items():
+        value = params.get(param)
+        if value in (None, ''):
+            continue
+        try:
+            value = parse(value)
+        except ValueError:
+            errors[param] = [f"Invalid value: {params[param]!r}"]
+            continue
+        if callable(lookup):
+            queryset = lookup(queryset, value)
+        else:
+            queryset = queryset.filter(**{lookup: value})
+    if errors:
+        raise serializers.ValidationError(errors)
+    return queryset
+
+
+class QueryFilterMixin:
+    """
+    ViewSet mixin applying ``query_filters`` to the ``query_filter_actions``
+    endpoints.
+    """
+    query_filters = {}
+    query_filter_actions = ('list',)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in self.query_filter_actions:
+            return queryset
+        return apply_query_filters(queryset, self.request.query_params, self.query_filters)
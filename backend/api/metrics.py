@@ -0,0 +1,278 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as Tally
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+# Request metrics kept in process memory and served as Prometheus text on
+# /metrics. Each worker process has its own counts, so scrape every worker
+# (Prometheus sums them) rather than one behind a load balancer.
+
+logger = logging.getLogger('api.metrics')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+DEPTH_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+_current = ContextVar('request_stats', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=('route',)):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.series = {}
+        REGISTRY.append(self)
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        with self.lock:
+            series = sorted(self.series.items())
+        for key, value in series:
+            lines.extend(self.samples(list(zip(self.labels, key)), value))
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def samples(self, labels, value):
+        yield f'{self.name}{_labels(labels)} {value}'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=('route',)):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labels)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self, labels, value):
+        counts, total, count = value
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            yield f'{self.name}_bucket{_labels(labels + [("le", bound)])} {cumulative}'
+        yield f'{self.name}_bucket{_labels(labels + [("le", "+Inf")])} {count}'
+        yield f'{self.name}_sum{_labels(labels)} {total}'
+        yield f'{self.name}_count{_labels(labels)} {count}'
+
+
+REGISTRY = []
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Request latency until the response is ready.',
+    LATENCY_BUCKETS, ('route', 'method', 'status'),
+)
+REQUEST_QUERIES = Histogram('http_request_sql_queries', 'SQL statements run per request.', COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram('http_request_sql_seconds', 'Time per request spent in SQL.', LATENCY_BUCKETS)
+REQUEST_SERIALIZE_SECONDS = Histogram(
+    'http_request_serialize_seconds',
+    'Time from the view starting to the rendered response, outside SQL: serializers, resolvers and rendering.',
+    LATENCY_BUCKETS,
+)
+GRAPHQL_DEPTH = Histogram('graphql_resolver_depth', 'Deepest field resolved per GraphQL request.', DEPTH_BUCKETS)
+GRAPHQL_RESOLVERS = Histogram('graphql_resolver_calls', 'Fields resolved per GraphQL request.', COUNT_BUCKETS)
+SLOW_QUERIES = Counter('sql_slow_queries_total', 'SQL statements slower than SLOW_QUERY_SECONDS.')
+REPEATED_QUERIES = Counter(
+    'sql_repeated_queries_total', 'SQL statements run N_PLUS_ONE_THRESHOLD or more times in one request.'
+)
+
+# bind parameter lists whose length varies with the data
+_PARAM_LIST = re.compile(r'\((?:%s, )*%s\)(?:, \((?:%s, )*%s\))*')
+
+
+def query_shape(sql):
+    """
+    The statement with its variable-length parameter lists collapsed, so the
+    same query over a different number of rows has the same shape.
+    """
+    return _PARAM_LIST.sub('(...)', sql)
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.shapes = Tally()
+        self.slow = []
+        self.view_started = None
+        self.view_sql_seconds = 0.0
+        self.depth = 0
+        self.resolvers = 0
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.sql_seconds += seconds
+        self.shapes[query_shape(sql)] += 1
+        if seconds >= settings.SLOW_QUERY_SECONDS:
+            self.slow.append((seconds, sql))
+
+    def report(self, route, method=None, status=None):
+        """
+        Record this request's numbers under ``route`` and log its slow and
+        repeated queries.
+        """
+        elapsed = time.perf_counter() - self.started
+        if method is not None:
+            REQUEST_SECONDS.observe(elapsed, route=route, method=method, status=status)
+        REQUEST_QUERIES.observe(self.queries, route=route)
+        REQUEST_SQL_SECONDS.observe(self.sql_seconds, route=route)
+        if self.view_started is not None:
+            python = time.perf_counter() - self.view_started - (self.sql_seconds - self.view_sql_seconds)
+            REQUEST_SERIALIZE_SECONDS.observe(max(python, 0), route=route)
+        if self.resolvers:
+            GRAPHQL_DEPTH.observe(self.depth, route=route)
+            GRAPHQL_RESOLVERS.observe(self.resolvers, route=route)
+        for seconds, sql in self.slow:
+            SLOW_QUERIES.inc(route=route)
+            logger.warning('Slow query in %s (%.3fs): %s', route, seconds, sql)
+        for shape, count in self.shapes.items():
+            if count >= settings.N_PLUS_ONE_THRESHOLD:
+                REPEATED_QUERIES.inc(route=route)
+                logger.warning('N+1 in %s: the same query ran %d times: %s', route, count, shape)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - started)
+
+
+def _install(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# connections are per thread, so every new one gets the wrapper; async
+# views query from sync_to_async threads, which see the request's stats
+# through the context variable
+connection_created.connect(_install)
+
+
+def start_request():
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.route
+
+
+class InstrumentationMiddleware:
+    """
+    Records latency, SQL count and time, serialization time and GraphQL
+    resolver depth for every request, labelled by route name.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token = start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        stats.report(_route(request), request.method, response.status_code)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        stats.report(_route(request), request.method, response.status_code)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = _current.get()
+        if stats is not None:
+            stats.view_started = time.perf_counter()
+            stats.view_sql_seconds = stats.sql_seconds
+
+
+class ResolverDepthMiddleware:
+    """
+    Graphene middleware noting how deep the resolvers of a request went.
+    """
+    def resolve(self, next, root, info, **args):
+        stats = _current.get()
+        if stats is not None:
+            stats.resolvers += 1
+            depth = sum(isinstance(key, str) for key in info.path.as_list())
+            if depth > stats.depth:
+                stats.depth = depth
+        return next(root, info, **args)
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
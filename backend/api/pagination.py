@@ -0,0 +1,179 @@
+import json
+from base64 import b64decode, b64encode
+from functools import reduce
+from operator import or_
+from types import SimpleNamespace
+
+from django.db.models import F, Q
+from django.db.models.fields.tuple_lookups import TupleGreaterThan, TupleLessThan
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the full ``ordering`` key instead of an
+    offset, so every page costs the same index range scan however deep it is.
+    The seek is a row-value comparison, ``(a, b) < (x, y)``, when the columns
+    share a direction and the database supports it.
+
+    Pagination is opt-in: it only kicks in when the client sends ``cursor``
+    or ``page_size``, so existing callers keep getting a plain list.
+    """
+    ordering = ('id',)
+    page_size = 100
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.paginate_rows(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.paginate_rows([row async for row in queryset])
+
+    def page_queryset(self, queryset, request):
+        """
+        Return the slice of ``queryset`` to fetch for this page (one row more
+        than the page, to tell whether there is a next one), or None when
+        the request does not ask for pagination.
+        """
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+        self.values, self.key, self.reverse = self.decode_cursor(request)
+
+        ordering = [self._flip(name) if self.reverse else name for name in self.ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.key is not None:
+            queryset = queryset.filter(self._seek(ordering, self.key))
+        return queryset[:self.page_size + 1]
+
+    def paginate_rows(self, results):
+        values, key = self.values, self.key
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        first = results[0] if results else None
+        last = results[-1] if results else None
+        if self.reverse:
+            self.next_key = self._key(last) if last else values
+            self.previous_key = self._key(first) if has_more else None
+        else:
+            self.next_key = self._key(last) if has_more else None
+            self.previous_key = self._key(first) if key is not None and first else None
+        return results
+
+    def merge_rows(self, *results):
+        """
+        Combine the fetched rows of several page_queryset() slices, over
+        models with the same ordering fields, into one; paginate_rows then
+        takes the page from it.
+        """
+        rows = [row for result in results for row in result]
+        ordering = [self._flip(name) if self.reverse else name for name in self.ordering]
+        # stable sorts from the last key to the first, each in its direction
+        for name, field in reversed(list(zip(ordering, self.fields))):
+            attname = field.attname
+            rows.sort(key=lambda row: row[attname] if isinstance(row, dict) else getattr(row, attname),
+                      reverse=name.startswith('-'))
+        return rows[:self.page_size + 1]
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.encode_cursor(self.next_key, reverse=False),
+            'previous': self.encode_cursor(self.previous_key, reverse=True),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, None, False
+        try:
+            payload = json.loads(b64decode(encoded.encode('ascii')).decode('ascii'))
+            values, reverse = payload['k'], bool(payload['r'])
+            if len(values) != len(self.fields):
+                raise ValueError
+            key = [field.to_python(value) for field, value in zip(self.fields, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return values, key, reverse
+
+    def encode_cursor(self, key, reverse):
+        if key is None:
+            return None
+        payload = json.dumps({'k': key, 'r': reverse}, separators=(',', ':'))
+        cursor = b64encode(payload.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def _key(self, instance):
+        if isinstance(instance, dict):
+            # a values() row keyed by attname, as api/fastpath.py fetches
+            instance = SimpleNamespace(**instance)
+        return [field.value_to_string(instance) for field in self.fields]
+
+    @staticmethod
+    def _flip(name):
+        return name[1:] if name.startswith('-') else '-' + name
+
+    @staticmethod
+    def _seek(ordering, key):
+        columns = [name.lstrip('-') for name in ordering]
+        descending = [name.startswith('-') for name in ordering]
+        # the first column's bound limits the index range scanned whichever
+        # form the rest takes
+        bound = Q(**{f"{columns[0]}__{'lte' if descending[0] else 'gte'}": key[0]})
+        if len(set(descending)) == 1:
+            # (a, b) < (x, y), written as a row-value comparison where the
+            # database has them (PostgreSQL) and as the OR below elsewhere
+            lookup = TupleLessThan if descending[0] else TupleGreaterThan
+            return bound & Q(lookup(tuple(F(column) for column in columns), tuple(key)))
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y), per column direction
+        clauses = []
+        for i, (column, desc) in enumerate(zip(columns, descending)):
+            equal = dict(zip(columns[:i], key))
+            clauses.append(Q(**equal, **{f"{column}__{'lt' if desc else 'gt'}": key[i]}))
+        return bound & reduce(or_, clauses)
+
+
+class OrderPagination(KeysetPagination):
+    ordering = ('-date_and_time', '-id')
+
+
+class JobPagination(KeysetPagination):
+    ordering = ('-id',)
@@ -0,0 +1,101 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .pagination import KeysetPagination
+from .sparse import field_spec
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def plan_queryset(queryset, serializer_class, required=(), context=None):
+    """
+    Apply select_related/prefetch_related/only() to a queryset based on the
+    sources declared on a ModelSerializer, so that serializing the result
+    runs a fixed number of queries regardless of how many rows it holds.
+    ``context`` is the serializer context, whose ``field_spec`` trims the
+    fields planned for, see api/sparse.py.
+    """
+    return _apply(queryset, serializer_class(context=context or {}), required)
+
+
+def _apply(queryset, serializer, required=()):
+    select, prefetch, only = _plan(queryset.model, serializer)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if only is not None:
+        queryset = queryset.only(*sorted(only.union(required)))
+    return queryset
+
+
+def _plan(model, serializer):
+    select, prefetch, only = [], [], {model._meta.pk.name}
+    for field in serializer.fields.values():
+        if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+            only = None
+            continue
+
+        # Nested many=True serializer over a reverse or m2m relation
+        if isinstance(field, serializers.ListSerializer):
+            related = _model_field(model, field.source)
+            if related is None or not isinstance(field.child, serializers.ModelSerializer):
+                only = None
+                continue
+            # the child rows must carry their FK back to us to be matched up
+            required = (related.field.name,) if related.one_to_many else ()
+            # in a fixed order, which api/fastpath.py follows as well
+            child_model = related.related_model
+            child_qs = child_model.objects.order_by(*(child_model._meta.ordering or ['pk']))
+            child_qs = _apply(child_qs, field.child, required)
+            prefetch.append(Prefetch(field.source, queryset=child_qs))
+            continue
+
+        # Dotted sources such as 'product.name' traverse forward relations
+        path, attr, current = [], None, model
+        for part in field.source_attrs:
+            attr = _model_field(current, part)
+            if attr is None:
+                break
+            if attr.is_relation:
+                path.append(part)
+                current = attr.related_model
+        if attr is None or attr.many_to_many or attr.one_to_many:
+            only = None
+            continue
+        nested = isinstance(field, serializers.ModelSerializer)
+        # a trailing FK rendered as a pk only needs its _id column, not a join
+        traversed = path if nested or not attr.is_relation else path[:-1]
+        if traversed:
+            select.append('__'.join(traversed))
+        if only is not None:
+            only.update('__'.join(path[:i]) for i in range(1, len(path) + 1))
+            if not nested:
+                only.add('__'.join(field.source_attrs))
+
+    return select, prefetch, only
+
+
+class QueryPlanMixin:
+    """
+    ViewSet mixin that plans the queryset from the view's serializer class,
+    trimmed to the ``?fields=``/``?expand=`` of the request.
+    """
+    def get_queryset(self):
+        required = ()
+        if isinstance(self.paginator, KeysetPagination):
+            # the cursor is read off the last row
+            required = [name.lstrip('-') for name in self.paginator.ordering]
+        context = {'field_spec': field_spec(self.request)}
+        return plan_queryset(super().get_queryset(), self.get_serializer_class(), required, context)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['field_spec'] = field_spec(self.request)
+        return context
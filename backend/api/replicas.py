@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# The reads of GET and HEAD requests, and of GraphQL queries, go to a healthy
+# DATABASE_REPLICAS alias; everything else goes to the primary ('default').
+# A request that writes sends back a cookie keeping that client's reads on
+# the primary for DATABASE_STICKY_SECONDS, so it sees its own writes while
+# the replicas catch up. Writes to DATABASE_UNPINNED_MODELS, tables a read
+# brings up to date such as the sales rollups, keep the rest of that request
+# on the primary but pin no one. Reads outside a request (commands, signals)
+# and reads inside a transaction on the primary always use the primary.
+
+logger = logging.getLogger('api.replicas')
+
+STICKY_COOKIE = 'db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Seconds a replica has yet to replay; 0 once it has replayed all it received
+# or when the server is not a standby at all.
+PG_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class RequestRouting:
+    __slots__ = ('pinned', 'replica', 'wrote', 'refreshed', 'used')
+
+    def __init__(self, pinned, replica):
+        self.pinned = pinned
+        self.replica = replica
+        self.wrote = False
+        self.refreshed = False
+        self.used = False
+
+
+_current = ContextVar('replica_routing', default=None)
+
+
+def replication_lag(connection):
+    """
+    How many seconds the database behind ``connection`` is behind its primary.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(PG_LAG_SQL)
+            return float(cursor.fetchone()[0] or 0)
+        cursor.execute('SELECT 1')
+    return 0.0
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class ReplicaHealth:
+    """
+    Which replicas answered their last check, and within
+    DATABASE_REPLICA_MAX_LAG of the primary. Each alias is checked again
+    DATABASE_REPLICA_CHECK_SECONDS after its last check, though not from an
+    event loop, where the ORM routes some reads before running them in a
+    thread: those get the last answer.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = {}
+
+    def healthy(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.checked.get(alias)
+            if entry is not None and now - entry[0] < settings.DATABASE_REPLICA_CHECK_SECONDS:
+                return entry[1]
+            if _on_event_loop():
+                return entry[1] if entry else False
+            # the other threads keep the last answer while this one checks
+            self.checked[alias] = (now, entry[1] if entry else False)
+        healthy = self.check(alias)
+        with self.lock:
+            self.checked[alias] = (now, healthy)
+        return healthy
+
+    def check(self, alias):
+        try:
+            lag = replication_lag(connections[alias])
+        except DatabaseError as exc:
+            logger.warning("Replica %s is unreachable: %s", alias, exc)
+            return False
+        if lag > settings.DATABASE_REPLICA_MAX_LAG:
+            logger.warning("Replica %s is %.1fs behind the primary", alias, lag)
+            return False
+        return True
+
+    def reset(self):
+        with self.lock:
+            self.checked.clear()
+
+
+health = ReplicaHealth()
+
+
+def choose_replica():
+    """
+    A healthy replica alias, or None when there is none.
+    """
+    aliases = [alias for alias in settings.DATABASE_REPLICAS if alias in settings.DATABASES]
+    healthy = [alias for alias in aliases if health.healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+def read_from_replicas():
+    """
+    Let the rest of the current request read from a replica, for a POST that
+    only reads, such as a GraphQL query. Does nothing for a pinned client.
+    """
+    state = _current.get()
+    if state is not None and not state.pinned:
+        state.replica = True
+
+
+def on_primary():
+    """
+    Whether the current request must see the primary's data: its client has
+    written recently, or the request itself has.
+    """
+    state = _current.get()
+    return state is not None and (state.pinned or state.wrote)
+
+
+def used_replica():
+    """
+    Whether the current request has read from a replica.
+    """
+    state = _current.get()
+    return state is not None and state.used
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads ReplicaMiddleware allows to a replica
+    and every write to the primary.
+    """
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or not state.replica or state.wrote or state.refreshed:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        alias = choose_replica()
+        if alias is None:
+            return DEFAULT_DB_ALIAS
+        state.used = True
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            if model._meta.label in settings.DATABASE_UNPINNED_MODELS:
+                state.refreshed = True
+            else:
+                state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema by replication
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pinned(request):
+    try:
+        until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+def _start(request):
+    pinned = _pinned(request)
+    state = RequestRouting(pinned, request.method in SAFE_METHODS and not pinned)
+    return state, _current.set(state)
+
+
+def _finish(state, response):
+    seconds = settings.DATABASE_STICKY_SECONDS
+    if state.wrote and seconds:
+        response.set_cookie(
+            STICKY_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds, httponly=True, samesite='Lax',
+        )
+
+
+class ReplicaMiddleware:
+    """
+    Marks which requests may read from a replica, and pins a client that
+    has just written to the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state, token = _start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        _finish(state, response)
+        return response
+
+    async def __acall__(self, request):
+        state, token = _start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        _finish(state, response)
+        return response
@@ -1,32 +1,238 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from orders.models import Customer, Product, Order, OrderItem
+from orders.models import Customer, Product, Order, OrderItem, OrderStatusChange, ArchivedOrder, ArchivedOrderItem, Job
+from orders import jobs, lifecycle, totals
+from orders.signals import post_bulk_write
 
-class CustomerSerializer(serializers.ModelSerializer):
+from .bulk import BULK_BATCH_SIZE, BulkListSerializer, PrefetchedPrimaryKeyRelatedField
+from .sparse import SparseFieldsMixin
+
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at']
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
+    expandable_fields = {'product': ProductSerializer}
 
     class Meta:
         model = OrderItem
         fields = ['id', 'order', 'product', 'product_name', 'product_sku', 'quantity', 'unit_price', 'created_at', 'updated_at']
         read_only_fields = ['product_name', 'created_at', 'updated_at']
+        list_serializer_class = BulkListSerializer
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
     items = OrderItemSerializer(many=True, read_only=True)
     customer_name = serializers.CharField(source='customer.name', read_only=True)
+    expandable_fields = {'customer': CustomerSerializer}
 
     class Meta:
         model = Order
-        fields = ['id', 'number', 'date_and_time', 'customer', 'customer_name', 'shipping_method', 'shipping_cost', 'status', 'items', 'created_at', 'updated_at']
-        read_only_fields = ['customer_name', 'items', 'created_at', 'updated_at']
+        fields = ['id', 'number', 'date_and_time', 'customer', 'customer_name', 'shipping_method', 'shipping_cost', 'status', 'items_count', 'subtotal', 'total', 'items', 'created_at', 'updated_at']
+        read_only_fields = ['customer_name', 'items', 'items_count', 'subtotal', 'total', 'created_at', 'updated_at']
+        list_serializer_class = BulkListSerializer
+
+    def validate_number(self, value):
+        # left blank, a new order is numbered by the server; a saved one keeps its number
+        if not value and self.instance is not None:
+            raise serializers.ValidationError("An order's number cannot be cleared.")
+        return value
+
+    def validate_status(self, value):
+        # a new order may start in any status, see orders/lifecycle.py
+        if self.instance is not None and not lifecycle.allowed(self.instance.status, value):
+            raise serializers.ValidationError(str(lifecycle.InvalidTransition(self.instance.status, value)))
+        return value
+
+class OrderStatusChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderStatusChange
+        fields = ['from_status', 'to_status', 'changed_at']
+
+class ArchivedOrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    product_sku = serializers.CharField(source='product.sku', read_only=True)
+    expandable_fields = OrderItemSerializer.expandable_fields
+
+    class Meta:
+        model = ArchivedOrderItem
+        fields = OrderItemSerializer.Meta.fields
+        read_only_fields = fields
+
+class ArchivedOrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # renders like OrderSerializer, so archived rows can be listed with live ones
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    customer_name = serializers.CharField(source='customer.name', read_only=True)
+    expandable_fields = OrderSerializer.expandable_fields
+
+    class Meta:
+        model = ArchivedOrder
+        fields = OrderSerializer.Meta.fields
+        read_only_fields = fields
+
+class SalesSerializer(serializers.Serializer):
+    # one row of orders/analytics.py totals; the grouping key present
+    # depends on the report
+    day = serializers.DateField(required=False)
+    status = serializers.CharField(required=False)
+    shipping_method = serializers.CharField(required=False)
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    shipping = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class ProductSalesSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    sku = serializers.CharField(source='product__sku')
+    name = serializers.CharField(source='product__name')
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class JobSerializer(serializers.ModelSerializer):
+    kind = serializers.ChoiceField(choices=sorted(jobs.TASKS))
+    params = serializers.DictField(required=False, default=dict)
+    progress = serializers.SerializerMethodField()
+    error = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'params', 'status', 'attempts', 'max_attempts', 'done', 'total', 'progress', 'result',
+            'error', 'run_at', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = [name for name in fields if name not in ('kind', 'params')]
+
+    def get_progress(self, job):
+        # the fraction done, null while the job has not counted its work
+        if job.status == jobs.SUCCEEDED:
+            return 1.0
+        if not job.total:
+            return None
+        return round(min(job.done / job.total, 1), 4)
+
+    def get_error(self, job):
+        # the exception, without the traceback kept for the admin
+        return job.error.strip().splitlines()[-1] if job.error else None
+
+    def validate(self, attrs):
+        try:
+            jobs.check(attrs['kind'], attrs.get('params', {}))
+        except jobs.InvalidJob as exc:
+            raise serializers.ValidationError({'params': [str(exc)]})
+        return attrs
+
+    def create(self, validated_data):
+        return jobs.enqueue(validated_data['kind'], validated_data.get('params'))
+
+
+def _cache_items(order, items):
+    # Prime the reverse relation so rendering the order runs no queries
+    queryset = order.items.all()
+    queryset._result_cache = list(items)
+    queryset._prefetch_done = True
+    order._prefetched_objects_cache = {'items': queryset}
+
+
+class OrderLineSerializer(OrderItemSerializer):
+    """
+    An item written as part of an order; ``id`` picks an existing line to
+    update, lines without one are created.
+    """
+    id = serializers.IntegerField(required=False)
+
+    class Meta(OrderItemSerializer.Meta):
+        read_only_fields = ['order', 'product_name', 'created_at', 'updated_at']
+
+
+class OrderWithItemsListSerializer(BulkListSerializer):
+    @transaction.atomic
+    def create(self, validated_data):
+        lines = [attrs.pop('items') for attrs in validated_data]
+        orders = super().create(validated_data)
+        items = [
+            [OrderItem(order=order, **{k: v for k, v in line.items() if k != 'id'}) for line in order_lines]
+            for order, order_lines in zip(orders, lines)
+        ]
+        created = OrderItem.objects.bulk_create(
+            [item for order_items in items for item in order_items], batch_size=BULK_BATCH_SIZE
+        )
+        post_bulk_write.send(sender=OrderItem, instances=created)
+        totals.refresh(orders)
+        for order, order_items in zip(orders, items):
+            _cache_items(order, order_items)
+        return orders
+
+
+class OrderWithItemsSerializer(OrderSerializer):
+    """
+    Writes an order together with its items in one transaction, using
+    bulk_create/bulk_update for the items.
+    """
+    items = OrderLineSerializer(many=True)
+
+    class Meta(OrderSerializer.Meta):
+        read_only_fields = ['customer_name', 'items_count', 'subtotal', 'total', 'created_at', 'updated_at']
+        list_serializer_class = OrderWithItemsListSerializer
+
+    @transaction.atomic
+    def create(self, validated_data):
+        lines = validated_data.pop('items')
+        order = super().create(validated_data)
+        items = [OrderItem(order=order, **{k: v for k, v in line.items() if k != 'id'}) for line in lines]
+        items = OrderItem.objects.bulk_create(items, batch_size=BULK_BATCH_SIZE)
+        post_bulk_write.send(sender=OrderItem, instances=items)
+        totals.refresh([order])
+        _cache_items(order, items)
+        return order
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        lines = validated_data.pop('items', None)
+        order = super().update(instance, validated_data)
+        if lines is None:
+            return order
+
+        existing = {item.pk: item for item in order.items.all()}
+        created, updated = [], []
+        fields = {'updated_at'}
+        now = timezone.now()
+        for line in lines:
+            pk = line.pop('id', None)
+            if pk is None:
+                missing = {'product', 'quantity', 'unit_price'} - line.keys()
+                if missing:
+                    raise serializers.ValidationError({'items': [f"New items need {', '.join(sorted(missing))}."]})
+                created.append(OrderItem(order=order, **line))
+                continue
+            if pk not in existing:
+                raise serializers.ValidationError({'items': [f"Item {pk} does not belong to this order."]})
+            item = existing.pop(pk)
+            for attr, value in line.items():
+                setattr(item, attr, value)
+            item.updated_at = now
+            fields.update(line)
+            updated.append(item)
+
+        # lines left out of the payload are removed
+        if existing:
+            OrderItem.objects.filter(pk__in=list(existing)).delete()
+        if updated:
+            OrderItem.objects.bulk_update(updated, sorted(fields), batch_size=BULK_BATCH_SIZE)
+        created = OrderItem.objects.bulk_create(created, batch_size=BULK_BATCH_SIZE)
+        post_bulk_write.send(sender=OrderItem, instances=updated + created)
+        totals.refresh([order])
+        _cache_items(order, updated + created)
+        return order
@@ -0,0 +1,82 @@
+from collections import namedtuple
+
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+# The representation a read asks for: ``fields`` is the dotted paths to keep
+# (None keeps everything) and ``expand`` the dotted paths of relations to
+# embed in place of their ids. Hashable, so compiled plans can be cached by it.
+FieldSpec = namedtuple('FieldSpec', 'fields expand')
+
+
+def _paths(value):
+    return frozenset(path.strip() for path in (value or '').split(',') if path.strip())
+
+
+def field_spec(request):
+    """
+    The FieldSpec of ``?fields=`` and ``?expand=`` on a read, or None when
+    the request asks for the full representation. Writes always get it.
+    """
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None
+    params = getattr(request, 'query_params', request.GET)
+    fields, expand = params.get(FIELDS_PARAM), params.get(EXPAND_PARAM)
+    if not fields and not expand:
+        return None
+    return FieldSpec(_paths(fields) or None, _paths(expand))
+
+
+def _level(paths, path):
+    prefix = ''.join(f'{name}.' for name in path)
+    return [p[len(prefix):] for p in paths if p.startswith(prefix)]
+
+
+def _path(serializer):
+    names = []
+    while serializer.parent is not None:
+        if serializer.field_name:
+            names.append(serializer.field_name)
+        serializer = serializer.parent
+    return tuple(reversed(names))
+
+
+class SparseFieldsMixin:
+    """
+    ModelSerializer mixin trimming the output to the FieldSpec in the
+    ``field_spec`` context entry, at every level of nesting: ``?fields=
+    number,items.quantity`` keeps those, ``?expand=customer`` embeds the
+    serializer ``expandable_fields`` names for it instead of its id.
+
+    api/queryplan.py and api/fastpath.py build their plans from the trimmed
+    fields, so what is left out is not read either.
+    """
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self.context.get('field_spec')
+        if spec is None:
+            return fields
+        path = _path(self)
+        dotted = ''.join(f'{name}.' for name in path)
+
+        expand = _level(spec.expand, path)
+        for name in {p for p in expand if '.' not in p}:
+            if name not in self.expandable_fields:
+                raise serializers.ValidationError({EXPAND_PARAM: [f"{dotted}{name} cannot be expanded."]})
+            fields[name] = self.expandable_fields[name](read_only=True)
+
+        if spec.fields is None:
+            return fields
+        wanted = _level(spec.fields, path)
+        if not wanted and path:
+            # the relation was asked for without naming its fields
+            return fields
+        names = {p.split('.')[0] for p in wanted + expand}
+        unknown = sorted(names - fields.keys())
+        if unknown:
+            raise serializers.ValidationError({FIELDS_PARAM: [f"Unknown field {dotted}{name}." for name in unknown]})
+        return {name: field for name, field in fields.items() if name in names}
@@ -1,7 +1,36 @@
+import csv
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.db.models import F
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
 from django.urls import path, include, reverse
-from rest_framework.test import APITestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
-from orders.models import Customer, Product, Order, OrderItem
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from api.fastpath import FastJSONRenderer, read_plan
+from api.metrics import RequestStats, query_shape
+from api.queryplan import plan_queryset
+from api.replicas import STICKY_COOKIE, ReplicaRouter, health
+from api.serializers import CustomerSerializer, ProductSerializer, OrderSerializer, OrderItemSerializer
+from orders.documents import measure, persisted, prepare, query_hash
+from orders import jobs
+from orders.models import Customer, Product, Order, OrderItem, ArchivedOrder, StaleRollupDay
+from orders.schema import schema
 
 class CustomerAPITest(APITestCase):
     def setUp(self):
@@ -128,8 +157,8 @@ class OrderAPITest(APITestCase):
 
     def test_create_order_invalid(self):
         data = {
-            'number': '',
-            'customer_id': self.cust.id,
+            'number': 'ORD123',
+            'customer': self.cust.id,
             'shipping_method': 'invalid_method',
             'shipping_cost': -5.00,
             'status': 'unknown'
@@ -137,11 +166,25 @@ class OrderAPITest(APITestCase):
         resp = self.client.post(self.list_url, data, format='json')
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('number', resp.data)
+
+    def test_create_order_numbered_by_server(self):
+        data = {'customer': self.cust.id, 'shipping_method': 'standard', 'shipping_cost': 1}
+        first = self.client.post(self.list_url, data, format='json')
+        second = self.client.post(self.list_url, {**data, 'number': ''}, format='json')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(first.data['number'].startswith('ORD'))
+        self.assertNotEqual(first.data['number'], second.data['number'])
     
+    def test_number_cannot_be_cleared(self):
+        resp = self.client.patch(self.detail_url, {'number': ''}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('number', resp.data)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).number, "ORD123")
+
     def test_update_order_put(self):
         data = {
             'number': 'ORD1234',
-            'customer_id': self.cust.id,
+            'customer': self.cust.id,
             'shipping_method': 'express',
             'shipping_cost': 7.50,
             'status': 'cancelled'
@@ -156,6 +199,24 @@ class OrderAPITest(APITestCase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertEqual(resp.data['status'], 'completed')
     
+    def test_status_moves_only_along_the_lifecycle(self):
+        resp = self.client.patch(self.detail_url, {'status': 'completed'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.patch(self.detail_url, {'status': 'pending'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('status', resp.data)
+        resp = self.client.patch(reverse('order-bulk'), [{'id': self.order.id, 'status': 'pending'}], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.get(reverse('order-history', args=[self.order.id]), format='json')
+        self.assertEqual(resp.data['status'], 'completed')
+        self.assertEqual(resp.data['next_statuses'], ['cancelled'])
+        self.assertEqual(
+            [(c['from_status'], c['to_status']) for c in resp.data['changes']], [('', 'pending'), ('pending', 'completed')],
+        )
+        resp = self.client.get(reverse('order-history', args=[999999]), format='json')
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_delete_order(self):
         resp = self.client.delete(self.detail_url, format='json')
         self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
@@ -165,7 +226,7 @@ class OrderAPITest(APITestCase):
 class OrderItemAPITest(APITestCase):
     def setUp(self):
         self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
-        self.prod = Product.objects.create(sku="SKU123", name="Test Product", unit_price=19.99)
+        self.prod = Product.objects.create(sku="SKU123", name="Test Product", unit_price=19.99, stock_level=1000)
         self.order = Order.objects.create(
             number="ORD123",
             customer_id=self.cust.id,
@@ -190,12 +251,12 @@ class OrderItemAPITest(APITestCase):
     def test_retrieve_order_item(self):
         resp = self.client.get(self.detail_url, format='json')
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp.data['product_id'], self.prod.id)
+        self.assertEqual(resp.data['product'], self.prod.id)
     
     def test_create_order_item_valid(self):
         data = {
-            'order_id': self.order.id,
-            'product_id': self.prod.id,
+            'order': self.order.id,
+            'product': self.prod.id,
             'quantity': 3,
             'unit_price': 19.99
         }
@@ -205,8 +266,8 @@ class OrderItemAPITest(APITestCase):
 
     def test_create_order_item_invalid(self):
         data = {
-            'order_id': 'fail',
-            'product_id': self.prod.id,
+            'order': 'fail',
+            'product': self.prod.id,
             'quantity': -1,
             'unit_price': 19.99
         }
@@ -216,8 +277,8 @@ class OrderItemAPITest(APITestCase):
     
     def test_update_order_item_put(self):
         data = {
-            'order_id': self.order.id,
-            'product_id': self.prod.id,
+            'order': self.order.id,
+            'product': self.prod.id,
             'quantity': 5,
             'unit_price': 19.99
         }
@@ -236,4 +297,1088 @@ class OrderItemAPITest(APITestCase):
         self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(OrderItem.objects.filter(id=self.order_item.id).exists())
     
-    
\ No newline at end of file
+    
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class QueryCountTest(APITestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        self.prods = [
+            Product.objects.create(sku=f"SKU{i}", name=f"Product {i}", unit_price=9.99, stock_level=1000)
+            for i in range(3)
+        ]
+
+    def make_orders(self, count):
+        start = Order.objects.count()
+        for i in range(start, start + count):
+            order = Order.objects.create(
+                number=f"ORD{i}",
+                customer=self.cust,
+                shipping_method="standard",
+                shipping_cost=5.00,
+            )
+            for prod in self.prods:
+                OrderItem.objects.create(order=order, product=prod, quantity=1, unit_price=9.99)
+
+    def assertListQueries(self, url_name, num):
+        for count in (1, 20):
+            self.make_orders(count)
+            with self.assertNumQueries(num):
+                resp = self.client.get(reverse(url_name), format='json')
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_order_list_query_count(self):
+        self.assertListQueries('order-list', 2)
+
+    def test_order_list_includes_nested_names(self):
+        self.make_orders(1)
+        resp = self.client.get(reverse('order-list'), format='json')
+        self.assertEqual(resp.data[0]['customer_name'], 'Zoe')
+        self.assertEqual(resp.data[0]['items'][0]['product_sku'], 'SKU0')
+
+    def test_order_item_list_query_count(self):
+        self.assertListQueries('orderitem-list', 1)
+
+    def test_customer_and_product_list_query_count(self):
+        self.assertListQueries('customer-list', 1)
+        self.assertListQueries('product-list', 1)
+
+
+class OrderFilterAPITest(APITestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        self.other = Customer.objects.create(name="Anna", email="anna@example.com")
+        self.prod = Product.objects.create(sku="SKU1", name="One", unit_price=1.00, stock_level=1000)
+        self.prod2 = Product.objects.create(sku="SKU2", name="Two", unit_price=2.00, stock_level=1000)
+        self.old = Order.objects.create(
+            number="ORD1", customer=self.cust, shipping_method="standard", shipping_cost=1.00,
+            status="completed", date_and_time=datetime(2025, 1, 10, 12, tzinfo=dt_timezone.utc),
+        )
+        self.new = Order.objects.create(
+            number="ORD2", customer=self.other, shipping_method="express", shipping_cost=1.00,
+            status="pending", date_and_time=datetime(2025, 3, 10, 12, tzinfo=dt_timezone.utc),
+        )
+        OrderItem.objects.create(order=self.old, product=self.prod, quantity=1, unit_price=1.00)
+        OrderItem.objects.create(order=self.new, product=self.prod, quantity=1, unit_price=1.00)
+        OrderItem.objects.create(order=self.new, product=self.prod2, quantity=2, unit_price=2.00)
+
+    def get_ids(self, url_name, params):
+        resp = self.client.get(reverse(url_name), params, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return sorted(row['id'] for row in resp.data)
+
+    def test_order_items_by_order_id(self):
+        ids = self.get_ids('orderitem-list', {'order_id': self.new.id})
+        self.assertEqual(ids, sorted(self.new.items.values_list('id', flat=True)))
+
+    def test_order_items_by_order_and_product(self):
+        ids = self.get_ids('orderitem-list', {'order': self.new.id, 'product': self.prod2.id})
+        self.assertEqual(len(ids), 1)
+
+    def test_order_items_by_status_and_date(self):
+        ids = self.get_ids('orderitem-list', {'status': 'completed', 'date_to': '2025-01-10'})
+        self.assertEqual(ids, list(self.old.items.values_list('id', flat=True)))
+
+    def test_orders_by_status_and_date_range(self):
+        self.assertEqual(self.get_ids('order-list', {'status': 'pending'}), [self.new.id])
+        self.assertEqual(self.get_ids('order-list', {'status': 'pending,completed'}), [self.old.id, self.new.id])
+        self.assertEqual(self.get_ids('order-list', {'date_from': '2025-02-01'}), [self.new.id])
+        self.assertEqual(self.get_ids('order-list', {'date_to': '2025-02-01T00:00:00Z'}), [self.old.id])
+
+    def test_orders_by_customer_and_product(self):
+        self.assertEqual(self.get_ids('order-list', {'customer': self.cust.id}), [self.old.id])
+        self.assertEqual(self.get_ids('order-list', {'product': self.prod2.id}), [self.new.id])
+
+    def test_invalid_filter_value(self):
+        resp = self.client.get(reverse('order-list'), {'status': 'unknown', 'date_from': 'soon'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('status', resp.data)
+        self.assertIn('date_from', resp.data)
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # tiny test tables would otherwise always be scanned sequentially
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def test_order_item_filter_uses_composite_index(self):
+        plan = self.explain(OrderItem.objects.filter(order=self.new, product=self.prod2))
+        self.assertIn('orderitem_order_product_idx', plan)
+
+    def test_order_status_filter_uses_composite_index(self):
+        qs = Order.objects.filter(status__in=['pending'], date_and_time__gte=self.old.date_and_time)
+        self.assertIn('order_status_date_idx', self.explain(qs))
+
+
+class PaginationAPITest(APITestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        same_time = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        for i in range(7):
+            Order.objects.create(
+                number=f"ORD{i}", customer=self.cust, shipping_method="standard",
+                shipping_cost=1.00, date_and_time=same_time if i < 4 else datetime(2025, 1, 1 + i, tzinfo=dt_timezone.utc),
+            )
+        self.expected = list(Order.objects.order_by('-date_and_time', '-id').values_list('id', flat=True))
+
+    def walk(self, url, key):
+        ids, pages = [], []
+        while url:
+            resp = self.client.get(url, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            ids.extend(row['id'] for row in resp.data['results'])
+            pages.append(resp.data)
+            url = resp.data[key]
+        return ids, pages
+
+    def test_unpaginated_without_params(self):
+        resp = self.client.get(reverse('order-list'), format='json')
+        self.assertIsInstance(resp.data, list)
+
+    def test_orders_forward_and_back(self):
+        ids, pages = self.walk(reverse('order-list') + '?page_size=3', 'next')
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+
+        back, _ = self.walk(pages[-1]['previous'], 'previous')
+        self.assertEqual(back, self.expected[3:6] + self.expected[0:3])
+
+    def test_customers_ordered_by_id(self):
+        for i in range(4):
+            Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com")
+        ids, _ = self.walk(reverse('customer-list') + '?page_size=2', 'next')
+        self.assertEqual(ids, list(Customer.objects.order_by('id').values_list('id', flat=True)))
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_deep_page_query_count(self):
+        _, pages = self.walk(reverse('order-list') + '?page_size=2', 'next')
+        with self.assertNumQueries(2):
+            self.client.get(pages[-2]['next'], format='json')
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_seek_is_a_bounded_row_comparison(self):
+        # SQLite has row values too, though Django only writes them for
+        # databases that declare supports_tuple_lookups
+        with mock.patch.object(connection.features, 'supports_tuple_lookups', True):
+            with CaptureQueriesContext(connection) as queries:
+                ids, _ = self.walk(reverse('order-list') + '?page_size=3', 'next')
+        self.assertEqual(ids, self.expected)
+        seeks = [q['sql'] for q in queries if '("orders_order"."date_and_time", "orders_order"."id") <' in q['sql']]
+        self.assertTrue(seeks)
+        self.assertTrue(all('"orders_order"."date_and_time" <=' in sql for sql in seeks))
+
+    def test_invalid_cursor(self):
+        resp = self.client.get(reverse('order-list'), {'cursor': 'garbage'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class SparseFieldsTest(APITestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        self.prod = Product.objects.create(sku="SKU1", name="One", unit_price=1, stock_level=1000)
+        for i in range(3):
+            order = Order.objects.create(number=f"ORD{i}", customer=self.cust, shipping_method="tnt", shipping_cost=1)
+            OrderItem.objects.create(order=order, product=self.prod, quantity=i + 1, unit_price=2)
+        self.url = reverse('order-list')
+
+    def test_fields_trim_output_and_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.url, {'fields': 'number,total'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(resp.json()[0], {'number': 'ORD0', 'total': '3.00'})
+        # no items query, and only the columns asked for and the cursor's
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('shipping_method', queries[0]['sql'])
+
+        resp = self.client.get(self.url, {'fields': 'number', 'page_size': 2}, HTTP_ACCEPT='application/json')
+        page = resp.json()
+        self.assertEqual(page['results'], [{'number': 'ORD2'}, {'number': 'ORD1'}])
+        self.assertEqual(self.client.get(page['next'], HTTP_ACCEPT='application/json').json()['results'], [{'number': 'ORD0'}])
+
+    def test_nested_fields_and_expand(self):
+        params = {'fields': 'number,items.quantity', 'expand': 'customer,items.product'}
+        for count in (3, 10):
+            while Order.objects.count() < count:
+                Order.objects.create(customer=self.cust, shipping_method="tnt", shipping_cost=1)
+            # orders with their customers, then the items with their products
+            with self.assertNumQueries(2):
+                resp = self.client.get(self.url, params, HTTP_ACCEPT='application/json')
+        order = next(o for o in resp.json() if o['number'] == 'ORD1')
+        self.assertEqual(set(order), {'number', 'customer', 'items'})
+        self.assertEqual(order['customer']['email'], 'zoe@example.com')
+        self.assertEqual(order['items'], [{'quantity': 2, 'product': {**order['items'][0]['product'], 'sku': 'SKU1'}}])
+        self.assertEqual(set(order['items'][0]['product']), set(self.client.get(reverse('product-list')).data[0]))
+
+        resp = self.client.get(
+            reverse('order-detail', args=[Order.objects.get(number='ORD1').pk]), {'fields': 'number,items'},
+        )
+        self.assertEqual(resp.data['items'][0]['product_sku'], 'SKU1')
+
+    def test_unknown_fields_and_writes(self):
+        for params in ({'fields': 'number,nope'}, {'fields': 'items.nope'}, {'expand': 'items'}):
+            resp = self.client.get(self.url, params)
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST, params)
+        resp = self.client.post(
+            self.url + '?fields=number', {'customer': self.cust.id, 'shipping_method': 'tnt', 'shipping_cost': 1},
+            format='json',
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertIn('total', resp.data)
+
+
+class FastPathTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.cust = Customer.objects.create(name="Zo\u00eb \u2028 \"Q\"", email="zoe@example.com")
+        self.prods = [
+            Product.objects.create(sku=f"SKU{i}", name=f"Product {i} \u2603", unit_price=price, stock_level=1000)
+            for i, price in enumerate(("9.99", "0.10", "1234.5"))
+        ]
+        for i in range(5):
+            order = Order.objects.create(
+                number=f"ORD{i}", customer=self.cust, shipping_method="standard", shipping_cost="4.5",
+                date_and_time=datetime(2025, 1, 1 + i, 12, 30, 15, 123456 * i, tzinfo=dt_timezone.utc),
+            )
+            for prod in self.prods[:i % 3 + 1]:
+                OrderItem.objects.create(order=order, product=prod, quantity=i + 1, unit_price=prod.unit_price)
+        Order.objects.create(number="EMPTY", customer=self.cust, shipping_method="tnt", shipping_cost=0)
+
+    def expected(self, serializer_class, queryset):
+        return serializer_class(plan_queryset(queryset, serializer_class), many=True).data
+
+    def assertSameBytes(self, url, serializer_class, queryset, params=None):
+        resp = self.client.get(url, params or {}, HTTP_ACCEPT='application/json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = self.expected(serializer_class, queryset)
+        if isinstance(resp.data, dict):
+            ids = [row['id'] for row in resp.data['results']]
+            data = [row for row in data if row['id'] in ids]
+            data.sort(key=lambda row: ids.index(row['id']))
+            data = {'next': resp.data['next'], 'previous': resp.data['previous'], 'results': data}
+        self.assertEqual(resp.content, JSONRenderer().render(data))
+        return resp
+
+    def test_lists_match_the_serializers_byte_for_byte(self):
+        self.assertSameBytes(reverse('order-list'), OrderSerializer, Order.objects.all())
+        self.assertSameBytes(reverse('orderitem-list'), OrderItemSerializer, OrderItem.objects.all())
+        self.assertSameBytes(reverse('customer-list'), CustomerSerializer, Customer.objects.all())
+        self.assertSameBytes(reverse('product-list'), ProductSerializer, Product.objects.all())
+
+    def test_pages_and_filters_match(self):
+        orders = Order.objects.order_by('-date_and_time', '-id')
+        resp = self.assertSameBytes(reverse('order-list'), OrderSerializer, orders, {'page_size': 2})
+        self.assertSameBytes(resp.data['next'], OrderSerializer, orders)
+        product = self.prods[2]
+        self.assertSameBytes(
+            reverse('order-list'), OrderSerializer, orders.filter(items__product=product), {'product': product.pk, 'page_size': 10},
+        )
+        self.assertSameBytes(reverse('orderitem-list'), OrderItemSerializer, OrderItem.objects.filter(product=product), {'product': product.pk})
+
+    @override_settings(TIME_ZONE='America/New_York')
+    def test_other_time_zone(self):
+        resp = self.assertSameBytes(reverse('order-list'), OrderSerializer, Order.objects.all())
+        self.assertEqual(resp.data[0]['date_and_time'], '2025-01-01T07:30:15-05:00')
+
+    def test_read_matches_fetch_and_render(self):
+        plan = read_plan(OrderSerializer)
+        Order.objects.filter(number='ORD1').update(shipping_cost=Decimal('0.1') + Decimal('0.2'))
+        for queryset in (Order.objects.order_by('pk'), Order.objects.order_by('-pk')[1:4], Order.objects.none()):
+            self.assertEqual(plan.read(queryset), plan.render(plan.fetch(queryset), queryset))
+            self.assertEqual(plan.read(queryset), self.expected(OrderSerializer, queryset))
+        with timezone.override('America/New_York'):
+            self.assertEqual(plan.read(Order.objects.all()), self.expected(OrderSerializer, Order.objects.all()))
+
+    def test_unsupported_serializers_fall_back(self):
+        class WithMethod(CustomerSerializer):
+            shout = serializers.SerializerMethodField()
+
+            def get_shout(self, obj):
+                return obj.name.upper()
+
+        self.assertIsNone(read_plan(WithMethod))
+        self.assertIsNotNone(read_plan(OrderSerializer))
+
+    def test_renderer_matches_drf(self):
+        data = {'a': Decimal('1.50'), 'b': datetime(2025, 1, 1, tzinfo=dt_timezone.utc), 'c': ['\u2028', None, 1.5]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        context = {'indent': 2}
+        self.assertEqual(FastJSONRenderer().render(data, renderer_context=context), JSONRenderer().render(data, renderer_context=context))
+
+
+class ArchiveAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        self.prod = Product.objects.create(sku="SKU1", name="One", unit_price=1, stock_level=1000)
+        for i in range(6):
+            order = Order.objects.create(
+                number=f"ORD{i}", customer=self.cust, shipping_method="tnt", shipping_cost=1,
+                date_and_time=datetime(2023, 1, 1 + i, tzinfo=dt_timezone.utc),
+            )
+            OrderItem.objects.create(order=order, product=self.prod, quantity=i + 1, unit_price=2)
+            order.status = 'completed'
+            order.save()
+        call_command('archive_orders', '--before', '2023-01-04', stdout=StringIO())
+        # move the live orders in between the archived ones, so pages mix both
+        Order.objects.update(date_and_time=F('date_and_time') - timedelta(days=3) + timedelta(hours=12))
+        self.expected = ["ORD5", "ORD2", "ORD4", "ORD1", "ORD3", "ORD0"]
+
+    def walk(self, url, key='next'):
+        numbers, pages = [], []
+        while url:
+            resp = self.client.get(url, HTTP_ACCEPT='application/json')
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            numbers.extend(row['number'] for row in resp.data['results'])
+            pages.append(resp.data)
+            url = resp.data[key]
+        return numbers, pages
+
+    def test_lists_include_archive_only_when_asked(self):
+        resp = self.client.get(reverse('order-list'), format='json')
+        self.assertEqual(sorted(row['number'] for row in resp.data), ["ORD3", "ORD4", "ORD5"])
+        resp = self.client.get(reverse('order-list'), {'archived': 'only'}, format='json')
+        self.assertEqual(sorted(row['number'] for row in resp.data), ["ORD0", "ORD1", "ORD2"])
+        self.assertEqual(resp.data[0]['items'][0]['product_sku'], "SKU1")
+        resp = self.client.get(reverse('order-list'), {'archived': 'include'}, format='json')
+        self.assertEqual(sorted(row['number'] for row in resp.data), sorted(self.expected))
+        resp = self.client.get(reverse('order-list'), {'archived': 'all'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pages_merge_both_tables(self):
+        numbers, pages = self.walk(reverse('order-list') + '?archived=include&page_size=2')
+        self.assertEqual(numbers, self.expected)
+        back, _ = self.walk(pages[-1]['previous'], 'previous')
+        self.assertEqual(back, self.expected[2:4] + self.expected[0:2])
+        numbers, _ = self.walk(reverse('order-list') + f'?archived=include&page_size=2&product={self.prod.pk}')
+        self.assertEqual(numbers, self.expected)
+
+    def test_retrieve_and_history(self):
+        archived = ArchivedOrder.objects.get(number="ORD1")
+        url = reverse('order-detail', args=[archived.pk])
+        self.assertEqual(self.client.get(url, format='json').status_code, status.HTTP_404_NOT_FOUND)
+        resp = self.client.get(url, {'archived': 'include'}, format='json')
+        self.assertEqual(resp.data['items'][0]['quantity'], 2)
+        live = Order.objects.get(number="ORD4")
+        resp = self.client.get(reverse('order-detail', args=[live.pk]), {'archived': 'include'}, format='json')
+        self.assertEqual(resp.data['number'], "ORD4")
+
+        resp = self.client.get(reverse('order-history', args=[archived.pk]), {'archived': 'include'}, format='json')
+        self.assertEqual(resp.data['next_statuses'], [])
+        self.assertEqual([c['to_status'] for c in resp.data['changes']], ['pending', 'completed'])
+        self.assertTrue(resp.data['changes'][0]['changed_at'].endswith('Z'))
+
+
+class BulkAPITest(APITestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        self.prods = [
+            Product.objects.create(sku=f"SKU{i}", name=f"Product {i}", unit_price=9.99, stock_level=1000)
+            for i in range(5)
+        ]
+        self.order = Order.objects.create(
+            number="ORD1", customer=self.cust, shipping_method="standard", shipping_cost=5.00,
+        )
+
+    def order_payload(self, number, lines):
+        return {
+            'number': number,
+            'customer': self.cust.id,
+            'shipping_method': 'express',
+            'shipping_cost': '5.00',
+            'status': 'pending',
+            'items': [{'product': self.prods[i % 5].id, 'quantity': 1, 'unit_price': '9.99'} for i in range(lines)],
+        }
+
+    def test_create_order_with_items(self):
+        resp = self.client.post(reverse('order-bulk'), self.order_payload('ORD2', 40), format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(resp.data['items']), 40)
+        self.assertEqual(resp.data['items'][0]['product_sku'], 'SKU0')
+        self.assertEqual(OrderItem.objects.filter(order_id=resp.data['id']).count(), 40)
+        self.assertEqual((resp.data['items_count'], resp.data['subtotal'], resp.data['total']), (40, '399.60', '404.60'))
+
+    def test_create_order_with_items_query_count(self):
+        counts = []
+        for number, lines in (('ORD2', 5), ('ORD3', 40)):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(reverse('order-bulk'), self.order_payload(number, lines), format='json')
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_create_many_orders_with_items(self):
+        payload = [self.order_payload(f'ORD{i}', 3) for i in range(2, 6)]
+        resp = self.client.post(reverse('order-bulk'), payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(resp.data), 4)
+        self.assertEqual(OrderItem.objects.count(), 12)
+
+    def test_create_order_with_invalid_item_rolls_back(self):
+        payload = self.order_payload('ORD2', 3)
+        payload['items'][1]['product'] = 999999
+        resp = self.client.post(reverse('order-bulk'), payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.filter(number='ORD2').exists())
+
+    def test_create_order_without_stock_conflicts(self):
+        Product.objects.filter(pk=self.prods[1].pk).update(stock_level=0)
+        resp = self.client.post(reverse('order-bulk'), self.order_payload('ORD2', 3), format='json')
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(resp.data['products'], [self.prods[1].id])
+        self.assertFalse(Order.objects.filter(number='ORD2').exists())
+        self.prods[0].refresh_from_db()
+        self.assertEqual(self.prods[0].stock_level, 1000)
+
+    def test_update_order_syncs_items(self):
+        keep, drop = [
+            OrderItem.objects.create(order=self.order, product=p, quantity=1, unit_price=1) for p in self.prods[:2]
+        ]
+        payload = self.order_payload('ORD1', 1)
+        payload['items'].append({'id': keep.id, 'product': keep.product_id, 'quantity': 7, 'unit_price': '1.00'})
+        resp = self.client.put(reverse('order-bulk-detail', args=[self.order.id]), payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['shipping_method'], 'express')
+        self.assertEqual(self.order.items.count(), 2)
+        self.assertFalse(OrderItem.objects.filter(pk=drop.pk).exists())
+        keep.refresh_from_db()
+        self.assertEqual(keep.quantity, 7)
+        self.assertEqual((resp.data['items_count'], resp.data['subtotal'], resp.data['total']), (2, '16.99', '21.99'))
+
+    def test_update_order_rejects_foreign_item(self):
+        other = Order.objects.create(number="ORD9", customer=self.cust, shipping_method="tnt", shipping_cost=1)
+        item = OrderItem.objects.create(order=other, product=self.prods[0], quantity=1, unit_price=1)
+        payload = self.order_payload('ORD1', 0)
+        payload['items'].append({'id': item.id, 'quantity': 3})
+        resp = self.client.patch(reverse('order-bulk-detail', args=[self.order.id]), payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 1)
+
+    def test_bulk_create_order_items(self):
+        counts = []
+        for rows in (5, 50):
+            payload = [
+                {'order': self.order.id, 'product': self.prods[i % 5].id, 'quantity': 2, 'unit_price': '9.99'}
+                for i in range(rows)
+            ]
+            # lookups, insert, stock and totals cost the same however many rows
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.post(reverse('orderitem-list'), payload, format='json')
+            counts.append(len(ctx))
+            self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(resp.data), rows)
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(self.order.items.count(), 55)
+
+    def test_bulk_create_order_items_reports_row_errors(self):
+        payload = [
+            {'order': self.order.id, 'product': self.prods[0].id, 'quantity': 2, 'unit_price': '9.99'},
+            {'order': self.order.id, 'product': 999999, 'quantity': -1, 'unit_price': '9.99'},
+        ]
+        resp = self.client.post(reverse('orderitem-bulk'), payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(resp.data), [1])
+        self.assertIn('product', resp.data[1])
+        self.assertIn('quantity', resp.data[1])
+        self.assertEqual(self.order.items.count(), 0)
+
+    def test_bulk_update_order_items(self):
+        items = [OrderItem.objects.create(order=self.order, product=p, quantity=1, unit_price=1) for p in self.prods]
+        payload = [{'id': item.id, 'quantity': 4} for item in items]
+        resp = self.client.patch(reverse('orderitem-bulk'), payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(self.order.items.values_list('quantity', flat=True)), {4})
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.items_count, self.order.subtotal), (5, 20))
+
+    def test_bulk_update_unknown_id(self):
+        resp = self.client.patch(reverse('orderitem-bulk'), [{'id': 999999, 'quantity': 4}], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', resp.data[0])
+
+    def test_bulk_delete_order_items(self):
+        items = [OrderItem.objects.create(order=self.order, product=p, quantity=1, unit_price=1) for p in self.prods]
+        resp = self.client.delete(reverse('orderitem-bulk'), {'ids': [i.id for i in items[:3]]}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.order.items.count(), 2)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.items_count, self.order.subtotal), (2, 2))
+
+    def test_bulk_delete_requires_ids(self):
+        resp = self.client.delete(reverse('order-bulk'), {'ids': []}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.prod = Product.objects.create(sku="SKU1", name="One", unit_price=1.00, stock_level=1000)
+        self.list_url = reverse('product-list')
+
+    def test_repeat_read_served_from_cache(self):
+        first = self.client.get(self.list_url, format='json')
+        with self.assertNumQueries(0):
+            second = self.client.get(self.list_url, format='json')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_write_invalidates(self):
+        first = self.client.get(self.list_url, format='json')
+        self.client.patch(reverse('product-detail', args=[self.prod.id]), {'name': 'Renamed'}, format='json')
+        second = self.client.get(self.list_url, format='json')
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertEqual(second.json()[0]['name'], 'Renamed')
+
+    def test_unrelated_write_keeps_entry(self):
+        self.client.get(self.list_url, format='json')
+        Customer.objects.create(name="Zoe", email="zoe@example.com")
+        with self.assertNumQueries(0):
+            self.client.get(self.list_url, format='json')
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.list_url, format='json')['ETag']
+        resp = self.client.get(self.list_url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(resp.content, b'')
+        Product.objects.create(sku="SKU2", name="Two", unit_price=1.00)
+        resp = self.client.get(self.list_url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_bulk_write_invalidates_orders(self):
+        cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        order = Order.objects.create(number="ORD1", customer=cust, shipping_method="tnt", shipping_cost=1)
+        url = reverse('order-detail', args=[order.id])
+        self.assertEqual(self.client.get(url, format='json').json()['items'], [])
+        self.client.post(reverse('orderitem-list'), [
+            {'order': order.id, 'product': self.prod.id, 'quantity': 1, 'unit_price': '1.00'},
+        ], format='json')
+        self.assertEqual(len(self.client.get(url, format='json').json()['items']), 1)
+
+    def test_graphql_cached_and_invalidated(self):
+        query = {'query': 'query { products { name } }'}
+        first = self.client.post('/graphql/', query, format='json')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post('/graphql/', query, format='json').content, first.content)
+        Product.objects.filter(pk=self.prod.pk).delete()
+        self.assertEqual(self.client.post('/graphql/', query, format='json').json(), {'data': {'products': []}})
+
+
+class ExportAPITest(APITestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        self.prod = Product.objects.create(sku="SKU1", name="One", unit_price=1.00, stock_level=1000)
+        self.orders = [
+            Order.objects.create(
+                number=f"ORD{i}", customer=self.cust, shipping_method="tnt", shipping_cost=1,
+                date_and_time=datetime(2024, 1, i + 1, 12, tzinfo=dt_timezone.utc),
+            )
+            for i in range(3)
+        ]
+        for order in self.orders[:2]:
+            OrderItem.objects.create(order=order, product=self.prod, quantity=2, unit_price='2.50')
+        self.url = reverse('order-export')
+
+    def lines(self, resp):
+        return b''.join(resp.streaming_content).decode().splitlines()
+
+    def test_csv_has_a_row_per_item(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(self.lines(resp)))
+        self.assertEqual([r['number'] for r in rows], ['ORD0', 'ORD1', 'ORD2'])
+        self.assertEqual((rows[0]['total'], rows[0]['item_product_sku']), ('6.00', 'SKU1'))
+        self.assertEqual(rows[2]['item_id'], '')
+
+    def test_ndjson_nests_items(self):
+        resp = self.client.get(self.url, {'type': 'ndjson', 'date_from': '2024-01-02'})
+        records = [json.loads(line) for line in self.lines(resp)]
+        self.assertEqual([r['number'] for r in records], ['ORD1', 'ORD2'])
+        self.assertEqual(records[0]['items'][0]['quantity'], 2)
+        self.assertEqual(records[1]['items'], [])
+
+    def test_since_includes_item_changes(self):
+        since = timezone.now()
+        item = self.orders[0].items.get()
+        item.quantity = 3
+        item.save()
+        resp = self.client.get(self.url, {'type': 'ndjson', 'since': since.isoformat()})
+        self.assertEqual([json.loads(line)['number'] for line in self.lines(resp)], ['ORD0'])
+
+    def test_export_query_count(self):
+        # the orders with their customers, then the chunk's items with products
+        with self.assertNumQueries(2):
+            self.lines(self.client.get(self.url, {'type': 'ndjson'}))
+
+    def test_export_command_in_chunks(self):
+        out = StringIO()
+        call_command('export_orders', '--format', 'ndjson', '--chunk-size', '1', '--date-to', '2024-01-02', stdout=out, stderr=StringIO())
+        self.assertEqual([json.loads(line)['number'] for line in out.getvalue().splitlines()], ['ORD0', 'ORD1'])
+
+    def test_unknown_type(self):
+        resp = self.client.get(self.url, {'type': 'xml'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class GraphQLDocumentTest(APITestCase):
+    QUERY = '{ customers { name orderSet { number } } }'
+
+    def setUp(self):
+        prepare.cache_clear()
+        persisted.clear()
+        self.addCleanup(persisted.clear)
+        for i in range(3):
+            Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com")
+
+    def post(self, body, url='/graphql/'):
+        return self.client.post(url, body, content_type='application/json')
+
+    def test_documents_are_parsed_once(self):
+        for _ in range(3):
+            self.assertEqual(len(self.post({'query': self.QUERY}).json()['data']['customers']), 3)
+        info = prepare.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
+        resp = self.post({'query': '{ customers { nope } }'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.post({'query': '{ customers { nope } }'}).json(), resp.json())
+
+    def test_persisted_queries(self):
+        sha = query_hash(self.QUERY)
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': sha}}
+        for url in ('/graphql/', reverse('async-graphql')):
+            persisted.clear()
+            self.assertEqual(self.post({'extensions': extensions}, url).json()['errors'][0]['message'], 'PersistedQueryNotFound')
+            self.assertEqual(self.post({'query': self.QUERY, 'extensions': extensions}, url).status_code, 200)
+            resp = self.post({'extensions': extensions}, url)
+            self.assertEqual(len(resp.json()['data']['customers']), 3)
+        bad = {'persistedQuery': {'version': 1, 'sha256Hash': '0' * 64}}
+        self.assertEqual(self.post({'query': self.QUERY, 'extensions': bad}).status_code, 400)
+
+    def test_persisted_only(self):
+        path = os.path.join(tempfile.mkdtemp(), 'customers.graphql')
+        self.addCleanup(os.remove, path)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.QUERY)
+        out = StringIO()
+        call_command('persist_queries', path, stdout=out)
+        sha = out.getvalue().split()[0]
+        self.assertEqual(sha, query_hash(self.QUERY))
+        with self.settings(GRAPHQL_PERSISTED_ONLY=True):
+            self.assertEqual(self.post({'query': '{ products { sku } }'}).status_code, 400)
+            self.assertEqual(self.post({'query': self.QUERY}).status_code, 200)
+            resp = self.post({'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': sha}}})
+            self.assertEqual(len(resp.json()['data']['customers']), 3)
+
+    def test_depth_and_cost_limits(self):
+        deep = '{ orders { customer { orderSet { items { product { orderitemSet { order { number } } } } } } } }'
+        with self.settings(GRAPHQL_MAX_DEPTH=6):
+            resp = self.post({'query': deep})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('levels deep', resp.json()['errors'][0]['message'])
+
+        query = 'query($n: Int) { customers(limit: $n) { name orderSet { number } } }'
+        with self.settings(GRAPHQL_MAX_COST=100):
+            self.assertEqual(self.post({'query': query, 'variables': {'n': 5}}).status_code, 200)
+            resp = self.post({'query': query})
+            self.assertEqual(resp.status_code, 400)
+            self.assertIn('rows', resp.json()['errors'][0]['message'])
+            resp = self.post({'query': query, 'variables': {'n': 5}}, reverse('async-graphql'))
+            self.assertEqual(resp.status_code, 200)
+
+    def test_doubling_fragments_are_measured_once(self):
+        def chain(levels):
+            # each fragment spreads the one before it twice: 2 ** levels names
+            fragments = ['fragment F0 on CustomerType { name }'] + [
+                f'fragment F{n} on CustomerType {{ ...F{n - 1} ...F{n - 1} }}' for n in range(1, levels + 1)
+            ]
+            return f'{{ customer(id: 1) {{ ...F{levels} }} }}\n' + '\n'.join(fragments)
+
+        query = chain(10)
+        document = prepare(schema.graphql_schema, query).document
+        self.assertEqual(measure(schema.graphql_schema, document, document.definitions[0]), (2, 1 + 2 ** 10))
+
+        started = time.process_time()
+        resp = self.post({'query': chain(40)})
+        self.assertLess(time.process_time() - started, 1)
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('rows', resp.json()['errors'][0]['message'])
+
+    def test_lists_are_capped(self):
+        with self.settings(GRAPHQL_MAX_LIMIT=2):
+            self.assertEqual(len(self.post({'query': '{ customers { name } }'}).json()['data']['customers']), 2)
+            resp = self.post({'query': '{ customers(limit: 50) { name } }'})
+            self.assertEqual(len(resp.json()['data']['customers']), 2)
+        resp = self.post({'query': '{ customers(limit: 0) { name } }'})
+        self.assertIn('limit must be positive', resp.json()['errors'][0]['message'])
+
+
+class AsyncReadTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        self.prod = Product.objects.create(sku="SKU1", name="One", unit_price=1.00, stock_level=1000)
+        for i in range(3):
+            order = Order.objects.create(number=f"ORD{i}", customer=self.cust, shipping_method="tnt", shipping_cost=1)
+            OrderItem.objects.create(order=order, product=self.prod, quantity=i + 1, unit_price=2)
+
+    async def test_lists_match_sync_endpoints(self):
+        for name in ('customer', 'product', 'order'):
+            for params in ({}, {'page_size': 2}):
+                sync = await self.async_client.get(reverse(f'{name}-list'), params, HTTP_ACCEPT='application/json')
+                resp = await self.async_client.get(reverse(f'async-{name}-list'), params)
+                self.assertEqual(resp.status_code, status.HTTP_200_OK)
+                sync, body = sync.json(), resp.json()
+                if 'results' in sync:
+                    self.assertEqual(body['next'], sync['next'] and sync['next'].replace('/api/', '/api/async/', 1))
+                    sync, body = sync['results'], body['results']
+                self.assertEqual(body, sync)
+
+    async def test_retrieve_and_missing(self):
+        order = await Order.objects.aget(number="ORD1")
+        resp = await self.async_client.get(reverse('async-order-detail', args=[order.pk]))
+        self.assertEqual(resp.json()['items'][0]['quantity'], 2)
+        resp = await self.async_client.get(reverse('async-order-detail', args=[999999]))
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_filters_and_bad_values(self):
+        resp = await self.async_client.get(reverse('async-order-list'), {'status': 'pending'})
+        self.assertEqual(len(resp.json()), 3)
+        resp = await self.async_client.get(reverse('async-order-list'), {'customer': 'x'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_async_graphql_batches_levels(self):
+        query = '{ orders { number customer { name } items { quantity product { sku } } } }'
+        sync = self.client.post('/graphql/', {'query': query}, content_type='application/json')
+        # orders, then customers and items together, then products
+        with self.assertNumQueries(4):
+            resp = self.client.post(reverse('async-graphql'), {'query': query}, content_type='application/json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json(), sync.json())
+        self.assertEqual(len(resp.json()['data']['orders']), 3)
+
+
+class ChangeFeedTest(APITestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        self.prod = Product.objects.create(sku="SKU1", name="One", unit_price=1.00, stock_level=1000)
+        self.order = Order.objects.create(number="ORD1", customer=self.cust, shipping_method="tnt", shipping_cost=1)
+
+    async def test_resumes_after_last_sequence(self):
+        url = reverse('change-feed')
+        body = (await self.async_client.get(url, {'limit': 1})).json()
+        self.assertEqual([(e['sequence'], e['topic']) for e in body['events']], [(1, 'product')])
+        self.assertEqual(body['last'], 1)
+        body = (await self.async_client.get(url, {'after': body['last']})).json()
+        self.assertEqual([(e['topic'], e['object_id']) for e in body['events']], [('order', self.order.pk)])
+        self.assertEqual((body['last'], body['next']), (2, None))
+
+        await OrderItem.objects.acreate(order=self.order, product=self.prod, quantity=2, unit_price=2)
+        body = (await self.async_client.get(url, {'after': 2, 'topic': 'order,orderitem'})).json()
+        self.assertEqual([e['topic'] for e in body['events']], ['orderitem', 'order'])
+        self.assertEqual(body['events'][-1]['payload']['total'], '5.00')
+        body = (await self.async_client.get(url, {'after': body['last'], 'wait': 1})).json()
+        self.assertEqual(body['events'], [])
+
+    async def test_bad_parameters(self):
+        for params in ({'after': 'x'}, {'limit': '-1'}, {'topic': 'customer'}):
+            resp = await self.async_client.get(reverse('change-feed'), params)
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_event_stream(self):
+        resp = await self.async_client.get(
+            reverse('change-feed'), {'wait': 0}, headers={'Accept': 'text/event-stream', 'Last-Event-ID': '1'},
+        )
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in resp.streaming_content]).decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertIn('id: 2\nevent: order\ndata: {"sequence":2,', body)
+        self.assertNotIn('id: 1\n', body)
+
+
+class AnalyticsAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        self.prods = [Product.objects.create(sku=f"SKU{i}", name=f"P{i}", unit_price=1, stock_level=1000) for i in range(3)]
+        day = datetime(2024, 3, 10, 12, tzinfo=dt_timezone.utc)
+        for i, (days, method, order_status) in enumerate([
+            (0, 'standard', 'completed'), (0, 'tnt', 'pending'), (1, 'tnt', 'completed'), (1, 'tnt', 'cancelled'),
+        ]):
+            order = Order.objects.create(
+                number=f"ORD{i}", customer=self.cust, shipping_method=method, shipping_cost=2,
+                date_and_time=day + timezone.timedelta(days=days),
+            )
+            OrderItem.objects.create(order=order, product=self.prods[i % 3], quantity=i + 1, unit_price='1.50')
+            order.status = order_status
+            order.save()
+
+    def test_revenue_by_day_skips_cancelled(self):
+        resp = self.client.get(reverse('analytics-revenue'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json(), [
+            {'day': '2024-03-10', 'orders': 2, 'units': 3, 'revenue': '4.50', 'shipping': '4.00'},
+            {'day': '2024-03-11', 'orders': 1, 'units': 3, 'revenue': '4.50', 'shipping': '2.00'},
+        ])
+
+    def test_filters(self):
+        resp = self.client.get(reverse('analytics-revenue'), {'status': 'cancelled,completed', 'date_from': '2024-03-11'})
+        self.assertEqual(resp.json(), [{'day': '2024-03-11', 'orders': 2, 'units': 7, 'revenue': '10.50', 'shipping': '4.00'}])
+        resp = self.client.get(reverse('analytics-shipping-methods'), {'date_to': '2024-03-10'})
+        self.assertEqual([(r['shipping_method'], r['orders']) for r in resp.json()], [('tnt', 1), ('standard', 1)])
+        resp = self.client.get(reverse('analytics-statuses'), {'shipping_method': 'tnt'})
+        self.assertEqual({r['status']: r['revenue'] for r in resp.json()}, {'pending': '3.00', 'completed': '4.50'})
+        resp = self.client.get(reverse('analytics-revenue'), {'date_from': 'yesterday', 'shipping_method': 'pigeon'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(resp.data), {'date_from', 'shipping_method'})
+
+    def test_top_products(self):
+        resp = self.client.get(reverse('analytics-top-products'), {'limit': 2})
+        self.assertEqual(resp.json(), [
+            {'product': self.prods[2].id, 'sku': 'SKU2', 'name': 'P2', 'orders': 1, 'units': 3, 'revenue': '4.50'},
+            {'product': self.prods[1].id, 'sku': 'SKU1', 'name': 'P1', 'orders': 1, 'units': 2, 'revenue': '3.00'},
+        ])
+        resp = self.client.get(reverse('analytics-top-products'), {'limit': 0})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reports_follow_bulk_writes(self):
+        self.client.get(reverse('analytics-revenue'))
+        items = [{'order': Order.objects.get(number='ORD0').id, 'product': self.prods[0].id, 'quantity': 10, 'unit_price': '1.00'}]
+        self.client.post(reverse('orderitem-bulk'), items, format='json')
+        resp = self.client.get(reverse('analytics-revenue'))
+        self.assertEqual(resp.json()[0]['revenue'], '14.50')
+
+    def test_reads_stay_constant_in_queries(self):
+        self.client.get(reverse('analytics-revenue'))
+        # stale markers, then the rollup aggregate
+        with self.assertNumQueries(2):
+            self.client.get(reverse('analytics-revenue'))
+
+    def test_graphql_reports(self):
+        query = """
+            query {
+                revenueByDay(dateFrom: "2024-03-11") { day orders revenue }
+                salesByShippingMethod(status: ["pending"]) { shippingMethod orders }
+                topProducts(limit: 1) { product { sku } units revenue }
+            }
+        """
+        for url in ('/graphql/', reverse('async-graphql')):
+            resp = self.client.post(url, {'query': query}, format='json')
+            self.assertEqual(resp.json(), {'data': {
+                'revenueByDay': [{'day': '2024-03-11', 'orders': 1, 'revenue': '4.50'}],
+                'salesByShippingMethod': [{'shippingMethod': 'tnt', 'orders': 1}],
+                'topProducts': [{'product': {'sku': 'SKU2'}, 'units': 3, 'revenue': '4.50'}],
+            }})
+
+
+class MetricsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        prod = Product.objects.create(sku="SKU1", name="One", unit_price=1, stock_level=1000)
+        for i in range(3):
+            order = Order.objects.create(number=f"ORD{i}", customer=cust, shipping_method="tnt", shipping_cost=1)
+            OrderItem.objects.create(order=order, product=prod, quantity=1, unit_price=1)
+
+    def sample(self, name, **labels):
+        resp = self.client.get(reverse('metrics'))
+        self.assertTrue(resp['Content-Type'].startswith('text/plain; version=0.0.4'))
+        wanted = {f'{k}="{v}"' for k, v in labels.items()}
+        for line in resp.content.decode().splitlines():
+            metric, _, value = line.rpartition(' ')
+            if metric.split('{')[0] == name and wanted <= set(metric.partition('{')[2].rstrip('}').split(',')):
+                return float(value)
+        return 0
+
+    def test_requests_are_counted_per_route(self):
+        before = self.sample('http_request_duration_seconds_count', route='order-list', method='GET', status=200)
+        serialized = self.sample('http_request_serialize_seconds_count', route='order-list')
+        self.client.get(reverse('order-list'))
+        self.client.get(reverse('order-list'))
+        after = self.sample('http_request_duration_seconds_count', route='order-list', method='GET', status=200)
+        self.assertEqual(after - before, 2)
+        self.assertGreater(self.sample('http_request_sql_queries_sum', route='order-list'), 0)
+        # other tests' 400s on this route are timed too, so compare counts
+        self.assertEqual(self.sample('http_request_serialize_seconds_count', route='order-list') - serialized, 2)
+
+    def test_async_views_count_their_queries(self):
+        before = self.sample('http_request_sql_queries_sum', route='async-order-list')
+        self.client.get(reverse('async-order-list'))
+        self.assertGreaterEqual(self.sample('http_request_sql_queries_sum', route='async-order-list') - before, 2)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_graphql_resolver_depth(self):
+        before = self.sample('graphql_resolver_depth_sum', route='graphql/')
+        query = '{ orders { number items { quantity product { sku } } } }'
+        self.client.post('/graphql/', {'query': query}, format='json')
+        # orders > items > product > sku
+        self.assertEqual(self.sample('graphql_resolver_depth_sum', route='graphql/') - before, 4)
+
+    def test_repeated_queries_are_logged(self):
+        self.assertEqual(query_shape('SELECT 1 WHERE id IN (%s, %s, %s)'), query_shape('SELECT 1 WHERE id IN (%s)'))
+        stats = RequestStats()
+        for n in range(10):
+            stats.add_query('SELECT "name" FROM "customer" WHERE "id" = %s', 0.001)
+        stats.add_query('SELECT 1', 0.001)
+        with self.assertLogs('api.metrics', 'WARNING') as logs:
+            stats.report('order-list')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('the same query ran 10 times', logs.output[0])
+        self.assertEqual(self.sample('sql_repeated_queries_total', route='order-list'), 1)
+
+
+class JobAPITest(APITestCase):
+    def setUp(self):
+        cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        Order.objects.create(number="ORD1", customer=cust, shipping_method="tnt", shipping_cost=1)
+        self.exports = tempfile.TemporaryDirectory()
+        self.addCleanup(self.exports.cleanup)
+
+    def test_queue_export_and_download(self):
+        with override_settings(JOB_EXPORT_DIR=self.exports.name):
+            resp = self.client.post(reverse('job-list'), {'kind': 'export_orders', 'params': {'fmt': 'ndjson'}}, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+            self.assertEqual((resp.data['status'], resp.data['progress']), ('queued', None))
+            detail = reverse('job-detail', args=[resp.data['id']])
+            download = reverse('job-download', args=[resp.data['id']])
+            self.assertEqual(self.client.get(download).status_code, status.HTTP_409_CONFLICT)
+
+            self.assertEqual(jobs.run_pending(), 1)
+            resp = self.client.get(detail)
+            self.assertEqual((resp.data['status'], resp.data['progress'], resp.data['done']), ('succeeded', 1.0, 1))
+            self.assertEqual(resp.data['result']['lines'], 1)
+            resp = self.client.get(download)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(b''.join(resp.streaming_content))['number'], 'ORD1')
+
+    def test_rejects_unknown_kind_and_params(self):
+        resp = self.client.post(reverse('job-list'), {'kind': 'nope'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('kind', resp.data)
+        resp = self.client.post(reverse('job-list'), {'kind': 'refresh_rollups', 'params': {'x': 1}}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('params', resp.data)
+
+    def test_list_filters_and_error(self):
+        jobs.enqueue('refresh_rollups')
+        failing = jobs.enqueue('archive_orders', {'before': 'soon'})
+        with self.assertLogs('orders.jobs', 'WARNING'):
+            jobs.run_pending()
+        resp = self.client.get(reverse('job-list'), {'status': 'failed'})
+        self.assertEqual([row['id'] for row in resp.data], [failing.pk])
+        self.assertEqual(resp.data[0]['error'], "orders.jobs.InvalidJob: before must be a date or datetime, not 'soon'.")
+        self.assertEqual(len(self.client.get(reverse('job-list')).data), 2)
+        # queued through the API only
+        self.assertEqual(self.client.delete(reverse('job-detail', args=[failing.pk])).status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+@unittest.skipUnless('replica' in settings.DATABASES, 'needs the replica alias')
+@override_settings(RESPONSE_CACHE_TIMEOUT=0, DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(APITransactionTestCase):
+    # the replica mirrors the test database, so which connection ran the
+    # queries tells where they were routed
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        health.reset()
+        self.prod = Product.objects.create(sku="SKU1", name="One", unit_price=1.00, stock_level=1000)
+
+    def read(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                response = getattr(self.client, method)(*args, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_reads_go_to_replica(self):
+        response, primary, replica = self.read('get', reverse('product-list'))
+        self.assertEqual(response.json()[0]['sku'], 'SKU1')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_graphql_query_goes_to_replica(self):
+        response, primary, replica = self.read('post', '/graphql/', {'query': '{ products { sku } }'}, format='json')
+        self.assertEqual(response.json(), {'data': {'products': [{'sku': 'SKU1'}]}})
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_writer_reads_primary_until_window_ends(self):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.patch(
+                reverse('product-detail', args=[self.prod.id]), {'name': 'Renamed'}, format='json',
+            )
+        self.assertEqual(len(replica), 0)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        response, primary, replica = self.read('get', reverse('product-list'))
+        self.assertEqual(response.json()[0]['name'], 'Renamed')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        self.client.cookies[STICKY_COOKIE] = str(time.time() - 1)
+        _, primary, replica = self.read('get', reverse('product-list'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_rollup_refresh_pins_no_one(self):
+        customer = Customer.objects.create(name="C", email="c@example.com")
+        Order.objects.create(customer=customer, shipping_method="tnt", shipping_cost=1, status="completed")
+        self.assertTrue(StaleRollupDay.objects.exists())
+        response, primary, replica = self.read('get', reverse('analytics-revenue'))
+        self.assertEqual(response.json()[0]['orders'], 1)
+        self.assertFalse(StaleRollupDay.objects.exists())
+        # the check for stale days reads the replica, the rebuilt rows the primary
+        self.assertGreater(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+        _, primary, replica = self.read('get', reverse('analytics-revenue'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=300)
+    def test_replica_responses_carry_no_etag(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        url = reverse('product-list')
+        response, _, replica = self.read('get', url)
+        self.assertGreater(replica, 0)
+        self.assertNotIn('ETag', response)
+        # nor does the entry it left in the cache
+        response, primary, replica = self.read('get', url)
+        self.assertEqual((primary, replica), (0, 0))
+        self.assertNotIn('ETag', response)
+
+        # a pinned client reads the primary, which may be trusted with one
+        self.client.patch(reverse('product-detail', args=[self.prod.id]), {'name': 'Renamed'}, format='json')
+        response, primary, replica = self.read('get', url)
+        self.assertGreater(primary, 0)
+        self.assertIn('ETag', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unhealthy_replica_is_skipped(self):
+        with mock.patch('api.replicas.replication_lag', return_value=60):
+            with self.assertLogs('api.replicas', 'WARNING'):
+                _, primary, replica = self.read('get', reverse('product-list'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        # the answer is kept until the next check
+        _, primary, replica = self.read('get', reverse('product-list'))
+        self.assertEqual(replica, 0)
+
+        health.reset()
+        with mock.patch('api.replicas.replication_lag', side_effect=OperationalError('down')):
+            with self.assertLogs('api.replicas', 'WARNING'):
+                _, primary, replica = self.read('get', reverse('product-list'))
+        self.assertEqual(replica, 0)
+
+    def test_router(self):
+        router = ReplicaRouter()
+        # outside a request everything uses the primary
+        self.assertEqual(router.db_for_read(Product), 'default')
+        self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertTrue(router.allow_migrate('default', 'orders'))
+        self.assertFalse(router.allow_migrate('replica', 'orders'))
@@ -2,8 +2,11 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
-from .views import CustomerViewSet, ProductViewSet, OrderViewSet, OrderItemViewSet
+from .async_views import AsyncCustomerView, AsyncGraphQLView, AsyncOrderView, AsyncProductView
+from .cache import CachedGraphQLView
+from .feed import ChangeFeedView
+from .metrics import metrics_view
+from .views import AnalyticsViewSet, CustomerViewSet, JobViewSet, ProductViewSet, OrderViewSet, OrderItemViewSet
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -11,9 +14,21 @@ router.register(r'customers', CustomerViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'orders', OrderViewSet)
 router.register(r'order-items', OrderItemViewSet)
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
+router.register(r'jobs', JobViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql/', csrf_exempt(CachedGraphQLView.as_view(graphiql=True))),
     path('api/', include(router.urls)),
+    # async read-only mirrors of the list/retrieve routes, for ASGI servers
+    path('api/async/customers/', AsyncCustomerView.as_view(), name='async-customer-list'),
+    path('api/async/customers/<int:pk>/', AsyncCustomerView.as_view(), name='async-customer-detail'),
+    path('api/async/products/', AsyncProductView.as_view(), name='async-product-list'),
+    path('api/async/products/<int:pk>/', AsyncProductView.as_view(), name='async-product-detail'),
+    path('api/async/orders/', AsyncOrderView.as_view(), name='async-order-list'),
+    path('api/async/orders/<int:pk>/', AsyncOrderView.as_view(), name='async-order-detail'),
+    path('api/changes/', ChangeFeedView.as_view(), name='change-feed'),
+    path('graphql/async/', csrf_exempt(AsyncGraphQLView.as_view()), name='async-graphql'),
+    path('metrics', metrics_view, name='metrics'),
 ]
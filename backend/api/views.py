@@ -1,23 +1,176 @@
+import os
+
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import render
-from rest_framework import viewsets
+from django.utils.dateparse import parse_datetime
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
 
-from .serializers import CustomerSerializer, ProductSerializer, OrderSerializer, OrderItemSerializer
-from orders.models import Customer, Product, Order, OrderItem
+from .archive import ArchiveMixin
+from .bulk import BulkModelMixin
+from .cache import CachedResponseMixin
+from .fastpath import FastListMixin
+from .filters import QueryFilterMixin, ANALYTICS_FILTERS, ORDER_FILTERS, ORDER_ITEM_FILTERS, apply_query_filters
+from .pagination import JobPagination, OrderPagination
+from .queryplan import QueryPlanMixin
+from .serializers import (
+    CustomerSerializer, ProductSerializer, OrderSerializer, OrderItemSerializer, OrderWithItemsSerializer,
+    ArchivedOrderSerializer, JobSerializer,
+    OrderStatusChangeSerializer, ProductSalesSerializer, SalesSerializer,
+)
+from orders import analytics, jobs, lifecycle
+from orders.export import EXPORT_FORMATS, export_lines
+from orders.models import Customer, Product, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, DailySales, DailyProductSales, Job
+from orders.stock import CANCELLED
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(CachedResponseMixin, FastListMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
+    cache_models = (Customer,)
 
-class ProductViewSet(viewsets.ModelViewSet):    
+class ProductViewSet(CachedResponseMixin, FastListMixin, QueryPlanMixin, viewsets.ModelViewSet):    
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    cache_models = (Product,)
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(CachedResponseMixin, ArchiveMixin, FastListMixin, BulkModelMixin, QueryFilterMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    query_filters = ORDER_FILTERS
+    query_filter_actions = ('list', 'export')
+    pagination_class = OrderPagination
+    cache_models = (Order, OrderItem, Customer, Product, ArchivedOrder, ArchivedOrderItem)
+    archive_queryset = ArchivedOrder.objects.all()
+    archive_serializer_class = ArchivedOrderSerializer
+    archive_actions = ('list', 'retrieve', 'history')
+
+    def get_serializer_class(self):
+        # orders posted to bulk/ (or put to <id>/bulk/) carry their items
+        if self.action == 'bulk_items' or (self.action == 'bulk' and self.request.method == 'POST'):
+            return OrderWithItemsSerializer
+        return super().get_serializer_class()
+
+    @action(detail=True, methods=['put', 'patch'], url_path='bulk', url_name='bulk-detail')
+    def bulk_items(self, request, pk=None):
+        return self.update(request, partial=request.method == 'PATCH')
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        mode = self.archive_mode()
+        if mode != 'only':
+            try:
+                order = get_object_or_404(Order.objects.only('status'), pk=pk)
+            except Http404:
+                if mode == 'exclude':
+                    raise
+            else:
+                changes = order.status_changes.order_by('changed_at', 'id')
+                return Response({
+                    'status': order.status,
+                    'next_statuses': list(lifecycle.next_statuses(order.status)),
+                    'changes': OrderStatusChangeSerializer(changes, many=True).data,
+                })
+        # archived orders are read-only, so they have nowhere to go
+        order = get_object_or_404(ArchivedOrder.objects.only('status', 'status_history'), pk=pk)
+        changes = [
+            {'from_status': old, 'to_status': new, 'changed_at': parse_datetime(at)}
+            for old, new, at in order.status_history
+        ]
+        return Response({
+            'status': order.status,
+            'next_statuses': [],
+            'changes': OrderStatusChangeSerializer(changes, many=True).data,
+        })
 
-class OrderItemViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # ?type= rather than ?format=, which DRF keeps for renderer selection
+        fmt = request.query_params.get('type', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            raise serializers.ValidationError({'type': [f"Expected one of: {', '.join(EXPORT_FORMATS)}."]})
+        queryset = self.filter_queryset(Order.objects.all())
+        response = StreamingHttpResponse(export_lines(queryset, fmt), content_type=EXPORT_FORMATS[fmt][1])
+        response['Content-Disposition'] = f'attachment; filename="orders.{fmt}"'
+        return response
+
+class OrderItemViewSet(CachedResponseMixin, FastListMixin, BulkModelMixin, QueryFilterMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
+    query_filters = ORDER_ITEM_FILTERS
+    cache_models = (OrderItem, Order, Product)
+
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Background jobs: POST ``kind`` and ``params`` to queue one, then GET it
+    to follow its progress. ``manage.py run_workers`` runs them.
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    pagination_class = JobPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset().order_by('-id')
+        for name in ('status', 'kind'):
+            value = self.request.query_params.get(name)
+            if value:
+                queryset = queryset.filter(**{name: value})
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.kind != 'export_orders':
+            raise Http404
+        if job.status != jobs.SUCCEEDED:
+            return Response({'detail': 'The export has not finished.', 'status': job.status},
+                            status=status.HTTP_409_CONFLICT)
+        path, fmt = job.result['path'], job.result['format']
+        if not os.path.exists(path):
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'orders-{job.pk}.{fmt}',
+                            content_type=EXPORT_FORMATS[fmt][1])
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """
+    Sales reports aggregated from the daily rollups. Every report takes
+    ``date_from``/``date_to`` (days, inclusive), ``status`` and
+    ``shipping_method``; cancelled orders are left out unless ``status``
+    asks for them.
+    """
+    top_products_limit = 10
+    max_top_products_limit = 100
+
+    def rows(self, model):
+        rows = analytics.rollups(model)
+        if not self.request.query_params.get('status'):
+            rows = rows.exclude(status=CANCELLED)
+        return apply_query_filters(rows, self.request.query_params, ANALYTICS_FILTERS)
+
+    @action(detail=False, methods=['get'])
+    def revenue(self, request):
+        return Response(SalesSerializer(analytics.revenue_by_day(self.rows(DailySales)), many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='shipping-methods')
+    def shipping_methods(self, request):
+        rows = analytics.sales_by(self.rows(DailySales), 'shipping_method')
+        return Response(SalesSerializer(rows, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def statuses(self, request):
+        return Response(SalesSerializer(analytics.sales_by(self.rows(DailySales), 'status'), many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='top-products')
+    def top_products(self, request):
+        limit = request.query_params.get('limit', self.top_products_limit)
+        try:
+            limit = int(limit)
+            if not 1 <= limit <= self.max_top_products_limit:
+                raise ValueError
+        except ValueError:
+            raise serializers.ValidationError({'limit': [f'Expected a number from 1 to {self.max_top_products_limit}.']})
+        rows = analytics.top_products(self.rows(DailyProductSales), limit)
+        return Response(ProductSalesSerializer(rows, many=True).data)
 # Create your views here.
@@ -53,12 +53,24 @@ INSTALLED_APPS = [
     'graphene_django'
 ]
 
+REST_FRAMEWORK = {
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.KeysetPagination",
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.fastpath.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "EXCEPTION_HANDLER": "api.exceptions.exception_handler",
+}
+
 GRAPHENE = {
-    "SCHEMA": "orders.schema.schema"
+    "SCHEMA": "orders.schema.schema",
+    "MIDDLEWARE": ["api.metrics.ResolverDepthMiddleware"],
 }
 
 
 MIDDLEWARE = [
+    'api.metrics.InstrumentationMiddleware',
+    'api.replicas.ReplicaMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -100,8 +112,85 @@ DATABASES = {
         'PASSWORD': 'password',  # Your PostgreSQL password
         'HOST': 'localhost',        # The host of your database server
         'PORT': '5432',             # The port number (default is 5432)
+        # keep connections open between requests, checked before reuse
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# A streaming standby of the primary; point HOST at it. Tests read it from
+# the test database, as a real replica would have replayed the writes.
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+# Reads of GET requests and GraphQL queries go to a healthy one of
+# DATABASE_REPLICAS, see api/replicas.py. A replica is left out while it is
+# unreachable or more than DATABASE_REPLICA_MAX_LAG seconds behind, checked
+# every DATABASE_REPLICA_CHECK_SECONDS. A client that writes reads from the
+# primary for the next DATABASE_STICKY_SECONDS.
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICA_MAX_LAG = 5
+DATABASE_REPLICA_CHECK_SECONDS = 5
+DATABASE_STICKY_SECONDS = 10
+# Tables a read may write to bring up to date (the sales rollups, see
+# orders/analytics.py): the writes are not the client's, so they pin no one.
+DATABASE_UNPINNED_MODELS = ['orders.DailySales', 'orders.DailyProductSales', 'orders.StaleRollupDay']
+
+
+# Caching
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'files': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'responses',
+    },
+}
+
+# Cache holding API responses and the per-model data versions that
+# invalidate them. LocMemCache is per process; use 'files' when several
+# worker processes on one host must see each other's invalidations.
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300  # seconds, 0 disables response caching
+
+
+# Request instrumentation, see api/metrics.py. Queries slower than this are
+# logged, and so is any query run this many times within one request.
+SLOW_QUERY_SECONDS = 0.2
+N_PLUS_ONE_THRESHOLD = 10
+
+
+# GraphQL limits, see api/documents.py. Queries nested deeper than
+# GRAPHQL_MAX_DEPTH, or estimated to read more than GRAPHQL_MAX_COST rows,
+# are refused before they run; lists return at most GRAPHQL_MAX_LIMIT rows.
+# With GRAPHQL_PERSISTED_ONLY only queries registered with
+# manage.py persist_queries are run.
+GRAPHQL_MAX_DEPTH = 8
+GRAPHQL_MAX_COST = 100000
+GRAPHQL_MAX_LIMIT = 1000
+GRAPHQL_PERSISTED_ONLY = False
+
+
+# Numbers given to orders created without one, see orders/numbering.py. The
+# format gets the counter value as seq and the local date as date; with
+# ORDER_NUMBER_CHECK_DIGIT a Luhn digit over its digits is appended. Each
+# process reserves ORDER_NUMBER_BLOCK_SIZE values per database round trip.
+ORDER_NUMBER_FORMAT = 'ORD{date:%y%m%d}{seq:07d}'
+ORDER_NUMBER_CHECK_DIGIT = True
+ORDER_NUMBER_BLOCK_SIZE = 100
+
+
+# Background jobs, see orders/jobs.py, run by manage.py run_workers. A job
+# that raises is retried up to JOB_MAX_ATTEMPTS times in all, JOB_RETRY_DELAY
+# seconds later and doubling; one whose worker has not reported progress for
+# JOB_LEASE_SECONDS is handed to another worker. Export jobs write their
+# files to JOB_EXPORT_DIR.
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 30
+JOB_LEASE_SECONDS = 300
+JOB_EXPORT_DIR = BASE_DIR / '.exports'
 
 
 # Password validation
@@ -1,8 +1,157 @@
+import json
+
 from django.contrib import admin
-from .models import Customer, Product, Order, OrderItem
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Customer, Job, NumberSequence, Order, OrderItem, OrderStatusChange,
+    OutboxEvent, PersistedQuery, Product,
+)
+
+# Changelists above this many rows, by the planner's estimate, show the
+# estimate instead of running an exact COUNT(*) over the table.
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimated_count(queryset):
+    """
+    The Postgres planner's estimate of the rows in ``queryset``, from the
+    table statistics and without reading it; None on other databases.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+            return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin for tables of millions of rows: one count per changelist,
+    estimated when large, and no unfiltered total next to a filtered one.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class ReadOnlyAdminMixin:
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Customer)
+class CustomerAdmin(LargeTableAdmin):
+    list_display = ('name', 'email', 'created_at')
+    # icontains on both is served by the trigram indexes of migration 0007
+    search_fields = ('name', 'email')
+    ordering = ('-id',)
+
+
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+    list_display = ('sku', 'name', 'unit_price', 'stock_level')
+    search_fields = ('sku', 'name')
+    ordering = ('sku',)
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    autocomplete_fields = ('product',)
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+
+class OrderStatusChangeInline(ReadOnlyAdminMixin, admin.TabularInline):
+    model = OrderStatusChange
+    fields = ('from_status', 'to_status', 'changed_at')
+    ordering = ('changed_at',)
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ('number', 'customer', 'status', 'shipping_method', 'total', 'date_and_time')
+    list_select_related = ('customer',)
+    # served by order_status_date_idx
+    list_filter = ('status',)
+    # exact matches on the unique number
+    search_fields = ('=number',)
+    # a backward scan of order_date_id_idx
+    ordering = ('-date_and_time', '-id')
+    autocomplete_fields = ('customer',)
+    readonly_fields = ('items_count', 'subtotal', 'total')
+    inlines = (OrderItemInline, OrderStatusChangeInline)
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'unit_price')
+    # the order's __str__ names its customer
+    list_select_related = ('order__customer', 'product')
+    search_fields = ('=order__number',)
+    ordering = ('-id',)
+    raw_id_fields = ('order',)
+    autocomplete_fields = ('product',)
+
+
+class ArchivedOrderItemInline(ReadOnlyAdminMixin, admin.TabularInline):
+    model = ArchivedOrderItem
+    fields = ('product', 'quantity', 'unit_price')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(ReadOnlyAdminMixin, LargeTableAdmin):
+    list_display = ('number', 'customer', 'status', 'total', 'date_and_time', 'archived_at')
+    list_select_related = ('customer',)
+    # archivedorder_number_idx and archivedorder_date_id_idx
+    search_fields = ('=number',)
+    ordering = ('-date_and_time', '-id')
+    inlines = (ArchivedOrderItemInline,)
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(ReadOnlyAdminMixin, LargeTableAdmin):
+    list_display = ('id', 'sequence', 'topic', 'object_id', 'action', 'created_at')
+    ordering = ('-id',)
+
+
+@admin.register(Job)
+class JobAdmin(ReadOnlyAdminMixin, LargeTableAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'done', 'total', 'created_at', 'finished_at')
+    ordering = ('-id',)
+
+
+@admin.register(NumberSequence)
+class NumberSequenceAdmin(ReadOnlyAdminMixin, admin.ModelAdmin):
+    list_display = ('name', 'last_value')
+
+
+@admin.register(PersistedQuery)
+class PersistedQueryAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'created_at')
+    search_fields = ('=sha256',)
+    readonly_fields = ('sha256', 'created_at')
 
-# Register your models here.
-admin.site.register(Customer)
-admin.site.register(Product)
-admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+    def has_add_permission(self, request):
+        # registered with manage.py persist_queries, which checks them first
+        return False
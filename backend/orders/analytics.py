@@ -0,0 +1,225 @@
+from datetime import datetime, time, timedelta
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, DateField, DateTimeField, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+# Sales are aggregated per day into DailySales (per status and shipping
+# method) and DailyProductSales (per product too), so a dashboard reads a
+# few hundred rollup rows however many years of orders there are.
+#
+# Writes never touch the rollups themselves: every write to an order or item
+# records the order's day in StaleRollupDay (an insert, so concurrent writers
+# never wait on each other), and the stale days are rebuilt from the orders
+# with SQL aggregates before the next read. Days belong to the default
+# timezone.
+
+# Days rebuilt per statement
+ROLLUP_BATCH_DAYS = 31
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _tz():
+    return timezone.get_default_timezone()
+
+
+def order_day(moment):
+    # a value assigned to date_and_time may still be a string
+    moment = DateTimeField().to_python(moment)
+    return timezone.localdate(moment, _tz()) if timezone.is_aware(moment) else moment.date()
+
+
+def _day(path='date_and_time'):
+    return TruncDay(path, output_field=DateField(), tzinfo=_tz())
+
+
+def _on_days(days, path='date_and_time'):
+    # ranges rather than a truncated column, so the date index is used;
+    # consecutive days share one range
+    spans = []
+    for day in sorted(days):
+        if spans and spans[-1][1] == day:
+            spans[-1][1] = day + timedelta(days=1)
+        else:
+            spans.append([day, day + timedelta(days=1)])
+    return reduce(or_, (
+        Q(**{f'{path}__gte': _midnight(start), f'{path}__lt': _midnight(end)}) for start, end in spans
+    ))
+
+
+def _midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min), _tz())
+
+
+def mark_days(days):
+    """
+    Record that the rollups of ``days`` need rebuilding.
+    """
+    from .models import StaleRollupDay
+
+    days = {day for day in days if day is not None}
+    if days:
+        StaleRollupDay.objects.bulk_create([StaleRollupDay(day=day) for day in sorted(days)])
+
+
+def mark_orders(order_ids):
+    """
+    Record that the rollups of the days of ``order_ids`` need rebuilding.
+    """
+    from .models import Order
+
+    order_ids = {pk for pk in order_ids if pk is not None}
+    if order_ids:
+        moments = Order.objects.filter(pk__in=order_ids).values_list('date_and_time', flat=True)
+        mark_days(order_day(moment) for moment in moments)
+
+
+def rebuild_days(days):
+    """
+    Replace the rollups of ``days`` with fresh aggregates of their orders,
+    archived ones included.
+    """
+    from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem, DailySales, DailyProductSales
+
+    days = sorted(set(days))
+    if not days:
+        return
+    buckets, products = {}, {}
+    for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        _aggregate(order_model, item_model, days, buckets, products)
+
+    DailySales.objects.filter(day__in=days).delete()
+    DailySales.objects.bulk_create(buckets.values())
+    DailyProductSales.objects.filter(day__in=days).delete()
+    DailyProductSales.objects.bulk_create(products.values())
+
+
+def _aggregate(order_model, item_model, days, buckets, products):
+    # adds one pair of order/item tables to the buckets; an order is in one
+    # of the pairs only, so the counts add up
+    from .models import DailySales, DailyProductSales
+
+    orders = (
+        order_model.objects.filter(_on_days(days)).order_by()
+        .values(d=_day(), s=F('status'), m=F('shipping_method'))
+        .annotate(orders=Count('pk'), shipping=Sum('shipping_cost', output_field=MONEY))
+    )
+    for row in orders:
+        key = row['d'], row['s'], row['m']
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = DailySales(day=row['d'], status=row['s'], shipping_method=row['m'])
+        bucket.orders += row['orders']
+        bucket.shipping += row['shipping']
+    items = item_model.objects.filter(_on_days(days, 'order__date_and_time')).order_by()
+    lines = items.values(d=_day('order__date_and_time'), s=F('order__status'), m=F('order__shipping_method')).annotate(
+        units=Sum('quantity'), revenue=Sum(F('quantity') * F('unit_price'), output_field=MONEY),
+    )
+    for row in lines:
+        bucket = buckets[row['d'], row['s'], row['m']]
+        bucket.units += row['units']
+        bucket.revenue += row['revenue']
+    lines = items.values(
+        d=_day('order__date_and_time'), p=F('product'), s=F('order__status'), m=F('order__shipping_method')
+    ).annotate(
+        orders=Count('order', distinct=True), units=Sum('quantity'),
+        revenue=Sum(F('quantity') * F('unit_price'), output_field=MONEY),
+    )
+    for row in lines:
+        key = row['d'], row['p'], row['s'], row['m']
+        product = products.get(key)
+        if product is None:
+            product = products[key] = DailyProductSales(day=row['d'], product_id=row['p'], status=row['s'], shipping_method=row['m'])
+        product.orders += row['orders']
+        product.units += row['units']
+        product.revenue += row['revenue']
+
+
+def refresh(max_days=None):
+    """
+    Rebuild the rollups of every stale day, or of the earliest ``max_days``
+    of them; returns how many were rebuilt.
+
+    The stale markers are locked while their days are rebuilt, so a second
+    refresh waits for the first rather than rebuilding the same days from an
+    older snapshot. Markers written after the lock was taken are left for
+    the next refresh.
+    """
+    from .models import StaleRollupDay
+
+    # the usual case, without opening a transaction
+    if not StaleRollupDay.objects.exists():
+        return 0
+    with transaction.atomic():
+        stale = list(StaleRollupDay.objects.select_for_update().order_by('pk').values_list('pk', 'day'))
+        if not stale:
+            return 0
+        days = sorted({day for _, day in stale})[:max_days]
+        for start in range(0, len(days), ROLLUP_BATCH_DAYS):
+            rebuild_days(days[start:start + ROLLUP_BATCH_DAYS])
+        chosen = set(days)
+        pks = [pk for pk, day in stale if day in chosen]
+        for start in range(0, len(pks), 1000):
+            StaleRollupDay.objects.filter(pk__in=pks[start:start + 1000]).delete()
+    return len(days)
+
+
+def stale_days():
+    """
+    How many days' rollups are waiting to be rebuilt.
+    """
+    from .models import StaleRollupDay
+
+    return StaleRollupDay.objects.order_by().values('day').distinct().count()
+
+
+def mark_all():
+    """
+    Mark every day that has orders stale, for a full rebuild.
+    """
+    from .models import Order, ArchivedOrder, DailySales
+
+    days = set(Order.objects.order_by().values_list(_day(), flat=True).distinct())
+    days.update(ArchivedOrder.objects.order_by().values_list(_day(), flat=True).distinct())
+    days.update(DailySales.objects.order_by().values_list('day', flat=True).distinct())
+    mark_days(days)
+    return len(days)
+
+
+def rollups(model):
+    """
+    The rows of a rollup model, brought up to date first.
+    """
+    refresh()
+    return model.objects.all()
+
+
+def _totals(rows, *group_by):
+    return rows.order_by().values(*group_by).annotate(
+        orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'),
+    )
+
+
+def revenue_by_day(rows):
+    """
+    Orders, units, revenue and shipping per day over DailySales ``rows``.
+    """
+    return _totals(rows, 'day').annotate(shipping=Sum('shipping')).order_by('day')
+
+
+def sales_by(rows, field):
+    """
+    The same totals per ``field`` (``status`` or ``shipping_method``).
+    """
+    return _totals(rows, field).annotate(shipping=Sum('shipping')).order_by('-revenue', field)
+
+
+def top_products(rows, limit=10):
+    """
+    Products by revenue over DailyProductSales ``rows``.
+    """
+    return _totals(rows, 'product', 'product__sku', 'product__name').order_by('-revenue', 'product')[:limit]
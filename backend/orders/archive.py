@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from . import outbox
+from .lifecycle import COMPLETED
+from .stock import CANCELLED
+from .versions import bump
+
+# Finished orders older than a cutoff move, with their items and status
+# history, from the hot Order/OrderItem tables into ArchivedOrder and
+# ArchivedOrderItem, so the indexes every write and read goes through only
+# cover the orders still being worked on.
+#
+# Archiving moves rows, it does not delete orders: the stock their items
+# hold stays taken and the sales rollups, which aggregate both sets of
+# tables, keep counting them. So the hot rows are removed without the
+# delete signals.
+
+ARCHIVABLE_STATUSES = (COMPLETED, CANCELLED)
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def _columns(archive_model, model):
+    names = {f.attname for f in model._meta.concrete_fields}
+    return [f.attname for f in archive_model._meta.concrete_fields if f.attname in names]
+
+
+def candidates(before, statuses=ARCHIVABLE_STATUSES):
+    from .models import Order
+
+    return Order.objects.filter(status__in=statuses, date_and_time__lt=before)
+
+
+def archive_batch(before, statuses=ARCHIVABLE_STATUSES, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move the ``batch_size`` oldest-by-id orders due for archiving, in one
+    transaction; returns how many orders and items moved. A batch either
+    moves completely or not at all, so an interrupted run is picked up by
+    simply running again.
+    """
+    from .models import Order, OrderItem, OrderStatusChange, ArchivedOrder, ArchivedOrderItem
+
+    now = timezone.now()
+    using = router.db_for_write(Order)
+    with transaction.atomic(using=using):
+        # locked, so an order cannot change status while it is moved
+        ids = list(
+            candidates(before, statuses).select_for_update().order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0, 0
+
+        history = defaultdict(list)
+        changes = OrderStatusChange.objects.filter(order__in=ids).order_by('changed_at', 'pk')
+        for order_id, old, new, at in changes.values_list('order', 'from_status', 'to_status', 'changed_at'):
+            history[order_id].append([old, new, at.isoformat()])
+
+        columns = _columns(ArchivedOrder, Order)
+        ArchivedOrder.objects.bulk_create(
+            ArchivedOrder(**row, status_history=history[row['id']], archived_at=now)
+            for row in Order.objects.filter(pk__in=ids).values(*columns)
+        )
+        columns = _columns(ArchivedOrderItem, OrderItem)
+        items = [ArchivedOrderItem(**row) for row in OrderItem.objects.filter(order__in=ids).values(*columns)]
+        ArchivedOrderItem.objects.bulk_create(items, batch_size=batch_size)
+
+        for queryset in (
+            OrderStatusChange.objects.filter(order__in=ids),
+            OrderItem.objects.filter(order__in=ids),
+            Order.objects.filter(pk__in=ids),
+        ):
+            queryset._raw_delete(using)
+        outbox.emit(OrderItem, [item.id for item in items], outbox.ARCHIVED)
+        outbox.emit(Order, ids, outbox.ARCHIVED)
+    bump(Order, OrderItem, ArchivedOrder, ArchivedOrderItem)
+    return len(ids), len(items)
+
+
+def archive(before, statuses=ARCHIVABLE_STATUSES, batch_size=ARCHIVE_BATCH_SIZE, limit=None):
+    """
+    Archive batches until nothing is due or ``limit`` orders moved, yielding
+    the (orders, items) of each batch.
+    """
+    moved = 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        orders, items = archive_batch(before, statuses, size)
+        if not orders:
+            return
+        moved += orders
+        yield orders, items
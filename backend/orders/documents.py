@@ -0,0 +1,179 @@
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from graphql import (
+    FieldNode, FragmentDefinitionNode, FragmentSpreadNode, GraphQLError, GraphQLInt, GraphQLList, GraphQLNonNull,
+    get_named_type, parse, validate,
+)
+from graphql.utilities import value_from_ast
+
+# What /graphql/ does with a query string before running it (the views are
+# in api/documents.py). Parsing and validating it against the schema only
+# depends on the text, so the result is kept in an LRU cache and repeated
+# queries skip both. Clients can also send the sha256 of a query instead of
+# the text (Apollo's automatic persisted queries): hashes seen with their
+# text, or registered with manage.py persist_queries, are looked up.
+#
+# Before a query runs, its depth and an estimate of the rows it reads are
+# checked against GRAPHQL_MAX_DEPTH and GRAPHQL_MAX_COST. Every field costs
+# one, times the rows of the lists it is nested in: a list taking ``limit``
+# counts that many (GRAPHQL_MAX_LIMIT without one, which the resolvers cap
+# to as well), a relation list LIST_FANOUT.
+
+DOCUMENT_CACHE_SIZE = 512
+PERSISTED_CACHE_SIZE = 1024
+LIST_FANOUT = 10
+
+Prepared = namedtuple('Prepared', 'document errors')
+
+
+@lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def prepare(schema, query, rules=None):
+    """
+    The parsed document of ``query`` and its validation errors, cached by
+    the query text.
+    """
+    try:
+        document = parse(query)
+    except GraphQLError as exc:
+        return Prepared(None, (exc,))
+    return Prepared(document, tuple(validate(schema, document, rules)))
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class PersistedQueries:
+    """
+    The query texts of hashes, from the PersistedQuery table or remembered
+    from requests that sent both; the most recently used are kept in memory.
+    """
+    def __init__(self, size=PERSISTED_CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.queries = OrderedDict()
+
+    def remember(self, sha, query):
+        with self.lock:
+            self.queries[sha] = query
+            self.queries.move_to_end(sha)
+            if len(self.queries) > self.size:
+                self.queries.popitem(last=False)
+
+    def get(self, sha):
+        from .models import PersistedQuery
+
+        with self.lock:
+            query = self.queries.get(sha)
+            if query is not None:
+                self.queries.move_to_end(sha)
+                return query
+        query = PersistedQuery.objects.filter(sha256=sha).values_list('query', flat=True).first()
+        if query is not None:
+            self.remember(sha, query)
+        return query
+
+    def clear(self):
+        with self.lock:
+            self.queries.clear()
+
+
+persisted = PersistedQueries()
+
+
+def _list_size(field_def, node, variables):
+    if 'limit' not in field_def.args:
+        return LIST_FANOUT
+    cap = settings.GRAPHQL_MAX_LIMIT
+    for argument in node.arguments:
+        if argument.name.value == 'limit':
+            limit = value_from_ast(argument.value, GraphQLInt, variables)
+            if isinstance(limit, int) and limit > 0:
+                return min(limit, cap)
+    return cap
+
+
+class _Meter:
+    """
+    Depths and costs of selection sets. Each fragment is measured once per
+    type it is spread on, so spreading one many times costs no more to
+    measure than spelling it out once; and a set stops being measured once
+    it goes over GRAPHQL_MAX_DEPTH or GRAPHQL_MAX_COST, as the query is
+    refused either way.
+    """
+    def __init__(self, schema, fragments, variables):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables
+        self.max_depth = settings.GRAPHQL_MAX_DEPTH
+        self.max_cost = settings.GRAPHQL_MAX_COST
+        self.spreads = {}
+
+    def spread(self, name, parent):
+        key = (name, parent.name)
+        if key not in self.spreads:
+            fragment = self.fragments[name]
+            self.spreads[key] = self.fragment(fragment, parent)
+        return self.spreads[key]
+
+    def fragment(self, fragment, parent):
+        condition = fragment.type_condition
+        target = self.schema.get_type(condition.name.value) if condition is not None else parent
+        return self.measure(target, fragment.selection_set)
+
+    def measure(self, parent, selection_set):
+        """
+        The depth and cost of a selection set on ``parent``.
+        """
+        depth = cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                # introspection reads the schema, not the database
+                if name.startswith('__'):
+                    continue
+                field_def = parent.fields[name]
+                if selection.selection_set is None:
+                    depth, cost = max(depth, 1), cost + 1
+                    continue
+                field_type = field_def.type
+                if isinstance(field_type, GraphQLNonNull):
+                    field_type = field_type.of_type
+                size = _list_size(field_def, selection, self.variables) if isinstance(field_type, GraphQLList) else 1
+                inner_depth, inner_cost = self.measure(get_named_type(field_type), selection.selection_set)
+                depth, cost = max(depth, inner_depth + 1), cost + 1 + size * inner_cost
+            elif isinstance(selection, FragmentSpreadNode):
+                inner_depth, inner_cost = self.spread(selection.name.value, parent)
+                depth, cost = max(depth, inner_depth), cost + inner_cost
+            else:
+                inner_depth, inner_cost = self.fragment(selection, parent)
+                depth, cost = max(depth, inner_depth), cost + inner_cost
+            if depth > self.max_depth or cost > self.max_cost:
+                break
+        return depth, cost
+
+
+def measure(schema, document, operation, variables=None):
+    """
+    The depth and estimated cost of running ``operation`` of ``document``;
+    past GRAPHQL_MAX_DEPTH or GRAPHQL_MAX_COST, only how far it got.
+    """
+    fragments = {d.name.value: d for d in document.definitions if isinstance(d, FragmentDefinitionNode)}
+    root = schema.get_root_type(operation.operation)
+    return _Meter(schema, fragments, variables or {}).measure(root, operation.selection_set)
+
+
+def check_limits(schema, document, operation, variables=None):
+    depth, cost = measure(schema, document, operation, variables)
+    if depth > settings.GRAPHQL_MAX_DEPTH:
+        return [GraphQLError(f"The query is {depth} or more levels deep; the limit is {settings.GRAPHQL_MAX_DEPTH}.")]
+    if cost > settings.GRAPHQL_MAX_COST:
+        return [GraphQLError(
+            f"The query could read {cost} rows or more; the limit is {settings.GRAPHQL_MAX_COST}. "
+            "Ask for fewer rows with limit, or fewer nested lists."
+        )]
+    return []
@@ -0,0 +1,122 @@
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import Order, OrderItem
+
+# Orders fetched (with their items and customer) per round trip. The export
+# holds one chunk at a time, so memory stays flat however many orders match.
+EXPORT_CHUNK_SIZE = 2000
+
+ORDER_COLUMNS = [
+    'id', 'number', 'date_and_time', 'customer_id', 'customer_name', 'customer_email', 'shipping_method',
+    'shipping_cost', 'status', 'items_count', 'subtotal', 'total', 'created_at', 'updated_at',
+]
+ITEM_COLUMNS = ['id', 'product_id', 'product_sku', 'product_name', 'quantity', 'unit_price', 'updated_at']
+
+
+def export_queryset(queryset=None):
+    """
+    The orders to export, in primary key order, with everything a record
+    needs loaded alongside each chunk.
+    """
+    if queryset is None:
+        queryset = Order.objects.all()
+    items = OrderItem.objects.select_related('product').order_by('pk')
+    return queryset.select_related('customer').prefetch_related(Prefetch('items', queryset=items)).order_by('pk')
+
+
+def _value(value):
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (int, str)):
+        return value
+    return str(value)
+
+
+def order_record(order):
+    customer = order.customer
+    record = {
+        'id': order.pk,
+        'number': order.number,
+        'date_and_time': _value(order.date_and_time),
+        'customer_id': order.customer_id,
+        'customer_name': customer.name,
+        'customer_email': customer.email,
+        'shipping_method': order.shipping_method,
+        'shipping_cost': _value(order.shipping_cost),
+        'status': order.status,
+        'items_count': order.items_count,
+        'subtotal': _value(order.subtotal),
+        'total': _value(order.total),
+        'created_at': _value(order.created_at),
+        'updated_at': _value(order.updated_at),
+    }
+    record['items'] = [
+        {
+            'id': item.pk,
+            'product_id': item.product_id,
+            'product_sku': item.product.sku,
+            'product_name': item.product.name,
+            'quantity': item.quantity,
+            'unit_price': _value(item.unit_price),
+            'updated_at': _value(item.updated_at),
+        }
+        for item in order.items.all()
+    ]
+    return record
+
+
+def iter_records(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    # iterator() streams from a server-side cursor where the backend has
+    # them and prefetches the items one chunk at a time
+    for order in export_queryset(queryset).iterator(chunk_size=chunk_size):
+        yield order_record(order)
+
+
+class _Line:
+    # csv.writer target that hands the formatted line straight back
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    """
+    One row per item, the order's columns repeated on each; an order without
+    items gets a single row with the item columns left blank.
+    """
+    writer = csv.writer(_Line())
+    yield writer.writerow(ORDER_COLUMNS + [f'item_{name}' for name in ITEM_COLUMNS])
+    blank = [None] * len(ITEM_COLUMNS)
+    for record in records:
+        order = [record[name] for name in ORDER_COLUMNS]
+        if not record['items']:
+            yield writer.writerow(order + blank)
+        for item in record['items']:
+            yield writer.writerow(order + [item[name] for name in ITEM_COLUMNS])
+
+
+def ndjson_lines(records):
+    """
+    One JSON object per order, with its items nested.
+    """
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
+
+
+def export_lines(queryset, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Return the lines of ``queryset`` exported as ``fmt`` (a key of
+    EXPORT_FORMATS), generated lazily one chunk of orders at a time.
+    """
+    lines, _ = EXPORT_FORMATS[fmt]
+    return lines(iter_records(queryset, chunk_size))
@@ -0,0 +1,331 @@
+import csv
+import io
+import json
+from collections import Counter
+from itertools import groupby, islice
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from . import analytics, lifecycle, outbox
+from .models import Customer, Product, Order, OrderItem
+from .totals import ZERO, line_total
+from .versions import bump
+
+# Rows validated and loaded per transaction. Every check that needs the
+# database (uniqueness, foreign keys) runs once per batch, not once per row.
+IMPORT_BATCH_SIZE = 5000
+
+
+def read_records(stream, fmt):
+    """
+    Yield ``(line, record)`` pairs from a CSV (with a header row) or NDJSON
+    stream, without reading it all into memory.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as exc:
+            yield line, exc
+            continue
+        yield line, record if isinstance(record, dict) else ValueError('Expected a JSON object.')
+
+
+def order_records(records):
+    """
+    Fold CSV rows carrying one item each (the export_orders layout: order
+    columns repeated, item columns prefixed ``item_``) into order records
+    with nested items. Rows of one order must be consecutive, and an order
+    without a number has a single row.
+    """
+    def number(pair):
+        # an order left unnumbered is one row: the server numbers each apart
+        line, record = pair
+        return (record.get('number') or (line,)) if isinstance(record, dict) else (line,)
+
+    for _, pairs in groupby(records, key=number):
+        pairs = list(pairs)
+        line, first = pairs[0]
+        if not isinstance(first, dict) or 'items' in first:
+            yield from pairs
+            continue
+        order = {k: v for k, v in first.items() if not k.startswith('item_')}
+        order['items'] = [
+            {k[len('item_'):]: v for k, v in record.items() if k.startswith('item_')}
+            for _, record in pairs
+        ]
+        # an order exported without items has one row with blank item columns
+        order['items'] = [item for item in order['items'] if any(v not in (None, '') for v in item.values())]
+        yield line, order
+
+
+def _clean(model, name, value, errors, key=None):
+    field = model._meta.get_field(name)
+    if value in (None, '') and field.has_default():
+        return field.get_default()
+    if value in (None, '') and field.blank and not field.null:
+        return ''
+    if isinstance(value, float):
+        # JSON numbers: go through the shortest repr, not the binary value
+        value = repr(value)
+    try:
+        return field.clean(value.strip() if isinstance(value, str) else value, None)
+    except ValidationError as exc:
+        errors[key or name] = exc.messages
+
+
+def copy_rows(model, fields, rows):
+    """
+    Load ``rows`` (tuples of ``fields`` values) with Postgres COPY.
+    """
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(model._meta.get_field(name).column) for name in fields)
+    sql = f'COPY {qn(model._meta.db_table)} ({columns}) FROM STDIN'
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy'):
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            raw.copy_expert(f'{sql} WITH (FORMAT csv)', buffer)
+
+
+class Importer:
+    """
+    Validates records in batches and loads the valid ones with bulk_create,
+    or COPY on Postgres when ``use_copy`` is set. Rejected records are
+    collected with their line number and errors instead of stopping the run.
+    """
+    model = None
+    fields = ()
+    unique_field = None
+    # whether loaded rows go to the change feed, see orders/outbox.py
+    emits = False
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, use_copy=False):
+        self.batch_size = batch_size
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.loaded = 0
+        self.rejects = []
+
+    def records(self, records):
+        return records
+
+    def run(self, records):
+        records = iter(self.records(records))
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                break
+            valid = []
+            for line, record in batch:
+                if isinstance(record, Exception):
+                    self.rejects.append((line, {'record': [str(record)]}))
+                else:
+                    valid.append((line, record))
+            objs = self.validate(valid)
+            if not objs:
+                continue
+            try:
+                with transaction.atomic():
+                    self.load([obj for _, obj in objs])
+            except DatabaseError as exc:
+                # e.g. a key inserted by someone else since the batch was checked
+                self.rejects.extend((line, {'batch': [str(exc).strip()]}) for line, _ in objs)
+                continue
+            self.loaded += len(objs)
+        bump(*self.bumps())
+        return self
+
+    def validate(self, batch):
+        """
+        Return ``(line, instance)`` for the valid records of ``batch``,
+        recording a reject for every other one.
+        """
+        objs, keys = [], []
+        for line, record in batch:
+            errors = {}
+            values = {name: _clean(self.model, name, record.get(name), errors) for name in self.fields}
+            if errors:
+                self.rejects.append((line, errors))
+                continue
+            objs.append((line, values))
+            keys.append(values[self.unique_field])
+        return self.check_unique(objs, keys)
+
+    def check_unique(self, objs, keys):
+        counts = Counter(keys)
+        taken = set(
+            self.model.objects.filter(**{f'{self.unique_field}__in': keys}).values_list(self.unique_field, flat=True)
+        )
+        valid = []
+        for line, values in objs:
+            key = values[self.unique_field]
+            if key in taken:
+                self.rejects.append((line, {self.unique_field: [f'{key} already exists.']}))
+            elif counts[key] > 1:
+                self.rejects.append((line, {self.unique_field: [f'{key} appears more than once in this batch.']}))
+            else:
+                valid.append((line, self.build(values)))
+        return valid
+
+    def build(self, values):
+        return self.model(**values)
+
+    def load(self, objs):
+        if self.use_copy:
+            now = timezone.now()
+            copy_rows(
+                self.model, (*self.fields, 'created_at', 'updated_at'),
+                ((*(getattr(obj, name) for name in self.fields), now, now) for obj in objs),
+            )
+        else:
+            self.model.objects.bulk_create(objs, batch_size=self.batch_size)
+        if self.emits:
+            # COPY gives no ids back, so they are looked up by the unique field
+            keys = [getattr(obj, self.unique_field) for obj in objs]
+            outbox.emit(self.model, self.model.objects.filter(**{f'{self.unique_field}__in': keys}).values_list('pk', flat=True))
+
+    def bumps(self):
+        return (self.model,)
+
+
+class ProductImporter(Importer):
+    model = Product
+    emits = True
+    fields = ('sku', 'name', 'unit_price', 'stock_level')
+    unique_field = 'sku'
+
+
+class CustomerImporter(Importer):
+    model = Customer
+    fields = ('name', 'email')
+    unique_field = 'email'
+
+
+class OrderImporter(Importer):
+    """
+    Historical orders with their items. Customers are matched on
+    ``customer_email`` (or ``customer_id``) and products on ``product_sku``
+    (or ``product_id``). Totals are computed while loading; stock levels are
+    left alone, since the goods of historical orders have already shipped.
+    """
+    model = Order
+    fields = ('number', 'date_and_time', 'shipping_method', 'shipping_cost', 'status')
+    unique_field = 'number'
+    item_fields = ('quantity', 'unit_price')
+
+    def records(self, records):
+        return order_records(records)
+
+    def validate(self, batch):
+        customers = self.lookup(Customer, 'email', [r for _, r in batch], 'customer')
+        products = self.lookup(
+            Product, 'sku', [i for _, r in batch for i in r.get('items') or () if isinstance(i, dict)], 'product'
+        )
+        objs, keys = [], []
+        for line, record in batch:
+            errors = {}
+            values = {name: _clean(Order, name, record.get(name), errors) for name in self.fields}
+            values['customer'] = self.resolve(customers, record, 'customer', errors)
+            items = record.get('items') or []
+            if not isinstance(items, list):
+                errors['items'] = ['Expected a list of items.']
+                items = []
+            lines = []
+            for n, item in enumerate(items):
+                if not isinstance(item, dict):
+                    errors[f'items[{n}]'] = ['Expected an object.']
+                    continue
+                line_values = {
+                    name: _clean(OrderItem, name, item.get(name), errors, f'items[{n}].{name}') for name in self.item_fields
+                }
+                line_values['product'] = self.resolve(products, item, 'product', errors, f'items[{n}].')
+                lines.append(line_values)
+            if errors:
+                self.rejects.append((line, errors))
+                continue
+            values['items'] = lines
+            objs.append((line, values))
+            if values['number']:
+                # the others are numbered by bulk_create
+                keys.append(values['number'])
+        return self.check_unique(objs, keys)
+
+    def lookup(self, model, natural_key, records, prefix):
+        # one query per key kind for the whole batch
+        by_key, by_id = set(), set()
+        for record in records:
+            key, pk = record.get(f'{prefix}_{natural_key}'), record.get(f'{prefix}_id')
+            if key not in (None, ''):
+                by_key.add(str(key).strip())
+            elif str(pk or '').strip().isdigit():
+                by_id.add(int(pk))
+        found = {(natural_key, getattr(obj, natural_key)): obj for obj in model.objects.filter(**{f'{natural_key}__in': by_key})}
+        found.update((('id', obj.pk), obj) for obj in model.objects.filter(pk__in=by_id))
+        return natural_key, found
+
+    def resolve(self, lookup, record, prefix, errors, path=''):
+        natural_key, found = lookup
+        key, pk = record.get(f'{prefix}_{natural_key}'), record.get(f'{prefix}_id')
+        if key not in (None, ''):
+            obj = found.get((natural_key, str(key).strip()))
+        elif str(pk or '').strip().isdigit():
+            obj = found.get(('id', int(pk)))
+        else:
+            errors[f'{path}{prefix}'] = [f'Give {prefix}_{natural_key} or {prefix}_id.']
+            return None
+        if obj is None:
+            errors[f'{path}{prefix}'] = [f'Unknown {prefix} {key or pk}.']
+        return obj
+
+    def build(self, values):
+        lines = values.pop('items')
+        order = Order(**values)
+        order.import_lines = lines
+        return order
+
+    def load(self, orders):
+        for order in orders:
+            order.items_count = len(order.import_lines)
+            order.subtotal = sum((line_total(line['quantity'], line['unit_price']) for line in order.import_lines), ZERO)
+            order.total = order.subtotal + order.shipping_cost
+        # bulk_create, not COPY, for the orders: the items need their ids
+        Order.objects.bulk_create(orders, batch_size=self.batch_size)
+        lifecycle.record(orders)
+        items = [OrderItem(order=order, **line) for order in orders for line in order.import_lines]
+        if self.use_copy:
+            now = timezone.now()
+            copy_rows(
+                OrderItem, ('order', 'product', 'quantity', 'unit_price', 'created_at', 'updated_at'),
+                ((i.order_id, i.product_id, i.quantity, i.unit_price, now, now) for i in items),
+            )
+        else:
+            OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+        analytics.mark_days(analytics.order_day(order.date_and_time) for order in orders)
+        ids = [order.pk for order in orders]
+        outbox.emit(Order, ids)
+        outbox.emit(OrderItem, OrderItem.objects.filter(order__in=ids).values_list('pk', flat=True))
+
+    def bumps(self):
+        return (Order, OrderItem)
+
+
+IMPORTERS = {
+    'products': ProductImporter,
+    'customers': CustomerImporter,
+    'orders': OrderImporter,
+}
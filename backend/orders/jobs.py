@@ -0,0 +1,342 @@
+import inspect
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, time as midnight, timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+# Background work queued in the Job table and run by manage.py run_workers,
+# so heavy operations leave the request cycle without a message broker.
+#
+# A worker claims a due job with SELECT ... FOR UPDATE SKIP LOCKED, so
+# workers never wait on each other's rows; where the database cannot skip
+# locked rows (SQLite) it claims by compare-and-set instead. A claim is a
+# lease of JOB_LEASE_SECONDS, renewed by every progress report: the job of
+# a worker that stops reporting goes back to the queue. A job that raises
+# is retried JOB_RETRY_DELAY seconds later, doubling each time, until it has
+# had max_attempts. Tasks may run more than once, so they must be safe to
+# repeat; the ones below resume or redo their work.
+
+logger = logging.getLogger('orders.jobs')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# Queued jobs a worker tries per claim where it cannot skip locked rows.
+CLAIM_CANDIDATES = 10
+DELETE_BATCH_SIZE = 1000
+
+TASKS = {}
+
+
+class InvalidJob(Exception):
+    """
+    A job that cannot run as queued; it fails without being retried.
+    """
+
+
+class JobLost(Exception):
+    """
+    The job's lease lapsed and it was handed to another worker.
+    """
+
+
+def task(kind):
+    """
+    Register the decorated function as the job ``kind``. It is called with
+    the job and the job's params as keyword arguments, and returns the
+    job's result, which must be JSON serializable.
+    """
+    def register(fn):
+        TASKS[kind] = fn
+        return fn
+    return register
+
+
+def check(kind, params):
+    if kind not in TASKS:
+        raise InvalidJob(f"Unknown job kind {kind!r}.")
+    if not isinstance(params, dict):
+        raise InvalidJob("Job params must be an object.")
+    try:
+        inspect.signature(TASKS[kind]).bind(None, **params)
+    except TypeError as exc:
+        raise InvalidJob(f"Invalid params for {kind}: {exc}.")
+
+
+def enqueue(kind, params=None, max_attempts=None):
+    from .models import Job
+
+    params = params or {}
+    check(kind, params)
+    return Job.objects.create(
+        kind=kind, params=params, max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"[:100]
+
+
+def _lease():
+    return timezone.now() + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+
+
+def reclaim():
+    """
+    Take back the jobs of workers whose lease lapsed: requeued, or failed
+    when they have had all their attempts. Returns how many.
+    """
+    from .models import Job
+
+    now = timezone.now()
+    lapsed = Job.objects.filter(status=RUNNING, lease_expires_at__lt=now)
+    released = {'worker': '', 'lease_expires_at': None}
+    failed = lapsed.filter(attempts__gte=F('max_attempts')).update(
+        status=FAILED, finished_at=now, error='The worker running the job stopped.', **released,
+    )
+    return failed + lapsed.update(status=QUEUED, run_at=now, **released)
+
+
+def claim(worker=None, kinds=None):
+    """
+    The next due job, marked running under ``worker`` with a fresh lease,
+    or None when nothing is due.
+    """
+    from .models import Job
+
+    now = timezone.now()
+    due = Job.objects.filter(status=QUEUED, run_at__lte=now).order_by('run_at', 'id')
+    if kinds:
+        due = due.filter(kind__in=kinds)
+    claimed = {
+        'status': RUNNING, 'worker': worker or worker_name(), 'attempts': F('attempts') + 1,
+        'lease_expires_at': _lease(), 'started_at': now,
+    }
+    using = router.db_for_write(Job)
+    if connections[using].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=using):
+            pk = due.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            Job.objects.filter(pk=pk).update(**claimed)
+    else:
+        # writes are serialized, so one worker's update wins and the
+        # others move on to the next job
+        for pk in due.values_list('pk', flat=True)[:CLAIM_CANDIDATES]:
+            if Job.objects.filter(pk=pk, status=QUEUED).update(**claimed):
+                break
+        else:
+            return None
+    return Job.objects.using(using).get(pk=pk)
+
+
+def _mine(job):
+    from .models import Job
+
+    return Job.objects.filter(pk=job.pk, status=RUNNING, worker=job.worker, attempts=job.attempts)
+
+
+def report(job, done, total=None):
+    """
+    Record how far ``job`` has got, renewing its lease. Raises JobLost when
+    the job has been handed to another worker meanwhile.
+    """
+    values = {'done': done, 'lease_expires_at': _lease()}
+    if total is not None:
+        values['total'] = total
+    if not _mine(job).update(**values):
+        raise JobLost(f"Job {job.pk} is no longer held by {job.worker}.")
+    job.done = done
+    if total is not None:
+        job.total = total
+
+
+def execute(job):
+    """
+    Run a claimed job and record how it ended; returns the job reloaded.
+    """
+    mine = _mine(job)
+    released = {'worker': '', 'lease_expires_at': None}
+    try:
+        if job.kind not in TASKS:
+            raise InvalidJob(f"Unknown job kind {job.kind!r}.")
+        result = TASKS[job.kind](job, **job.params)
+    except JobLost:
+        logger.warning("Job %s was taken over while %s ran it", job.pk, job.worker)
+    except Exception as exc:
+        now = timezone.now()
+        error = traceback.format_exc()
+        if isinstance(exc, InvalidJob) or job.attempts >= job.max_attempts:
+            mine.update(status=FAILED, finished_at=now, error=error, **released)
+        else:
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            mine.update(status=QUEUED, run_at=now + timedelta(seconds=delay), error=error, **released)
+        logger.warning("Job %s failed on attempt %s of %s", job, job.attempts, job.max_attempts, exc_info=True)
+    else:
+        mine.update(
+            status=SUCCEEDED, result=result, finished_at=timezone.now(), done=Coalesce('total', 'done'), **released,
+        )
+    job.refresh_from_db()
+    return job
+
+
+def run_pending(worker=None, kinds=None, limit=None):
+    """
+    Claim and run due jobs until none is left or ``limit`` have run;
+    returns how many ran.
+    """
+    ran = 0
+    while limit is None or ran < limit:
+        reclaim()
+        job = claim(worker, kinds)
+        if job is None:
+            break
+        execute(job)
+        ran += 1
+    return ran
+
+
+def _moment(value, name, end=False):
+    # a bare date is the start of that day, or with ``end`` of the next one
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except (TypeError, ValueError):
+        day = moment = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, midnight.min)
+    if moment is None:
+        raise InvalidJob(f"{name} must be a date or datetime, not {value!r}.")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+@task('rebuild_order_totals')
+def rebuild_order_totals(job, batch_size=5000):
+    from . import totals
+    from .models import Order
+    from .versions import bump
+
+    total = Order.objects.count()
+    report(job, 0, total)
+    done = 0
+    for first, last, count in totals.id_ranges(batch_size):
+        totals.recalculate(Order.objects.filter(pk__gte=first, pk__lte=last))
+        done += count
+        report(job, done, max(total, done))
+    bump(Order)
+    return {'orders': done}
+
+
+@task('archive_orders')
+def archive_orders(job, before, statuses=None, batch_size=None, limit=None):
+    from .archive import ARCHIVABLE_STATUSES, ARCHIVE_BATCH_SIZE, archive, candidates
+
+    before = _moment(before, 'before')
+    statuses = statuses or ARCHIVABLE_STATUSES
+    if not set(statuses) <= set(ARCHIVABLE_STATUSES):
+        raise InvalidJob(f"statuses must be out of {', '.join(ARCHIVABLE_STATUSES)}.")
+    due = candidates(before, statuses).count()
+    total = min(due, limit) if limit else due
+    report(job, 0, total)
+    orders = items = 0
+    for batch_orders, batch_items in archive(before, statuses, batch_size or ARCHIVE_BATCH_SIZE, limit):
+        orders += batch_orders
+        items += batch_items
+        report(job, orders, max(total, orders))
+    return {'orders': orders, 'items': items}
+
+
+@task('refresh_rollups')
+def refresh_rollups(job, rebuild_all=False):
+    from . import analytics
+
+    if rebuild_all:
+        analytics.mark_all()
+    total = analytics.stale_days()
+    report(job, 0, total)
+    done = 0
+    # a transaction per batch, renewing the lease between them
+    while days := analytics.refresh(max_days=analytics.ROLLUP_BATCH_DAYS):
+        done += days
+        report(job, done, max(total, done))
+    return {'days': done}
+
+
+@task('delete_orders')
+def delete_orders(job, ids=None, status=None, before=None, batch_size=DELETE_BATCH_SIZE):
+    from .models import Order
+
+    if ids is None and status is None and before is None:
+        raise InvalidJob('delete_orders needs ids, status or before.')
+    queryset = Order.objects.all()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    if status is not None:
+        queryset = queryset.filter(status=status)
+    if before is not None:
+        queryset = queryset.filter(date_and_time__lt=_moment(before, 'before'))
+    total = queryset.count()
+    report(job, 0, total)
+    deleted = 0
+    while True:
+        # each batch its own transaction, so a retry carries on from there
+        batch = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            Order.objects.filter(pk__in=batch).delete()
+        deleted += len(batch)
+        report(job, deleted, max(total, deleted))
+    return {'orders': deleted}
+
+
+def export_path(job, fmt):
+    return os.path.join(settings.JOB_EXPORT_DIR, f'orders-{job.pk}.{fmt}')
+
+
+@task('export_orders')
+def export_orders(job, fmt='csv', date_from=None, date_to=None, since=None, chunk_size=None):
+    from .export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, iter_records
+    from .models import Order
+
+    if fmt not in EXPORT_FORMATS:
+        raise InvalidJob(f"fmt must be one of {', '.join(EXPORT_FORMATS)}.")
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    queryset = Order.objects.all()
+    if date_from:
+        queryset = queryset.filter(date_and_time__gte=_moment(date_from, 'date_from'))
+    if date_to:
+        queryset = queryset.filter(date_and_time__lt=_moment(date_to, 'date_to', end=True))
+    if since:
+        queryset = queryset.filter(updated_at__gt=_moment(since, 'since'))
+    total = queryset.count()
+    report(job, 0, total)
+
+    def counted(records):
+        for done, record in enumerate(records, 1):
+            yield record
+            if done % chunk_size == 0:
+                report(job, done, max(total, done))
+
+    path = export_path(job, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # written aside and moved into place, so a download never sees half a file
+    partial = f'{path}.part'
+    lines = 0
+    with open(partial, 'w', newline='', encoding='utf-8') as out:
+        for line in EXPORT_FORMATS[fmt][0](counted(iter_records(queryset, chunk_size))):
+            out.write(line)
+            lines += 1
+    os.replace(partial, path)
+    return {'path': path, 'format': fmt, 'lines': lines}
@@ -0,0 +1,58 @@
+from django.utils import timezone
+
+from .stock import CANCELLED
+
+# The moves an order's status may make. An order can be created in any
+# status, which is how imports bring in finished orders; after that it only
+# moves along these edges. Cancelling gives the stock back and reopening a
+# cancelled order takes it again, see orders/stock.py.
+
+PENDING = 'pending'
+COMPLETED = 'completed'
+
+TRANSITIONS = {
+    PENDING: (COMPLETED, CANCELLED),
+    COMPLETED: (CANCELLED,),
+    CANCELLED: (PENDING,),
+}
+
+# Statuses orders wait in to be worked on. They get partial indexes of their
+# own, which stay small however many orders are finished.
+ACTIVE_STATUSES = (PENDING,)
+
+
+class InvalidTransition(Exception):
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        super().__init__(f"An order cannot go from {old} to {new}.")
+
+
+def allowed(old, new):
+    return old is None or old == new or new in TRANSITIONS.get(old, ())
+
+
+def check(old, new):
+    if not allowed(old, new):
+        raise InvalidTransition(old, new)
+
+
+def next_statuses(status):
+    return TRANSITIONS.get(status, ())
+
+
+def record(orders):
+    """
+    Append a history row for every order whose status differs from the one
+    it was loaded or last recorded with; new orders get their first status.
+    """
+    from .models import OrderStatusChange
+
+    now = timezone.now()
+    changes = []
+    for order in orders:
+        was = getattr(order, '_loaded_status', None)
+        if was != order.status:
+            changes.append(OrderStatusChange(order_id=order.pk, from_status=was or '', to_status=order.status, changed_at=now))
+    if changes:
+        OrderStatusChange.objects.bulk_create(changes)
@@ -0,0 +1,207 @@
+import asyncio
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+
+from .models import Customer, Product, Order, OrderItem
+
+
+class Loader:
+    """
+    Per-request batching loader for synchronous GraphQL execution.
+
+    Keys are queued with ``prime()`` as soon as the parent rows are known;
+    the first ``load()`` then fetches every queued key in one query and
+    later loads are served from the cache.
+    """
+    def __init__(self, batch_load, default=None, on_load=None):
+        self.batch_load = batch_load
+        self.default = default
+        self.on_load = on_load
+        self.cache = {}
+        self.queue = set()
+
+    def prime(self, keys):
+        self.queue.update(key for key in keys if key is not None and key not in self.cache)
+
+    def add(self, key, value):
+        self.cache.setdefault(key, value)
+        self.queue.discard(key)
+
+    def load(self, key):
+        if key not in self.cache:
+            self.queue.add(key)
+            self.load_queued()
+        return self.cache[key]
+
+    def load_queued(self):
+        keys, self.queue = self.queue, set()
+        found = self.batch_load(keys)
+        for key in keys:
+            self.cache[key] = found.get(key, self.default)
+        if self.on_load:
+            self.on_load(found.values())
+
+
+class AsyncLoader(Loader):
+    """
+    Loader for async execution. ``load()`` returns an awaitable, and every
+    key requested before the event loop next runs is fetched in one query.
+    """
+    def __init__(self, batch_load, default=None, on_load=None):
+        super().__init__(batch_load, default, on_load)
+        self.dispatch = None
+
+    def load(self, key):
+        if key in self.cache:
+            return self.cache[key]
+        self.queue.add(key)
+        return self.wait(key)
+
+    async def wait(self, key):
+        # a key queued while a batch was already in flight goes in the next one
+        while key not in self.cache:
+            if self.dispatch is None:
+                self.dispatch = asyncio.ensure_future(self.load_queued())
+            await self.dispatch
+        return self.cache[key]
+
+    async def load_queued(self):
+        # let every resolver of the current level queue its keys first
+        await asyncio.sleep(0)
+        self.dispatch = None
+        keys, self.queue = self.queue, set()
+        found = await self.batch_load(keys)
+        for key in keys:
+            self.cache[key] = found.get(key, self.default)
+        if self.on_load:
+            self.on_load(found.values())
+
+
+def by_pk(model):
+    def batch_load(keys):
+        return model.objects.in_bulk(keys)
+    return batch_load
+
+
+def grouped_by(model, fk_name):
+    def batch_load(keys):
+        groups = defaultdict(list)
+        for obj in model.objects.filter(**{f'{fk_name}__in': keys}).order_by('pk'):
+            groups[getattr(obj, f'{fk_name}_id')].append(obj)
+        return groups
+    return batch_load
+
+
+def async_by_pk(model):
+    async def batch_load(keys):
+        return await model.objects.ain_bulk(keys)
+    return batch_load
+
+
+def async_grouped_by(model, fk_name):
+    async def batch_load(keys):
+        groups = defaultdict(list)
+        async for obj in model.objects.filter(**{f'{fk_name}__in': keys}).order_by('pk'):
+            groups[getattr(obj, f'{fk_name}_id')].append(obj)
+        return groups
+    return batch_load
+
+
+def _flatten(groups):
+    return [obj for group in groups for obj in group]
+
+
+class Loaders:
+    """
+    The loaders for one GraphQL request. Loading a set of rows primes the
+    loaders for their relations, so a nested query costs one statement per
+    level rather than one per object.
+    """
+    loader_class = Loader
+    by_pk = staticmethod(by_pk)
+    grouped_by = staticmethod(grouped_by)
+
+    def __init__(self):
+        self.customer = self.loader_class(self.by_pk(Customer), on_load=self.prime_customers)
+        self.product = self.loader_class(self.by_pk(Product), on_load=self.prime_products)
+        self.order = self.loader_class(self.by_pk(Order), on_load=self.prime_orders)
+        self.orders_by_customer = self.loader_class(
+            self.grouped_by(Order, 'customer'), default=(),
+            on_load=lambda groups: self.prime_orders(_flatten(groups)),
+        )
+        self.items_by_order = self.loader_class(
+            self.grouped_by(OrderItem, 'order'), default=(),
+            on_load=lambda groups: self.prime_items(_flatten(groups)),
+        )
+        self.items_by_product = self.loader_class(
+            self.grouped_by(OrderItem, 'product'), default=(),
+            on_load=lambda groups: self.prime_items(_flatten(groups)),
+        )
+
+    def rows(self, queryset, prime):
+        """
+        Evaluate a root queryset and prime the loaders with its rows.
+        """
+        rows = list(queryset)
+        prime(rows)
+        return rows
+
+    def run(self, fetch):
+        """
+        Call ``fetch``, a function querying through the sync ORM.
+        """
+        return fetch()
+
+    def prime_customers(self, customers):
+        customers = list(customers)
+        for customer in customers:
+            self.customer.add(customer.pk, customer)
+        self.orders_by_customer.prime(c.pk for c in customers)
+
+    def prime_products(self, products):
+        products = list(products)
+        for product in products:
+            self.product.add(product.pk, product)
+        self.items_by_product.prime(p.pk for p in products)
+
+    def prime_orders(self, orders):
+        orders = list(orders)
+        for order in orders:
+            self.order.add(order.pk, order)
+        self.customer.prime(o.customer_id for o in orders)
+        self.items_by_order.prime(o.pk for o in orders)
+
+    def prime_items(self, items):
+        items = list(items)
+        self.order.prime(i.order_id for i in items)
+        self.product.prime(i.product_id for i in items)
+
+
+class AsyncLoaders(Loaders):
+    """
+    The loaders for one GraphQL request executed with ``execute_async``;
+    every fetch goes through the async ORM.
+    """
+    loader_class = AsyncLoader
+    by_pk = staticmethod(async_by_pk)
+    grouped_by = staticmethod(async_grouped_by)
+
+    async def rows(self, queryset, prime):
+        rows = [row async for row in queryset]
+        prime(rows)
+        return rows
+
+    def run(self, fetch):
+        return sync_to_async(fetch)()
+
+
+def get_loaders(context):
+    """
+    Return the loaders bound to this request, creating them on first use.
+    """
+    loaders = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+    return loaders
@@ -0,0 +1,64 @@
+import time
+from datetime import datetime, time as midnight, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from orders.archive import ARCHIVABLE_STATUSES, ARCHIVE_BATCH_SIZE, archive, candidates
+
+
+def _cutoff(value):
+    day = parse_date(value)
+    moment = datetime.combine(day, midnight.min) if day is not None else parse_datetime(value)
+    if moment is None:
+        raise CommandError(f"Invalid --before: {value!r}")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed and cancelled orders older than a cutoff, with their "
+        "items, from the hot tables into the archive tables. Each batch is "
+        "its own transaction, so an interrupted run resumes where it stopped "
+        "when run again. Archived orders are read through the orders API "
+        "with ?archived=include or ?archived=only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Archive orders placed before this date or datetime.')
+        parser.add_argument('--older-than', type=int, default=365, metavar='DAYS',
+                            help='Archive orders placed more than DAYS days ago (default 365); ignored with --before.')
+        parser.add_argument('--status', default=','.join(ARCHIVABLE_STATUSES),
+                            help=f"Comma-separated statuses to archive, out of {', '.join(ARCHIVABLE_STATUSES)}.")
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--limit', type=int, help='Stop after this many orders.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders due.')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            before = _cutoff(options['before'])
+        else:
+            before = timezone.now() - timedelta(days=options['older_than'])
+        statuses = [s for s in options['status'].split(',') if s]
+        if not statuses or not set(statuses) <= set(ARCHIVABLE_STATUSES):
+            raise CommandError(f"--status must be out of {', '.join(ARCHIVABLE_STATUSES)}")
+        if options['batch_size'] < 1 or (options['limit'] is not None and options['limit'] < 1):
+            raise CommandError('--batch-size and --limit must be positive')
+
+        if options['dry_run']:
+            count = candidates(before, statuses).count()
+            self.stdout.write(f"{count} orders placed before {before.isoformat()} are due for archiving")
+            return
+
+        started = time.perf_counter()
+        orders = items = 0
+        for batch_orders, batch_items in archive(before, statuses, options['batch_size'], options['limit']):
+            orders += batch_orders
+            items += batch_items
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {orders} orders so far")
+        self.stdout.write(
+            f"Archived {orders} orders and {items} items placed before {before.isoformat()} "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,200 @@
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from orders import synthetic
+from orders.models import Customer, Product, Order
+
+# A latency must grow by more than the tolerance and by this much before it
+# counts as a regression; sub-millisecond paths are mostly noise.
+NOISE_FLOOR_MS = 1.0
+
+SCENARIOS = ('order-list', 'order-detail', 'order-items-filter', 'graphql-search', 'bulk-create')
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+@contextmanager
+def scratch_database(in_place):
+    """
+    Run the block in a throwaway test database, unless ``in_place``. Reads
+    stay on the primary meanwhile: the replicas don't have that database.
+    """
+    if in_place:
+        yield
+        return
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(DATABASE_REPLICAS=[]):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def compare(report, baseline, tolerance):
+    """
+    Return a description of every scenario in ``report`` that is slower,
+    runs more queries or peaks higher in memory than in ``baseline``.
+    """
+    regressions = []
+    for name, now in report['scenarios'].items():
+        then = baseline.get('scenarios', {}).get(name)
+        if then is None:
+            continue
+        for key in ('p50_ms', 'p99_ms'):
+            if now[key] > then[key] * (1 + tolerance) + NOISE_FLOOR_MS:
+                regressions.append(f'{name}: {key} {then[key]} -> {now[key]}')
+        if now['queries'] > then['queries']:
+            regressions.append(f"{name}: queries {then['queries']} -> {now['queries']}")
+        if now['peak_kb'] > then['peak_kb'] * (1 + tolerance):
+            regressions.append(f"{name}: peak_kb {then['peak_kb']} -> {now['peak_kb']}")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main API paths over seeded synthetic data and report "
+        "latency percentiles, queries and peak memory per request as JSON. "
+        "Runs in a throwaway test database unless --in-place is given. With "
+        "--baseline, fails when a path regressed against a stored report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--memory-requests', type=int, default=3, help='Requests traced for peak memory.')
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+        parser.add_argument('--output', '-o', help='Write the JSON report here; defaults to stdout.')
+        parser.add_argument('--baseline', help='JSON report to compare against.')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown, as a fraction.')
+        parser.add_argument('--in-place', action='store_true',
+                            help='Generate into the configured database, which should be an empty scratch one.')
+        parser.add_argument('--cache', action='store_true', help='Leave response caching on.')
+
+    def handle(self, *args, **options):
+        if min(options['customers'], options['products'], options['orders'], options['requests']) < 1:
+            raise CommandError('--customers, --products, --orders and --requests must be positive')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        with scratch_database(options['in_place']):
+            report = self.run(options)
+
+        regressions = []
+        if baseline is not None:
+            if baseline.get('data') != report['data']:
+                self.stderr.write('The baseline was taken over different data; comparing anyway.')
+            regressions = report['regressions'] = compare(report, baseline, options['tolerance'])
+        text = json.dumps(report, indent=2) + '\n'
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(text)
+        else:
+            self.stdout.write(text, ending='')
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+
+    def run(self, options):
+        started = time.perf_counter()
+        synthetic.generate(options['customers'], options['products'], options['orders'], seed=options['seed'])
+        generated = time.perf_counter() - started
+        self.rng = random.Random(options['seed'])
+        self.ids = {
+            'orders': list(Order.objects.order_by('pk').values_list('pk', flat=True)),
+            'products': list(Product.objects.order_by('pk').values_list('pk', flat=True)),
+            'customers': list(Customer.objects.order_by('pk').values_list('pk', flat=True)),
+        }
+        self.created = 0
+        client = Client()
+        scenarios = {}
+        cache = {} if options['cache'] else {'RESPONSE_CACHE_TIMEOUT': 0}
+        # the test client sends Host: testserver
+        with override_settings(ALLOWED_HOSTS=['testserver'], **cache):
+            for name in options['scenarios']:
+                scenarios[name] = self.measure(client, name, options)
+        return {
+            'data': {key: options[key] for key in ('customers', 'products', 'orders', 'seed')},
+            'environment': {
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'platform': sys.platform,
+            },
+            'generate_seconds': round(generated, 2),
+            'scenarios': scenarios,
+        }
+
+    def measure(self, client, name, options):
+        for _ in range(options['warmup']):
+            self.call(client, name)
+        timings, queries = [], []
+        for _ in range(options['requests']):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                self.call(client, name)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(ctx))
+        peak = 0
+        for _ in range(options['memory_requests']):
+            tracemalloc.start()
+            try:
+                self.call(client, name)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        return {
+            'requests': len(timings),
+            'p50_ms': round(_percentile(timings, 50), 2),
+            'p90_ms': round(_percentile(timings, 90), 2),
+            'p99_ms': round(_percentile(timings, 99), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries': int(statistics.median(queries)),
+            'peak_kb': round(peak / 1024),
+        }
+
+    def call(self, client, name):
+        rng, ids = self.rng, self.ids
+        if name == 'order-list':
+            response = client.get('/api/orders/', {'page_size': 50})
+        elif name == 'order-detail':
+            response = client.get(f"/api/orders/{rng.choice(ids['orders'])}/")
+        elif name == 'order-items-filter':
+            response = client.get('/api/order-items/', {'product': rng.choice(ids['products']), 'page_size': 50})
+        elif name == 'graphql-search':
+            query = '{ products(q: "%s", limit: 20) { sku name } }' % rng.choice(synthetic.NOUNS)
+            response = client.post('/graphql/', {'query': query}, content_type='application/json')
+        else:
+            self.created += 1
+            payload = {
+                'number': f'BENCH-{self.created}', 'customer': rng.choice(ids['customers']),
+                'shipping_method': 'standard', 'shipping_cost': '4.95', 'status': 'pending',
+                'items': [
+                    {'product': pk, 'quantity': 1, 'unit_price': '1.00'}
+                    for pk in rng.sample(ids['products'], min(5, len(ids['products'])))
+                ],
+            }
+            response = client.post('/api/orders/bulk/', payload, content_type='application/json')
+        if response.status_code >= 400:
+            raise CommandError(f'{name} answered {response.status_code}: {response.content[:200]!r}')
@@ -0,0 +1,97 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+GRAPHQL_QUERY = '{ orders { number status customer { name } items { quantity product { sku } } } }'
+
+# sync route -> its async mirror
+PATHS = {
+    'customers': ('/api/customers/', '/api/async/customers/'),
+    'products': ('/api/products/', '/api/async/products/'),
+    'orders': ('/api/orders/', '/api/async/orders/'),
+    'graphql': ('/graphql/', '/graphql/async/'),
+}
+
+
+def _percentile(timings, pct):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the sync (WSGI) read routes against their async (ASGI) "
+        "mirrors in-process and report p50/p99 latency and requests/sec. "
+        "Response caching is switched off so every request reaches the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per route.')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--paths', nargs='+', choices=sorted(PATHS), default=sorted(PATHS))
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['concurrency'], options['page_size']) < 1:
+            raise CommandError('--requests, --concurrency and --page-size must be positive')
+        # the test clients send Host: testserver
+        with override_settings(RESPONSE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=['testserver']):
+            for name in options['paths']:
+                sync_path, async_path = PATHS[name]
+                self.report('wsgi', sync_path, *self.run_sync(sync_path, options))
+                self.report('asgi', async_path, *asyncio.run(self.run_async(async_path, options)))
+
+    def request(self, path, options):
+        if path.startswith('/graphql/'):
+            return 'post', {'data': {'query': GRAPHQL_QUERY}, 'content_type': 'application/json'}
+        return 'get', {'data': {'page_size': options['page_size']}}
+
+    def run_sync(self, path, options):
+        method, kwargs = self.request(path, options)
+
+        def one(_):
+            client = Client()
+            try:
+                started = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                return time.perf_counter() - started, response.status_code
+            finally:
+                close_old_connections()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            results = list(pool.map(one, range(options['requests'])))
+        return results, time.perf_counter() - started
+
+    async def run_async(self, path, options):
+        method, kwargs = self.request(path, options)
+        client = AsyncClient()
+        gate = asyncio.Semaphore(options['concurrency'])
+
+        async def one():
+            async with gate:
+                started = time.perf_counter()
+                response = await getattr(client, method)(path, **kwargs)
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(options['requests'])))
+        return results, time.perf_counter() - started
+
+    def report(self, server, path, results, elapsed):
+        timings = [t for t, _ in results]
+        failed = sum(code != 200 for _, code in results)
+        line = (
+            f"{server} {path:<24} p50 {_percentile(timings, 50) * 1000:7.1f}ms  "
+            f"p99 {_percentile(timings, 99) * 1000:7.1f}ms  "
+            f"mean {statistics.fmean(timings) * 1000:7.1f}ms  {len(results) / elapsed:7.0f} req/s"
+        )
+        if failed:
+            line += f"  ({failed} non-200)"
+        self.stdout.write(line)
@@ -0,0 +1,88 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from api.fastpath import FastJSONRenderer, read_plan
+from api.queryplan import plan_queryset
+from api.serializers import OrderItemSerializer, OrderSerializer
+from orders import synthetic
+from orders.models import Order, OrderItem
+
+from .bench_api import scratch_database
+
+LISTS = {
+    'orders': (Order, OrderSerializer),
+    'items': (OrderItem, OrderItemSerializer),
+}
+
+
+def serializer_path(model, serializer_class):
+    # what a list view without the fast path does: planned queryset,
+    # serializer, JSONRenderer
+    queryset = plan_queryset(model.objects.order_by('pk'), serializer_class)
+    return JSONRenderer().render(serializer_class(queryset, many=True).data)
+
+
+def fast_path(model, serializer_class):
+    plan = read_plan(serializer_class)
+    return FastJSONRenderer().render(plan.read(model.objects.order_by('pk')))
+
+
+class Command(BaseCommand):
+    help = (
+        "Time a whole unpaginated order and order item list, queries, "
+        "serializing and rendering, through the serializers and through the "
+        "read plans of api/fastpath.py, check both give the same bytes, and "
+        "report the speedup as JSON. Runs in a throwaway test database unless "
+        "--in-place is given. With --min-speedup, fails when a list falls short."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=500)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path; the best one counts.')
+        parser.add_argument('--min-speedup', type=float, help='Fail when a list is sped up less than this.')
+        parser.add_argument('--in-place', action='store_true',
+                            help='Generate into the configured database, which should be an empty scratch one.')
+
+    def handle(self, *args, **options):
+        if min(options['customers'], options['products'], options['orders'], options['repeat']) < 1:
+            raise CommandError('--customers, --products, --orders and --repeat must be positive')
+        with scratch_database(options['in_place']):
+            report = self.run(options)
+        self.stdout.write(json.dumps(report, indent=2))
+        short = [
+            f"{name}: {result['speedup']}x" for name, result in report['lists'].items()
+            if options['min_speedup'] is not None and result['speedup'] < options['min_speedup']
+        ]
+        if short:
+            raise CommandError(f"Below {options['min_speedup']}x: " + ', '.join(short))
+
+    def run(self, options):
+        synthetic.generate(options['customers'], options['products'], options['orders'], seed=options['seed'])
+        report = {'database': connection.vendor, 'orders': options['orders'], 'lists': {}}
+        for name, (model, serializer_class) in LISTS.items():
+            timings = {}
+            for path in (serializer_path, fast_path):
+                best = None
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    body = path(model, serializer_class)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[path] = best, body
+            (slow, expected), (fast, body) = timings[serializer_path], timings[fast_path]
+            if body != expected:
+                raise CommandError(f'The fast path renders the {name} list differently from the serializer.')
+            report['lists'][name] = {
+                'rows': model.objects.count(),
+                'serializer_s': round(slow, 3),
+                'fast_s': round(fast, 3),
+                'speedup': round(slow / fast, 1),
+            }
+        return report
@@ -0,0 +1,100 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from orders import synthetic
+from orders.documents import persisted, prepare, query_hash
+from orders.schema import schema
+
+from .bench_api import _percentile, scratch_database
+
+QUERY = """
+query RecentOrders($limit: Int) {
+    orders(limit: $limit) {
+        ...OrderFields
+        customer { id name email }
+        items { id quantity unitPrice product { id sku name unitPrice } }
+    }
+}
+
+fragment OrderFields on OrderType {
+    id number dateAndTime status shippingMethod shippingCost subtotal total
+}
+"""
+
+SCENARIOS = ('uncached', 'cached', 'persisted')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what /graphql/ spends per request on a query it has not "
+        "seen (parsed and validated again), one in the document cache, and "
+        "one sent as a persisted query hash, and report it as JSON. Runs in "
+        "a throwaway test database unless --in-place is given, with "
+        "response caching off."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario.')
+        parser.add_argument('--limit', type=int, default=5, help='Orders the query asks for.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--in-place', action='store_true',
+                            help='Generate into the configured database, which should be an empty scratch one.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['limit'] < 1:
+            raise CommandError('--requests and --limit must be positive')
+        with scratch_database(options['in_place']):
+            report = self.run(options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, options):
+        synthetic.generate(20, 50, 200, seed=options['seed'])
+        client = Client()
+        variables = {'limit': options['limit']}
+        bodies = {
+            'uncached': {'query': QUERY, 'variables': variables},
+            'cached': {'query': QUERY, 'variables': variables},
+            'persisted': {
+                'variables': variables,
+                'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(QUERY)}},
+            },
+        }
+        report = {'requests': options['requests'], 'scenarios': {}}
+        # the test client sends Host: testserver
+        with override_settings(ALLOWED_HOSTS=['testserver'], RESPONSE_CACHE_TIMEOUT=0):
+            persisted.remember(query_hash(QUERY), QUERY)
+            for name in SCENARIOS:
+                timings = []
+                for _ in range(options['requests']):
+                    if name == 'uncached':
+                        prepare.cache_clear()
+                    started = time.perf_counter()
+                    response = client.post('/graphql/', bodies[name], content_type='application/json')
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200 or b'"errors"' in response.content:
+                        raise CommandError(f'{name} answered {response.status_code}: {response.content[:200]!r}')
+                report['scenarios'][name] = {
+                    'p50_ms': round(_percentile(timings, 50), 3),
+                    'p99_ms': round(_percentile(timings, 99), 3),
+                    'mean_ms': round(statistics.fmean(timings), 3),
+                }
+
+        # the parse and validation step on its own
+        graphql_schema = schema.graphql_schema
+        for name, clear in (('prepare_uncached_us', True), ('prepare_cached_us', False)):
+            timings = []
+            for _ in range(options['requests']):
+                if clear:
+                    prepare.cache_clear()
+                started = time.perf_counter()
+                prepare(graphql_schema, QUERY)
+                timings.append((time.perf_counter() - started) * 1e6)
+            report[name] = round(statistics.median(timings), 1)
+        uncached, cached = (report['scenarios'][name]['p50_ms'] for name in ('uncached', 'cached'))
+        report['saved_per_request_ms'] = round(uncached - cached, 3)
+        return report
@@ -0,0 +1,80 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from orders.models import Customer, Product
+from orders.search import SEARCH_FIELDS, search
+
+WORDS = ['red', 'blue', 'steel', 'cable', 'widget', 'bracket', 'valve', 'panel', 'mount', 'sensor', 'hinge', 'bolt']
+
+
+class Command(BaseCommand):
+    help = (
+        "Time customer/product search as the tables grow. Synthetic rows are "
+        "inserted inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000,1000000',
+                            help='Comma separated table sizes to measure at.')
+        parser.add_argument('--repeat', type=int, default=20, help='Searches timed per term and size.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError('--sizes must be a comma separated list of integers')
+        self.random = random.Random(options['seed'])
+        terms = ['wid', 'steel cab', 'SKU-00042', 'valv', 'bolt', 'zz']
+
+        self.stdout.write(f"{'rows':>10} {'model':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        with transaction.atomic():
+            rows = 0
+            for size in sizes:
+                self.fill(rows, size, options['batch_size'])
+                rows = size
+                if connection.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE orders_customer')
+                        cursor.execute('ANALYZE orders_product')
+                for model, fields in ((Customer, SEARCH_FIELDS['customer']), (Product, SEARCH_FIELDS['product'])):
+                    timings = self.time_searches(model, fields, terms, options['repeat'])
+                    p95 = statistics.quantiles(timings, n=20, method='inclusive')[-1]
+                    self.stdout.write(
+                        f"{size:>10} {model.__name__:>9} {statistics.median(timings):>8.2f} {p95:>8.2f} {max(timings):>8.2f}"
+                    )
+            transaction.set_rollback(True)
+
+    def fill(self, start, stop, batch_size):
+        for offset in range(start, stop, batch_size):
+            end = min(offset + batch_size, stop)
+            Customer.objects.bulk_create(
+                Customer(name=self.phrase(), email=f"bench{i}@{self.word()}.example.com") for i in range(offset, end)
+            )
+            Product.objects.bulk_create(
+                Product(sku=f"SKU-{i:08d}", name=self.phrase(), unit_price=1) for i in range(offset, end)
+            )
+
+    def time_searches(self, model, fields, terms, repeat):
+        timings = []
+        for term in terms:
+            for _ in range(repeat):
+                began = time.perf_counter()
+                # the typeahead hooks ask for the top 5
+                list(search(model.objects.all(), term, fields)[:5])
+                timings.append((time.perf_counter() - began) * 1000)
+        return timings
+
+    def word(self):
+        if self.random.random() < 0.2:
+            return ''.join(self.random.choices(string.ascii_lowercase, k=6))
+        return self.random.choice(WORDS)
+
+    def phrase(self):
+        return ' '.join(self.word() for _ in range(self.random.randint(2, 4))).title()
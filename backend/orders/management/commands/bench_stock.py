@@ -0,0 +1,116 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+from orders.models import Customer, Product, Order, OrderItem
+from orders.signals import post_bulk_write
+from orders.stock import InsufficientStock
+
+PREFIX = 'BENCH-'
+EMAIL = 'bench-stock@example.invalid'
+
+
+class Command(BaseCommand):
+    help = (
+        "Place orders for a few hot products from many threads at once and "
+        "report orders/sec, then check that no unit of stock was sold twice. "
+        "The rows it creates are deleted at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=200, help='Orders attempted per thread.')
+        parser.add_argument('--products', type=int, default=5)
+        parser.add_argument('--stock', type=int, default=500, help='Starting stock_level of each product.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if min(options['threads'], options['orders'], options['products']) < 1 or options['stock'] < 0:
+            raise CommandError('--threads, --orders and --products must be positive')
+        self.cleanup()
+        if Order.objects.filter(number__startswith=PREFIX).exists():
+            raise CommandError(f'Orders numbered {PREFIX}* already exist; the benchmark needs those numbers.')
+        customer = Customer.objects.create(name='Bench', email=EMAIL)
+        products = [
+            Product.objects.create(sku=f'{PREFIX}STOCK-{i}', name=f'Bench {i}', unit_price=1, stock_level=options['stock'])
+            for i in range(options['products'])
+        ]
+        self.placed = self.rejected = self.retries = 0
+        self.errors = []
+        self.lock = threading.Lock()
+
+        threads = [
+            threading.Thread(target=self.worker, args=(n, customer, products, options))
+            for n in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if self.errors:
+            self.cleanup()
+            raise CommandError(f'A worker failed: {self.errors[0]!r}')
+
+        oversold = []
+        for product in products:
+            product.refresh_from_db()
+            sold = sum(OrderItem.objects.filter(product=product).values_list('quantity', flat=True))
+            if product.stock_level + sold != options['stock']:
+                oversold.append(product.sku)
+        attempted = options['threads'] * options['orders']
+        self.stdout.write(
+            f"{attempted} orders attempted on {connection.vendor}: {self.placed} placed, "
+            f"{self.rejected} rejected for stock, {self.retries} retried, "
+            f"{self.placed / elapsed:.0f} orders/sec"
+        )
+        self.cleanup()
+        if oversold:
+            raise CommandError(f"Stock does not add up for {', '.join(oversold)}")
+        self.stdout.write(self.style.SUCCESS('No stock was oversold.'))
+
+    def worker(self, n, customer, products, options):
+        rng = random.Random(options['seed'] + n)
+        try:
+            for i in range(options['orders']):
+                # a random mix of products in a random order, so lock order
+                # only comes from the stock module
+                lines = rng.sample(products, rng.randint(1, len(products)))
+                outcome = self.place(f'{PREFIX}{n}-{i}', customer, lines, rng)
+                with self.lock:
+                    self.placed += outcome == 'placed'
+                    self.rejected += outcome == 'rejected'
+        except Exception as exc:
+            self.errors.append(exc)
+        finally:
+            close_old_connections()
+            connection.close()
+
+    def place(self, number, customer, lines, rng):
+        for attempt in range(50):
+            try:
+                with transaction.atomic():
+                    order = Order.objects.create(number=number, customer=customer, shipping_method='standard', shipping_cost=0)
+                    items = OrderItem.objects.bulk_create(
+                        [OrderItem(order=order, product=p, quantity=rng.randint(1, 3), unit_price=1) for p in lines]
+                    )
+                    post_bulk_write.send(sender=OrderItem, instances=items)
+                return 'placed'
+            except InsufficientStock:
+                return 'rejected'
+            except OperationalError:
+                # SQLite allows one writer at a time and reports contention
+                # as "database is locked"
+                with self.lock:
+                    self.retries += 1
+                time.sleep(0.001 * (attempt + 1))
+        raise RuntimeError(f'Gave up placing {number}')
+
+    def cleanup(self):
+        # the customer's orders and items go with it
+        Customer.objects.filter(email=EMAIL).delete()
+        Product.objects.filter(sku__startswith=f'{PREFIX}STOCK-').delete()
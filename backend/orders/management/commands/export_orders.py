@@ -0,0 +1,62 @@
+import time
+from datetime import datetime, time as day_start, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from orders.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_lines
+from orders.models import Order
+
+
+def _moment(value, end=False):
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, day_start.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise CommandError(f'Invalid date or datetime: {value!r}')
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream every order with its items as CSV or NDJSON, one chunk of "
+        "orders in memory at a time. A bare --date-to date covers that whole day."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='fmt', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='File to write; defaults to stdout.')
+        parser.add_argument('--date-from', help='Orders placed at or after this date/datetime.')
+        parser.add_argument('--date-to', help='Orders placed before this datetime, or on/before this date.')
+        parser.add_argument('--since', help='Only orders updated after this date/datetime.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        queryset = Order.objects.all()
+        if options['date_from']:
+            queryset = queryset.filter(date_and_time__gte=_moment(options['date_from']))
+        if options['date_to']:
+            queryset = queryset.filter(date_and_time__lt=_moment(options['date_to'], end=True))
+        if options['since']:
+            queryset = queryset.filter(updated_at__gt=_moment(options['since']))
+
+        started = time.perf_counter()
+        lines = export_lines(queryset, options['fmt'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                rows = self.write(out, lines)
+        else:
+            rows = self.write(self.stdout, lines)
+        self.stderr.write(f"Exported {rows} lines in {time.perf_counter() - started:.1f}s")
+
+    def write(self, out, lines):
+        rows = 0
+        for line in lines:
+            out.write(line)
+            rows += 1
+        return rows
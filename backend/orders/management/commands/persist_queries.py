@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.documents import prepare, query_hash
+from orders.models import PersistedQuery
+from orders.schema import schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Register GraphQL queries, one per file, so clients can send their "
+        "sha256 instead of the text. Each is checked against the schema "
+        "first. With GRAPHQL_PERSISTED_ONLY these are the only queries "
+        "/graphql/ runs. Prints the hash of every query."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="Files holding one query each; '-' reads standard input.")
+
+    def handle(self, *args, **options):
+        queries = []
+        for path in options['files']:
+            if path == '-':
+                query = sys.stdin.read()
+            else:
+                with open(path, encoding='utf-8') as f:
+                    query = f.read()
+            errors = prepare(schema.graphql_schema, query).errors
+            if errors:
+                raise CommandError(f"{path}: {errors[0].message}")
+            queries.append((path, query))
+
+        for path, query in queries:
+            sha = query_hash(query)
+            PersistedQuery.objects.get_or_create(sha256=sha, defaults={'query': query})
+            self.stdout.write(f"{sha}  {path}")
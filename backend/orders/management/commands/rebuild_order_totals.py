@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+
+from orders import totals
+from orders.models import Order
+from orders.versions import bump
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Order.items_count/subtotal/total from the order items, one "
+        "primary key range per UPDATE. With --check, only report the "
+        "orders whose stored totals have drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Orders per batch.')
+        parser.add_argument('--check', action='store_true', help='Report drift without writing.')
+        parser.add_argument('--show', type=int, default=10, help='Drifted orders listed with --check.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        started = time.perf_counter()
+        seen = drifted = 0
+        for first, last, count in totals.id_ranges(batch_size):
+            batch = Order.objects.filter(pk__gte=first, pk__lte=last)
+            seen += count
+            if options['check']:
+                rows = self.drifted(batch)
+                for row in rows[:max(options['show'] - drifted, 0)]:
+                    self.stdout.write(
+                        f"order {row['pk']}: stored {row['items_count']}/{row['subtotal']}/{row['total']}, "
+                        f"expected {row['calc_items_count']}/{row['calc_subtotal']}/{row['calc_total']}"
+                    )
+                drifted += len(rows)
+            else:
+                totals.recalculate(batch)
+
+        elapsed = time.perf_counter() - started
+        if options['check']:
+            self.stdout.write(f"{drifted} of {seen} orders drifted ({elapsed:.1f}s)")
+            if drifted:
+                raise CommandError('Order totals have drifted; run rebuild_order_totals to repair them.')
+        else:
+            bump(Order)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt totals for {seen} orders ({elapsed:.1f}s)"))
+
+    def drifted(self, batch):
+        computed = {f'calc_{name}': expression for name, expression in totals.computed_totals().items()}
+        stale = Q()
+        for name in totals.TOTAL_FIELDS:
+            stale |= ~Q(**{name: F(f'calc_{name}')})
+        return list(
+            batch.annotate(**computed)
+            .filter(stale)
+            .order_by('pk')
+            .values('pk', *totals.TOTAL_FIELDS, *(f'calc_{name}' for name in totals.TOTAL_FIELDS))
+        )
@@ -0,0 +1,45 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from orders import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Number committed outbox events in batches, placing them in the change "
+        "feed at /api/changes/. Reads of the feed do this on their own; a "
+        "running relay keeps them from paying for it. --emit also writes the "
+        "relayed events to stdout as JSON lines, for piping to a broker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain what is pending and exit.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls when idle (default 1).')
+        parser.add_argument('--batch-size', type=int, default=outbox.RELAY_BATCH_SIZE)
+        parser.add_argument('--emit', action='store_true', help='Write each relayed event to stdout as a JSON line.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['interval'] <= 0:
+            raise CommandError('--batch-size and --interval must be positive')
+        log = self.stderr if options['emit'] else self.stdout
+        relayed = 0
+        try:
+            while True:
+                events = outbox.relay(options['batch_size'])
+                relayed += len(events)
+                if options['emit']:
+                    for event in events:
+                        self.stdout.write(json.dumps({
+                            'sequence': event.sequence, 'topic': event.topic, 'object_id': event.object_id,
+                            'action': event.action, 'payload': event.payload, 'created_at': event.created_at,
+                        }, cls=DjangoJSONEncoder, separators=(',', ':')))
+                if len(events) < options['batch_size']:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        log.write(f"Relayed {relayed} events")
@@ -0,0 +1,88 @@
+import multiprocessing
+import threading
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+
+from orders import jobs
+
+
+def work(stop, ran, kinds, once, interval):
+    """
+    One worker: run due jobs one at a time, polling every ``interval``
+    seconds when there are none, until ``stop`` is set.
+    """
+    try:
+        while not stop.is_set():
+            # drops connections past CONN_MAX_AGE or broken, as between requests
+            close_old_connections()
+            if jobs.run_pending(kinds=kinds, limit=1):
+                with ran.get_lock():
+                    ran.value += 1
+            elif once:
+                break
+            else:
+                stop.wait(interval)
+    finally:
+        connections.close_all()
+
+
+def _process(stop, ran, kinds, once, interval):
+    # a no-op once forked; a spawned process starts Django afresh
+    django.setup()
+    try:
+        work(stop, ran, kinds, once, interval)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (orders/jobs.py) with a pool of worker "
+        "threads, or processes with --processes, each claiming due jobs from "
+        "the job table; no broker is needed. --once runs what is due and exits. "
+        "Jobs are queued through /api/jobs/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Workers in the pool (default 2).')
+        parser.add_argument('--processes', action='store_true',
+                            help='Run each worker in its own process rather than a thread.')
+        parser.add_argument('--kind', action='append', choices=sorted(jobs.TASKS),
+                            help='Only run jobs of this kind; may be repeated.')
+        parser.add_argument('--once', action='store_true', help='Run the jobs that are due and exit.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls when idle (default 1).')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['interval'] <= 0:
+            raise CommandError('--workers and --interval must be positive')
+        context = multiprocessing.get_context()
+        stop, ran = context.Event(), context.Value('i', 0)
+        args = (stop, ran, options['kind'], options['once'], options['interval'])
+
+        started = time.perf_counter()
+        if options['processes']:
+            # children must not share the parent's database sockets
+            connections.close_all()
+            pool = [context.Process(target=_process, args=args) for _ in range(options['workers'])]
+        elif options['workers'] > 1:
+            pool = [threading.Thread(target=work, args=args, name=f'worker-{n}') for n in range(options['workers'])]
+        else:
+            pool = []
+        try:
+            if pool:
+                for worker in pool:
+                    worker.start()
+                while any(worker.is_alive() for worker in pool):
+                    for worker in pool:
+                        worker.join(0.5)
+            else:
+                work(*args)
+        except KeyboardInterrupt:
+            # workers finish the job at hand first
+            stop.set()
+            for worker in pool:
+                worker.join()
+        self.stdout.write(f"Ran {ran.value} jobs in {time.perf_counter() - started:.1f}s")
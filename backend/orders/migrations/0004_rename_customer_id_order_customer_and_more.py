@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_status'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='order',
+            old_name='customer_id',
+            new_name='customer',
+        ),
+        migrations.RenameField(
+            model_name='orderitem',
+            old_name='order_id',
+            new_name='order',
+        ),
+        migrations.RenameField(
+            model_name='orderitem',
+            old_name='product_id',
+            new_name='product',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stock_level',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# (index name, table, column) served by orders.search on Postgres. The
+# expression matches what Django emits for icontains/istartswith.
+TRIGRAM_INDEXES = [
+    ('customer_name_trgm_idx', 'orders_customer', 'name'),
+    ('customer_email_trgm_idx', 'orders_customer', 'email'),
+    ('product_name_trgm_idx', 'orders_product', 'name'),
+    ('product_sku_trgm_idx', 'orders_product', 'sku'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+
+def mark_order_days(apps, schema_editor):
+    # the rollups themselves are built by the first read, or ahead of it by
+    # manage.py refresh_rollups
+    Order = apps.get_model('orders', 'Order')
+    StaleRollupDay = apps.get_model('orders', 'StaleRollupDay')
+    day = TruncDay('date_and_time', output_field=models.DateField(), tzinfo=timezone.get_default_timezone())
+    days = Order.objects.order_by().values_list(day, flat=True).distinct()
+    StaleRollupDay.objects.bulk_create([StaleRollupDay(day=d) for d in sorted(days)], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleRollupDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('shipping_method', models.CharField(choices=[('standard', 'Standard'), ('express', 'Express'), ('tnt', 'TNT'), ('startrak', 'StarTrak')], max_length=50)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveBigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('shipping', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'status', 'shipping_method'), name='dailysales_bucket_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('shipping_method', models.CharField(choices=[('standard', 'Standard'), ('express', 'Express'), ('tnt', 'TNT'), ('startrak', 'StarTrak')], max_length=50)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveBigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='orders.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'product', 'status', 'shipping_method'), name='dailyproductsales_bucket_uniq')],
+            },
+        ),
+        migrations.RunPython(mark_order_days, migrations.RunPython.noop),
+    ]
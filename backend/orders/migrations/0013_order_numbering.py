@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+# orders.numbering reserves blocks of order numbers from this sequence on
+# Postgres; other databases use the NumberSequence table.
+PG_SEQUENCE = 'orders_order_number_seq'
+
+
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {PG_SEQUENCE} AS bigint')
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP SEQUENCE IF EXISTS {PG_SEQUENCE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='number',
+            field=models.CharField(blank=True, max_length=20, unique=True),
+        ),
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
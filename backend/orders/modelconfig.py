@@ -10,4 +10,12 @@ ORDER_STATUS = [
     ('pending', 'Pending'),
     ('completed', 'Completed'),
     ('cancelled', 'Cancelled'),
-]
\ No newline at end of file
+]
+
+# Constants for the Job model, see orders/jobs.py
+JOB_STATUS = [
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('succeeded', 'Succeeded'),
+    ('failed', 'Failed'),
+]
@@ -1,5 +1,11 @@
-from django.db import models
-from .modelconfig import SHIPPING_METHODS, ORDER_STATUS
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.expressions import Combinable
+from . import lifecycle, numbering
+from .modelconfig import SHIPPING_METHODS, ORDER_STATUS, JOB_STATUS
+from .totals import TOTAL_FIELDS, to_money
 from django.utils import timezone
 
 class Customer(models.Model):
@@ -23,21 +29,90 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        # atomic so the outbox event commits with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
     
+class OrderQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        numbering.assign(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Order(models.Model):
-    number = models.CharField(max_length=20, unique=True)
+    # left blank, the server numbers the order, see orders/numbering.py
+    number = models.CharField(max_length=20, unique=True, blank=True)
     date_and_time = models.DateTimeField(default=timezone.now)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     shipping_method = models.CharField(max_length=50, choices=SHIPPING_METHODS)
     shipping_cost = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=ORDER_STATUS, default='pending')
+
+    # denormalized from the items, see orders/totals.py
+    items_count = models.PositiveIntegerField(default=0, editable=False)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     
     # timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'date_and_time'], name='order_status_date_idx'),
+            models.Index(fields=['date_and_time', 'id'], name='order_date_id_idx'),
+            # the pending queue, see orders/lifecycle.py
+            models.Index(
+                fields=['date_and_time', 'id'], condition=Q(status=lifecycle.PENDING), name='order_pending_date_idx',
+            ),
+        ]
+
+    def clean(self):
+        was = getattr(self, '_loaded_status', None)
+        if not lifecycle.allowed(was, self.status):
+            raise ValidationError({'status': str(lifecycle.InvalidTransition(was, self.status))})
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self._state.adding:
+            if not self.number:
+                self.number = numbering.next_number()
+            if self.shipping_cost is not None:
+                self.total = to_money(self.subtotal) + to_money(self.shipping_cost)
+        else:
+            # the totals belong to the items: never write them back from a
+            # possibly stale instance, only move total with the shipping cost
+            deferred = self.get_deferred_fields()
+            fields = update_fields or [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.attname not in deferred
+            ]
+            fields = [f for f in fields if f not in TOTAL_FIELDS]
+            if 'shipping_cost' in fields:
+                self.total = F('subtotal') + Value(to_money(self.shipping_cost))
+                fields.append('total')
+            kwargs['update_fields'] = fields
+        # atomic so a status change the stock cannot cover undoes the save
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        if isinstance(self.total, Combinable):
+            self.refresh_from_db(fields=TOTAL_FIELDS)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in field_names:
+            instance._loaded_status = instance.status
+        if 'date_and_time' in field_names:
+            instance._loaded_date = instance.date_and_time
+        return instance
+
     def __str__(self):
         return f"Order {self.number} - {self.customer.name} - {self.status}"
 
@@ -50,4 +125,200 @@ class OrderItem(models.Model):
 
     # timestamps
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
\ No newline at end of file
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'product'], name='orderitem_order_product_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember what the order's totals and the stock include for this
+        # line, so a save can move them by the difference
+        if {'order_id', 'product_id', 'quantity', 'unit_price'} <= set(field_names):
+            instance._loaded_line = (instance.order_id, instance.product_id, instance.quantity, instance.unit_price)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # stock is taken before the write, so a failed write must give it back
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class OrderStatusChange(models.Model):
+    # append-only history of Order.status, written by orders/lifecycle.py
+    order = models.ForeignKey(Order, related_name='status_changes', on_delete=models.CASCADE, db_index=False)
+    from_status = models.CharField(max_length=20, choices=ORDER_STATUS, blank=True)
+    to_status = models.CharField(max_length=20, choices=ORDER_STATUS)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'changed_at'], name='orderstatus_order_at_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Status changes are append-only.')
+        super().save(*args, **kwargs)
+
+
+class OutboxEvent(models.Model):
+    # append-only log of order, item and product writes, see orders/outbox.py
+    sequence = models.BigIntegerField(null=True, unique=True)
+    topic = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10)
+    payload = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # the relay's queue: events not numbered yet
+            models.Index(fields=['id'], condition=Q(sequence__isnull=True), name='outbox_unrelayed_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Outbox events are append-only.')
+        super().save(*args, **kwargs)
+
+
+# Orders moved out of the hot tables by orders/archive.py, with the ids and
+# columns they had there. Read-only: nothing writes to them but the archiver.
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    number = models.CharField(max_length=20)
+    date_and_time = models.DateTimeField()
+    customer = models.ForeignKey(Customer, related_name='archived_orders', on_delete=models.CASCADE)
+    shipping_method = models.CharField(max_length=50, choices=SHIPPING_METHODS)
+    shipping_cost = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=ORDER_STATUS)
+    items_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    # the order's OrderStatusChange rows, as [from_status, to_status, changed_at]
+    status_history = models.JSONField(default=list)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_and_time', 'id'], name='archivedorder_date_id_idx'),
+            models.Index(fields=['number'], name='archivedorder_number_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.number}"
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE, db_index=False)
+    product = models.ForeignKey(Product, related_name='archived_items', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'product'], name='archiveditem_order_product_idx'),
+        ]
+
+
+# Daily rollups of the orders, kept current by orders/analytics.py
+class DailySales(models.Model):
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=ORDER_STATUS)
+    shipping_method = models.CharField(max_length=50, choices=SHIPPING_METHODS)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    shipping = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status', 'shipping_method'], name='dailysales_bucket_uniq'),
+        ]
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=ORDER_STATUS)
+    shipping_method = models.CharField(max_length=50, choices=SHIPPING_METHODS)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'product', 'status', 'shipping_method'], name='dailyproductsales_bucket_uniq'
+            ),
+        ]
+
+class StaleRollupDay(models.Model):
+    # days whose rollups no longer match the orders; a row per write, so
+    # concurrent writers never contend on it
+    day = models.DateField()
+
+
+class NumberSequence(models.Model):
+    """
+    A counter numbers are reserved from in blocks, where the database has no
+    sequences of its own; see orders/numbering.py.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} at {self.last_value}"
+
+
+class PersistedQuery(models.Model):
+    """
+    A GraphQL query clients may send by its sha256 alone, see api/documents.py.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    query = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+
+class Job(models.Model):
+    """
+    A unit of background work run by manage.py run_workers, see orders/jobs.py.
+    """
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=JOB_STATUS, default='queued')
+    # not claimed before this, moved on by a retry's backoff
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # the claiming worker, and when its claim lapses unless it reports progress
+    worker = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    done = models.PositiveBigIntegerField(default=0)
+    total = models.PositiveBigIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the workers' queue
+            models.Index(fields=['run_at', 'id'], condition=Q(status='queued'), name='job_queued_idx'),
+            # claims to take back from workers that stopped
+            models.Index(fields=['lease_expires_at'], condition=Q(status='running'), name='job_running_lease_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,157 @@
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Order numbers are handed out by the server from a counter every process
+# reserves blocks of ORDER_NUMBER_BLOCK_SIZE values from, so creating orders
+# costs one round trip per block instead of a guessed number and a retry on
+# the unique constraint. Numbers are unique, not gapless: a block a process
+# does not use up is lost when it exits.
+#
+# On Postgres the counter is the sequence created by migration 0013, whose
+# values are never handed out twice, rolled back or not. Elsewhere it is a
+# NumberSequence row, which a rollback does put back; values reserved inside
+# a transaction only join the shared pool once it commits.
+
+SEQUENCE = 'order_number'
+PG_SEQUENCE = 'orders_order_number_seq'
+
+DEFAULT_FORMAT = 'ORD{date:%y%m%d}{seq:07d}'
+DEFAULT_BLOCK_SIZE = 100
+
+
+def block_size():
+    return getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+
+
+def check_digit(number):
+    """
+    The Luhn check digit of the digits in ``number``.
+    """
+    total = 0
+    for i, char in enumerate(reversed([c for c in number if c.isdigit()])):
+        digit = int(char)
+        if i % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return str(-total % 10)
+
+
+def is_valid(number):
+    """
+    Whether ``number`` ends in the right check digit.
+    """
+    return len(number) > 1 and number[-1] == check_digit(number[:-1])
+
+
+def format_number(seq, date=None):
+    number = getattr(settings, 'ORDER_NUMBER_FORMAT', DEFAULT_FORMAT).format(
+        seq=seq, date=date or timezone.localdate(),
+    )
+    if getattr(settings, 'ORDER_NUMBER_CHECK_DIGIT', True):
+        number += check_digit(number)
+    return number
+
+
+def _reserve_sequence(connection, count):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [PG_SEQUENCE, count])
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def _reserve_row(using, count):
+    from .models import NumberSequence
+
+    with transaction.atomic(using=using):
+        counters = NumberSequence.objects.using(using).filter(name=SEQUENCE)
+        if not counters.update(last_value=F('last_value') + count):
+            NumberSequence.objects.using(using).get_or_create(name=SEQUENCE)
+            counters.update(last_value=F('last_value') + count)
+        last = counters.values_list('last_value', flat=True).get()
+    return list(range(last - count + 1, last + 1))
+
+
+class Allocator:
+    """
+    This process's reserved but unused counter values.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reserving = threading.Lock()
+        self.free = deque()
+        self.reservations = 0
+
+    def take(self, count):
+        from .models import Order
+
+        values = self.pop(count)
+        if values is not None:
+            return values
+        # one thread reserves while the others wait for its block
+        with self.reserving:
+            values = self.pop(count)
+            if values is not None:
+                return values
+            using = router.db_for_write(Order)
+            connection = connections[using]
+            size = max(count, block_size())
+            if connection.vendor == 'postgresql':
+                values = _reserve_sequence(connection, size)
+                pooled = True
+            else:
+                values = _reserve_row(using, size)
+                pooled = not connection.in_atomic_block
+            self.reservations += 1
+            values, rest = values[:count], values[count:]
+            if pooled:
+                self.give(rest)
+        if not pooled:
+            transaction.on_commit(lambda: self.give(rest), using=using)
+        return values
+
+    def pop(self, count):
+        with self.lock:
+            if len(self.free) >= count:
+                return [self.free.popleft() for _ in range(count)]
+        return None
+
+    def give(self, values):
+        with self.lock:
+            self.free.extend(values)
+
+    def clear(self):
+        with self.lock:
+            self.free.clear()
+
+
+allocator = Allocator()
+
+
+def next_numbers(count):
+    """
+    ``count`` new order numbers.
+    """
+    if count < 1:
+        return []
+    date = timezone.localdate()
+    return [format_number(seq, date) for seq in allocator.take(count)]
+
+
+def next_number():
+    return next_numbers(1)[0]
+
+
+def assign(orders):
+    """
+    Number the orders of ``orders`` that have no number yet, with one
+    reservation for all of them.
+    """
+    unnumbered = [order for order in orders if not order.number]
+    for order, number in zip(unnumbered, next_numbers(len(unnumbered))):
+        order.number = number
@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import Max
+
+# Every write to an order, item or product appends an OutboxEvent in the
+# writer's own transaction, so an event exists exactly when its change was
+# committed. Events are inserted unordered (ids are handed out before
+# commit, so a lower id can become visible after a higher one); relay()
+# then gives committed events their place in the feed, a gapless sequence
+# number that consumers resume from. /api/changes/ relays before it reads,
+# manage.py relay_outbox does it ahead of readers.
+
+SAVED = 'saved'
+DELETED = 'deleted'
+ARCHIVED = 'archived'
+
+RELAY_BATCH_SIZE = 1000
+
+
+def topic(model):
+    return model._meta.model_name
+
+
+def emit(model, ids, action=SAVED):
+    """
+    Append an event per id of ``model``. Saved rows carry their current
+    columns as the payload, read back in the same transaction; deleted and
+    archived ones only their id.
+    """
+    from .models import OutboxEvent
+
+    ids = sorted({pk for pk in ids if pk is not None})
+    if not ids:
+        return
+    if action == SAVED:
+        payloads = {row['id']: row for row in model.objects.filter(pk__in=ids).values()}
+        ids = [pk for pk in ids if pk in payloads]
+    else:
+        payloads = {}
+    OutboxEvent.objects.bulk_create(
+        [OutboxEvent(topic=topic(model), object_id=pk, action=action, payload=payloads.get(pk)) for pk in ids],
+        batch_size=RELAY_BATCH_SIZE,
+    )
+
+
+def relay(batch_size=RELAY_BATCH_SIZE):
+    """
+    Number the next ``batch_size`` committed events after the last numbered
+    one and return them, oldest first.
+
+    The events are locked while they are numbered, so a second relay waits
+    and then skips them rather than numbering them twice. An event that
+    commits late is numbered by a later relay, after everything numbered so
+    far: consumers never miss it by having resumed past it.
+    """
+    from .models import OutboxEvent
+
+    # the usual case, without opening a transaction
+    if not OutboxEvent.objects.filter(sequence__isnull=True).exists():
+        return []
+    with transaction.atomic():
+        events = list(OutboxEvent.objects.select_for_update().filter(sequence__isnull=True).order_by('pk')[:batch_size])
+        if not events:
+            return []
+        last = OutboxEvent.objects.aggregate(last=Max('sequence'))['last'] or 0
+        for offset, event in enumerate(events, 1):
+            event.sequence = last + offset
+        OutboxEvent.objects.bulk_update(events, ['sequence'], batch_size=batch_size)
+    return events
+
+
+def relay_all(batch_size=RELAY_BATCH_SIZE):
+    """
+    Relay until nothing is left; returns how many events were numbered.
+    """
+    count = 0
+    while True:
+        events = relay(batch_size)
+        if not events:
+            return count
+        count += len(events)
+
+
+def feed(after=0, topics=None, limit=100):
+    """
+    The numbered events after sequence ``after``, as dicts.
+    """
+    from .models import OutboxEvent
+
+    events = OutboxEvent.objects.filter(sequence__gt=after).order_by('sequence')
+    if topics:
+        events = events.filter(topic__in=topics)
+    return events.values('sequence', 'topic', 'object_id', 'action', 'payload', 'created_at')[:limit]
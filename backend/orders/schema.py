@@ -1,7 +1,13 @@
 import graphene
-from django.db.models import Q
+from django.conf import settings
 from graphene_django import DjangoObjectType
-from .models import Customer, Product
+from . import analytics
+from .loaders import get_loaders
+from .modelconfig import ORDER_STATUS, SHIPPING_METHODS
+from .search import SEARCH_FIELDS, search
+from .models import Customer, Product, Order, OrderItem, DailySales, DailyProductSales
+from .stock import CANCELLED
+from .totals import to_money
 
 
 class CustomerType(DjangoObjectType):
@@ -9,11 +15,102 @@ class CustomerType(DjangoObjectType):
         model = Customer
         fields = '__all__'
 
+    def resolve_order_set(self, info):
+        return get_loaders(info.context).orders_by_customer.load(self.pk)
+
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
         fields = '__all__'
 
+    def resolve_orderitem_set(self, info):
+        return get_loaders(info.context).items_by_product.load(self.pk)
+
+class OrderItemType(DjangoObjectType):
+    class Meta:
+        model = OrderItem
+        fields = '__all__'
+
+    def resolve_order(self, info):
+        return get_loaders(info.context).order.load(self.order_id)
+
+    def resolve_product(self, info):
+        return get_loaders(info.context).product.load(self.product_id)
+
+class OrderType(DjangoObjectType):
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def resolve_customer(self, info):
+        return get_loaders(info.context).customer.load(self.customer_id)
+
+    def resolve_items(self, info):
+        return get_loaders(info.context).items_by_order.load(self.pk)
+
+class SalesType(graphene.ObjectType):
+    day = graphene.Date()
+    status = graphene.String()
+    shipping_method = graphene.String()
+    orders = graphene.Int()
+    units = graphene.Int()
+    revenue = graphene.Decimal()
+    shipping = graphene.Decimal()
+
+    def resolve_revenue(self, info):
+        return to_money(self['revenue'])
+
+    def resolve_shipping(self, info):
+        return to_money(self['shipping'])
+
+class ProductSalesType(graphene.ObjectType):
+    product = graphene.Field(ProductType)
+    orders = graphene.Int()
+    units = graphene.Int()
+    revenue = graphene.Decimal()
+
+    def resolve_product(self, info):
+        return get_loaders(info.context).product.load(self['product'])
+
+    def resolve_revenue(self, info):
+        return to_money(self['revenue'])
+
+def _sales_args():
+    return {
+        'date_from': graphene.Date(required=False),
+        'date_to': graphene.Date(required=False),
+        'status': graphene.List(graphene.String, required=False),
+        'shipping_method': graphene.List(graphene.String, required=False),
+    }
+
+def _sales_rows(model, date_from=None, date_to=None, status=None, shipping_method=None):
+    # same filters and defaults as /api/analytics/
+    rows = analytics.rollups(model)
+    if status:
+        unknown = set(status) - dict(ORDER_STATUS).keys()
+        if unknown:
+            raise ValueError(f"Unknown status: {', '.join(sorted(unknown))}")
+        rows = rows.filter(status__in=status)
+    else:
+        rows = rows.exclude(status=CANCELLED)
+    if shipping_method:
+        unknown = set(shipping_method) - dict(SHIPPING_METHODS).keys()
+        if unknown:
+            raise ValueError(f"Unknown shipping method: {', '.join(sorted(unknown))}")
+        rows = rows.filter(shipping_method__in=shipping_method)
+    if date_from:
+        rows = rows.filter(day__gte=date_from)
+    if date_to:
+        rows = rows.filter(day__lte=date_to)
+    return rows
+
+def _capped(qs, limit):
+    # lists are bounded even when no limit is asked for
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be positive")
+    cap = settings.GRAPHQL_MAX_LIMIT
+    return qs[:min(limit or cap, cap)]
+
 class Query(graphene.ObjectType):
     customers = graphene.List(
         CustomerType,
@@ -27,31 +124,85 @@ class Query(graphene.ObjectType):
         limit=graphene.Int(required=False)
     )
     product = graphene.Field(ProductType, id=graphene.Int())
+    orders = graphene.List(
+        OrderType,
+        customer=graphene.Int(required=False),
+        status=graphene.String(required=False),
+        limit=graphene.Int(required=False)
+    )
+    order = graphene.Field(OrderType, id=graphene.Int())
+    revenue_by_day = graphene.List(SalesType, **_sales_args())
+    sales_by_status = graphene.List(SalesType, **_sales_args())
+    sales_by_shipping_method = graphene.List(SalesType, **_sales_args())
+    top_products = graphene.List(ProductSalesType, limit=graphene.Int(required=False), **_sales_args())
 
     def resolve_customers(self, info , q=None, limit=None):
         qs = Customer.objects.all()
         if q:
-            qs = qs.filter(Q(name__icontains=q) | Q(email__icontains=q)).distinct()
-        if limit:
-            return qs[:limit]
-        return qs
+            qs = search(qs, q, SEARCH_FIELDS['customer'])
+        qs = _capped(qs, limit)
+        loaders = get_loaders(info.context)
+        return loaders.rows(qs, loaders.prime_customers)
 
     def resolve_customer(self, info, id=None):
         if id is None:
             return None
-        return Customer.objects.filter(pk=id).first()
+        return get_loaders(info.context).customer.load(id)
 
     def resolve_products(self, info , q=None, limit=None):
         qs = Product.objects.all()
         if q:
-            qs = qs.filter(Q(name__icontains=q) | Q(sku__icontains=q)).distinct()
-        if limit:
-            return qs[:limit]
-        return qs
+            qs = search(qs, q, SEARCH_FIELDS['product'])
+        qs = _capped(qs, limit)
+        loaders = get_loaders(info.context)
+        return loaders.rows(qs, loaders.prime_products)
 
     def resolve_product(self, info, id=None):
         if id is None:
             return None
-        return Product.objects.filter(pk=id).first()
+        return get_loaders(info.context).product.load(id)
+
+    def resolve_orders(self, info, customer=None, status=None, limit=None):
+        qs = Order.objects.order_by('-date_and_time', '-id')
+        if customer:
+            qs = qs.filter(customer=customer)
+        if status:
+            if status not in dict(ORDER_STATUS):
+                raise ValueError(f"Unknown status: {status}")
+            qs = qs.filter(status=status)
+        qs = _capped(qs, limit)
+        loaders = get_loaders(info.context)
+        return loaders.rows(qs, loaders.prime_orders)
+
+    def resolve_order(self, info, id=None):
+        if id is None:
+            return None
+        return get_loaders(info.context).order.load(id)
+
+    def resolve_revenue_by_day(self, info, **filters):
+        return get_loaders(info.context).run(
+            lambda: list(analytics.revenue_by_day(_sales_rows(DailySales, **filters)))
+        )
+
+    def resolve_sales_by_status(self, info, **filters):
+        return get_loaders(info.context).run(
+            lambda: list(analytics.sales_by(_sales_rows(DailySales, **filters), 'status'))
+        )
+
+    def resolve_sales_by_shipping_method(self, info, **filters):
+        return get_loaders(info.context).run(
+            lambda: list(analytics.sales_by(_sales_rows(DailySales, **filters), 'shipping_method'))
+        )
+
+    def resolve_top_products(self, info, limit=10, **filters):
+        if not 1 <= limit <= 100:
+            raise ValueError("limit must be from 1 to 100")
+        loaders = get_loaders(info.context)
+
+        def top_products():
+            rows = list(analytics.top_products(_sales_rows(DailyProductSales, **filters), limit))
+            loaders.product.prime(row['product'] for row in rows)
+            return rows
+        return loaders.run(top_products)
 
 schema = graphene.Schema(query=Query)
\ No newline at end of file
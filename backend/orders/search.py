@@ -0,0 +1,52 @@
+from functools import reduce
+from operator import or_
+
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Greatest, Upper
+
+# Trigrams need at least this many characters to narrow a GIN index scan;
+# shorter terms fall back to prefix matching only.
+MIN_TRIGRAM_LENGTH = 3
+
+SEARCH_FIELDS = {
+    'customer': ('name', 'email'),
+    'product': ('name', 'sku'),
+}
+
+
+def search(queryset, q, fields):
+    """
+    Filter ``queryset`` to rows where any of ``fields`` matches ``q`` and
+    order them best match first.
+
+    On Postgres this is served by the pg_trgm GIN indexes from migration
+    0007: a row matches on a prefix, a substring or a fuzzy word match, and
+    is ranked by prefix hits then trigram word similarity. Other backends
+    fall back to prefix/substring matching with the same prefix-first order.
+    """
+    q = q.strip()
+    if not q:
+        return queryset
+    prefix = reduce(or_, (Q(**{f'{f}__istartswith': q}) for f in fields))
+    if len(q) < MIN_TRIGRAM_LENGTH:
+        return queryset.filter(prefix).order_by(*fields, 'pk')
+
+    contains = reduce(or_, (Q(**{f'{f}__icontains': q}) for f in fields))
+    prefix_rank = Case(When(prefix, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+    if connections[queryset.db].vendor != 'postgresql':
+        queryset = queryset.filter(contains).annotate(
+            search_rank=prefix_rank + Case(When(contains, then=Value(0.5)), default=Value(0.0), output_field=FloatField())
+        )
+        return queryset.order_by('-search_rank', 'pk')
+
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    # UPPER() so the fuzzy match hits the same expression index as icontains
+    similar = reduce(or_, (TrigramWordSimilar(Upper(f), Value(q.upper())) for f in fields))
+    similarity = [TrigramWordSimilarity(q, f) for f in fields]
+    queryset = queryset.filter(contains | similar).annotate(
+        search_rank=prefix_rank + (Greatest(*similarity) if len(similarity) > 1 else similarity[0])
+    )
+    return queryset.order_by('-search_rank', 'pk')
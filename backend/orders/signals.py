@@ -0,0 +1,216 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from . import analytics, lifecycle, outbox, stock, totals
+from .models import Customer, Product, Order, OrderItem
+from .versions import bump
+
+# Sent with the written instances after a bulk_create/bulk_update, which send
+# no per-row signals of their own; pre_bulk_write is sent, inside the same
+# transaction, with the instances a bulk_update is about to write.
+pre_bulk_write = Signal()
+post_bulk_write = Signal()
+
+
+@receiver([post_save, post_delete, post_bulk_write], sender=Customer)
+@receiver([post_save, post_delete, post_bulk_write], sender=Product)
+@receiver([post_save, post_delete, post_bulk_write], sender=Order)
+@receiver([post_save, post_delete, post_bulk_write], sender=OrderItem)
+def bump_data_version(sender, **kwargs):
+    bump(sender)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=OrderItem)
+def emit_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        outbox.emit(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=OrderItem)
+def emit_deleted(sender, instance, **kwargs):
+    outbox.emit(sender, [instance.pk], outbox.DELETED)
+
+
+@receiver(post_bulk_write, sender=Product)
+@receiver(post_bulk_write, sender=Order)
+@receiver(post_bulk_write, sender=OrderItem)
+def emit_bulk_write(sender, instances, **kwargs):
+    outbox.emit(sender, [instance.pk for instance in instances])
+
+
+# Order fields the sales rollups are grouped or summed by
+ROLLUP_FIELDS = {'date_and_time', 'status', 'shipping_method', 'shipping_cost'}
+
+
+def _line(item):
+    return (item.order_id, item.product_id, item.quantity, item.unit_price)
+
+
+def _from(origin, model):
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+
+def _cancelled(status):
+    return status == stock.CANCELLED
+
+
+@receiver(pre_save, sender=OrderItem)
+def take_line_stock(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if not instance._state.adding and not hasattr(instance, '_loaded_line'):
+        instance._loaded_line = OrderItem.objects.filter(pk=instance.pk).values_list(
+            'order_id', 'product_id', 'quantity', 'unit_price'
+        ).first()
+    old = None if instance._state.adding else instance._loaded_line
+    stock.move([old[:3]] if old else [], [_line(instance)[:3]])
+
+
+@receiver(post_save, sender=OrderItem)
+def update_order_totals(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else instance._loaded_line
+    new = _line(instance)
+    if old is None or old[0] != new[0]:
+        if old is not None:
+            totals.apply_delta(old[0], -1, -totals.line_total(*old[2:]))
+        totals.apply_delta(new[0], 1, totals.line_total(*new[2:]))
+    else:
+        totals.apply_delta(new[0], 0, totals.line_total(*new[2:]) - totals.line_total(*old[2:]))
+    analytics.mark_orders({new[0], old[0] if old else None})
+    outbox.emit(Order, {new[0], old[0] if old else None})
+    instance._loaded_line = new
+
+
+@receiver(post_delete, sender=OrderItem)
+def remove_line(sender, instance, origin=None, **kwargs):
+    # a deleted order gives its stock back in release_order_stock, and there
+    # are no totals left to update
+    if _from(origin, Order):
+        return
+    totals.apply_delta(instance.order_id, -1, -totals.line_total(instance.quantity, instance.unit_price))
+    analytics.mark_orders([instance.order_id])
+    outbox.emit(Order, [instance.order_id])
+    if origin is None or _from(origin, OrderItem):
+        stock.move([_line(instance)[:3]], [])
+
+
+@receiver(post_bulk_write, sender=OrderItem)
+def bulk_write_lines(sender, instances, **kwargs):
+    old = [getattr(item, '_loaded_line', None) for item in instances]
+    stock.move([line[:3] for line in old if line], [_line(item)[:3] for item in instances])
+    order_ids = {item.order_id for item in instances} | {line[0] for line in old if line}
+    totals.recalculate(Order.objects.filter(pk__in=order_ids), touch=True)
+    analytics.mark_orders(order_ids)
+    outbox.emit(Order, order_ids)
+    for item in instances:
+        item._loaded_line = _line(item)
+
+
+@receiver(pre_save, sender=Order)
+def remember_status(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    status_saved = update_fields is None or 'status' in update_fields
+    if status_saved or not hasattr(instance, '_loaded_status') or not hasattr(instance, '_loaded_date'):
+        # a status write locks the row and checks against the status stored,
+        # not the one loaded, which another request may have moved since
+        rows = Order.objects.filter(pk=instance.pk)
+        if status_saved:
+            rows = rows.select_for_update()
+        row = rows.values_list('status', 'date_and_time').first()
+        instance._loaded_status, instance._loaded_date = row or (None, None)
+    if status_saved:
+        lifecycle.check(instance._loaded_status, instance.status)
+
+
+@receiver(post_save, sender=Order)
+def record_status_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    # before move_order_stock, which moves _loaded_status on
+    if raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    lifecycle.record([instance])
+
+
+@receiver(post_save, sender=Order)
+def move_order_stock(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    if created:
+        instance._loaded_status = instance.status
+    else:
+        _move_status_stock([instance])
+
+
+@receiver(post_save, sender=Order)
+def mark_order_day(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not ROLLUP_FIELDS & set(update_fields)):
+        return
+    _mark_order_days([instance])
+
+
+@receiver(post_delete, sender=Order)
+def mark_deleted_order_day(sender, instance, **kwargs):
+    analytics.mark_days([analytics.order_day(instance.date_and_time)])
+
+
+@receiver(pre_delete, sender=Order)
+def release_order_stock(sender, instance, **kwargs):
+    # the stored status, under lock, decides: a cancel that went through
+    # since the order was loaded has given the stock back already
+    status = stock.lock_orders([instance.pk]).get(instance.pk, instance.status)
+    if not _cancelled(status):
+        changes = stock.order_quantities([instance])
+        stock.adjust({pk: -quantity for pk, quantity in changes.items()})
+
+
+@receiver(pre_bulk_write, sender=Order)
+def lock_bulk_orders(sender, instances, **kwargs):
+    # as remember_status, for every row of a bulk update at once; the rows are
+    # locked in primary key order, as stock.lock_orders does
+    rows = Order.objects.filter(pk__in=[order.pk for order in instances]).order_by('pk').select_for_update()
+    stored = {pk: (status, moment) for pk, status, moment in rows.values_list('pk', 'status', 'date_and_time')}
+    for order in instances:
+        order._loaded_status, order._loaded_date = stored.get(order.pk, (None, None))
+        lifecycle.check(order._loaded_status, order.status)
+
+
+@receiver(post_bulk_write, sender=Order)
+def bulk_write_orders(sender, instances, **kwargs):
+    lifecycle.record(instances)
+    _move_status_stock(instances)
+    totals.recalculate(Order.objects.filter(pk__in=[order.pk for order in instances]))
+    totals.refresh(instances)
+    _mark_order_days(instances)
+
+
+def _mark_order_days(orders):
+    # the day the order was on too, in case it moved
+    days = set()
+    for order in orders:
+        for moment in (getattr(order, '_loaded_date', None), order.date_and_time):
+            if moment is not None:
+                days.add(analytics.order_day(moment))
+        order._loaded_date = order.date_and_time
+    analytics.mark_days(days)
+
+
+def _move_status_stock(orders):
+    # orders entering cancelled give their items' stock back, orders leaving
+    # it take the stock again
+    cancelled, reopened = [], []
+    for order in orders:
+        was = getattr(order, '_loaded_status', None)
+        if was is not None and _cancelled(was) != _cancelled(order.status):
+            (cancelled if _cancelled(order.status) else reopened).append(order)
+        order._loaded_status = order.status
+    if cancelled or reopened:
+        changes = stock.order_quantities(reopened)
+        changes.subtract(stock.order_quantities(cancelled))
+        stock.adjust(changes)
@@ -0,0 +1,106 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from . import outbox
+from .versions import bump
+
+# Every item on an order that is not cancelled holds its quantity of the
+# product's stock_level. Stock moves with conditional UPDATEs rather than a
+# read-modify-write, so parallel writers can never sell the same unit twice.
+# Every write that moves stock locks the orders concerned before any product,
+# each in primary key order, so an item write and a status change on the same
+# order queue on the order row rather than deadlock, and the second one sees
+# the status the first one left.
+
+CANCELLED = 'cancelled'
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Insufficient stock for product(s) {', '.join(map(str, self.product_ids))}.")
+
+
+def adjust(changes):
+    """
+    Apply ``{product_id: quantity}`` changes to stock, positive to take and
+    negative to give back.
+
+    Rows are updated, and so locked, in primary key order, so transactions
+    touching several products cannot deadlock on each other. A take the stock
+    cannot cover raises InsufficientStock and undoes the whole call.
+    """
+    from .models import Product
+
+    changes = {pk: quantity for pk, quantity in changes.items() if quantity}
+    if not changes:
+        return
+    short = []
+    with transaction.atomic():
+        for pk in sorted(changes):
+            quantity = changes[pk]
+            products = Product.objects.filter(pk=pk)
+            if quantity > 0:
+                products = products.filter(stock_level__gte=quantity)
+            if not products.update(stock_level=F('stock_level') - quantity) and quantity > 0:
+                short.append(pk)
+        if short:
+            raise InsufficientStock(short)
+        outbox.emit(Product, changes)
+    # stock moves in SQL, which sends no model signals
+    bump(Product)
+
+
+def lock_orders(order_ids):
+    """
+    Lock the rows of ``order_ids``, in primary key order, and return
+    ``{order_id: status}`` as stored. Call it inside a transaction.
+    """
+    from .models import Order
+
+    order_ids = sorted({pk for pk in order_ids if pk is not None})
+    if not order_ids:
+        return {}
+    rows = Order.objects.filter(pk__in=order_ids).order_by('pk').select_for_update()
+    return dict(rows.values_list('pk', 'status'))
+
+
+def held(lines, statuses):
+    """
+    Return the stock held per product by ``(order_id, product_id, quantity)``
+    lines, given their orders' ``statuses``; lines on cancelled orders hold
+    nothing.
+    """
+    total = Counter()
+    for order_id, product_id, quantity in lines:
+        if statuses.get(order_id) != CANCELLED:
+            total[product_id] += quantity
+    return total
+
+
+def move(old_lines, new_lines):
+    """
+    Move stock from what ``old_lines`` held to what ``new_lines`` hold.
+    """
+    old_lines = [line for line in old_lines if line is not None]
+    new_lines = [line for line in new_lines if line is not None]
+    with transaction.atomic():
+        statuses = lock_orders(line[0] for line in old_lines + new_lines)
+        changes = held(new_lines, statuses)
+        changes.subtract(held(old_lines, statuses))
+        adjust(changes)
+
+
+def order_quantities(orders):
+    """
+    Return the total quantity per product over the items of ``orders``.
+    """
+    from .models import OrderItem
+
+    rows = (
+        OrderItem.objects.filter(order__in=orders).order_by()
+        .values('product').annotate(quantity=Sum('quantity')).values_list('product', 'quantity')
+    )
+    return Counter(dict(rows))
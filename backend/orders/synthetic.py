@@ -0,0 +1,97 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db import transaction
+
+from . import analytics, lifecycle
+from .models import Customer, Product, Order, OrderItem
+from .totals import ZERO, line_total
+from .versions import bump
+
+# Seeded synthetic data for benchmarks. The same arguments always produce
+# the same rows, so timings from different runs are comparable.
+
+FIRST_NAMES = ('Ada', 'Ben', 'Cleo', 'Dev', 'Eli', 'Fay', 'Gus', 'Hana', 'Ivo', 'June', 'Kai', 'Lena', 'Milo', 'Nia')
+LAST_NAMES = ('Abbott', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ito', 'Jones', 'Khan')
+ADJECTIVES = ('Steel', 'Compact', 'Heavy', 'Mini', 'Pro', 'Rapid', 'Silent', 'Smart', 'Twin', 'Ultra', 'Vintage')
+NOUNS = ('Anvil', 'Bolt', 'Cable', 'Drill', 'Fan', 'Gasket', 'Hinge', 'Lamp', 'Pump', 'Router', 'Valve', 'Wrench')
+
+STATUS_WEIGHTS = {'completed': 80, 'pending': 15, 'cancelled': 5}
+SHIPPING = {'standard': (60, '4.95'), 'express': (20, '12.50'), 'tnt': (12, '9.90'), 'startrak': (8, '7.25')}
+
+# Orders end here and go back ``days``, rather than from today, so a seed
+# always gives the same dates.
+END = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+MAX_ITEMS = 30
+MEAN_EXTRA_ITEMS = 2.0
+
+
+def item_count(rng):
+    # most orders have one to three lines, with a long tail of big ones
+    return min(1 + int(rng.expovariate(1 / MEAN_EXTRA_ITEMS)), MAX_ITEMS)
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def generate(customers, products, orders, seed=42, days=365, batch_size=2000):
+    """
+    Create ``customers``, ``products`` and ``orders`` with items, like an
+    import: totals are computed as the rows are built and stock levels are
+    set high enough to be left alone. Product popularity follows a Zipf-like
+    curve, so a few products are on most orders.
+    """
+    rng = random.Random(seed)
+    with transaction.atomic():
+        customer_rows = Customer.objects.bulk_create(
+            [
+                Customer(name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', email=f'syn{i}@example.invalid')
+                for i in range(customers)
+            ],
+            batch_size=batch_size,
+        )
+        product_rows = Product.objects.bulk_create(
+            [
+                Product(
+                    sku=f'SYN-{i:06d}', name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}',
+                    unit_price=Decimal(rng.randint(199, 19999)) / 100, stock_level=10 ** 6,
+                )
+                for i in range(products)
+            ],
+            batch_size=batch_size,
+        )
+        popularity = list(accumulate(1 / (rank + 1) ** 1.07 for rank in range(len(product_rows))))
+        popular = rng.sample(product_rows, len(product_rows))
+        days_with_orders = set()
+
+        for start in range(0, orders, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, orders)):
+                method = _weighted(rng, {name: weight for name, (weight, _) in SHIPPING.items()})
+                order = Order(
+                    number=f'SYN-{i:08d}', customer=rng.choice(customer_rows), shipping_method=method,
+                    shipping_cost=Decimal(SHIPPING[method][1]), status=_weighted(rng, STATUS_WEIGHTS),
+                    date_and_time=END - timedelta(seconds=rng.randrange(days * 86400)),
+                )
+                chosen = {p.pk: p for p in rng.choices(popular, cum_weights=popularity, k=item_count(rng))}
+                order.lines = [(product, rng.randint(1, 5)) for product in chosen.values()]
+                order.items_count = len(order.lines)
+                order.subtotal = sum((line_total(q, p.unit_price) for p, q in order.lines), ZERO)
+                order.total = order.subtotal + order.shipping_cost
+                batch.append(order)
+                days_with_orders.add(analytics.order_day(order.date_and_time))
+            Order.objects.bulk_create(batch, batch_size=batch_size)
+            lifecycle.record(batch)
+            OrderItem.objects.bulk_create(
+                [
+                    OrderItem(order=order, product=product, quantity=quantity, unit_price=product.unit_price)
+                    for order in batch for product, quantity in order.lines
+                ],
+                batch_size=batch_size,
+            )
+        analytics.mark_days(days_with_orders)
+    bump(Customer, Product, Order, OrderItem)
+    return {'customers': len(customer_rows), 'products': len(product_rows), 'orders': orders}
@@ -1,3 +1,999 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from unittest import mock
+
+from api.replicas import health
+from orders import analytics, jobs, lifecycle, numbering, outbox, stock, synthetic
+from orders.admin import EstimatedCountPaginator
+from orders.importer import ProductImporter
+from orders.management.commands.bench_api import compare
+from orders.models import (
+    Customer, Product, Order, OrderItem, ArchivedOrder, DailySales, DailyProductSales, Job, NumberSequence,
+    OutboxEvent, StaleRollupDay,
+)
+from orders.schema import schema
+from orders.search import SEARCH_FIELDS, search
+from orders.signals import pre_bulk_write
+from orders.lifecycle import InvalidTransition
+from orders.stock import InsufficientStock
+
+ORDERS_QUERY = """
+    query {
+        orders {
+            number
+            customer { name }
+            items { quantity product { sku } }
+        }
+    }
+"""
+
+
+class SchemaBatchingTest(TestCase):
+    def setUp(self):
+        self.customers = [Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com") for i in range(3)]
+        self.products = [Product.objects.create(sku=f"SKU{i}", name=f"P{i}", unit_price=1, stock_level=1000) for i in range(4)]
+
+    def make_orders(self, count):
+        start = Order.objects.count()
+        for i in range(start, start + count):
+            order = Order.objects.create(
+                number=f"ORD{i}", customer=self.customers[i % 3], shipping_method="standard", shipping_cost=1,
+            )
+            for product in self.products[:1 + i % 4]:
+                OrderItem.objects.create(order=order, product=product, quantity=i, unit_price=1)
+
+    def execute(self, query, **variables):
+        result = schema.execute(query, variables=variables, context_value=RequestFactory().post('/graphql/'))
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def test_nested_orders_constant_queries(self):
+        counts = []
+        for count in (2, 30):
+            self.make_orders(count)
+            with CaptureQueriesContext(connection) as ctx:
+                data = self.execute(ORDERS_QUERY)
+            counts.append(len(ctx))
+        self.assertEqual(len(data['orders']), 32)
+        # orders, customers, items, products
+        self.assertEqual(counts, [4, 4])
+
+    def test_nested_orders_data(self):
+        self.make_orders(3)
+        orders = {o['number']: o for o in self.execute(ORDERS_QUERY)['orders']}
+        self.assertEqual(orders['ORD2']['customer']['name'], 'C2')
+        self.assertEqual([i['product']['sku'] for i in orders['ORD2']['items']], ['SKU0', 'SKU1', 'SKU2'])
+
+    def test_customer_orders_and_single_lookups(self):
+        self.make_orders(6)
+        data = self.execute("""
+            query($id: Int) {
+                customer(id: $id) { name orderSet { number items { order { number } } } }
+                order(id: 999999) { number }
+            }
+        """, id=self.customers[1].id)
+        self.assertEqual(data['customer']['name'], 'C1')
+        self.assertEqual([o['number'] for o in data['customer']['orderSet']], ['ORD1', 'ORD4'])
+        self.assertEqual(data['customer']['orderSet'][0]['items'][0]['order']['number'], 'ORD1')
+        self.assertIsNone(data['order'])
+
+    def test_orders_filters(self):
+        self.make_orders(4)
+        Order.objects.filter(number='ORD0').update(status='completed')
+        data = self.execute('query { orders(status: "completed") { number } }')
+        self.assertEqual(data['orders'], [{'number': 'ORD0'}])
+        data = self.execute('query($c: Int) { orders(customer: $c, limit: 1) { number } }', c=self.customers[0].id)
+        self.assertEqual(len(data['orders']), 1)
+
+    def test_search_still_filters(self):
+        data = self.execute('query { products(q: "sku1") { sku } customers(q: "c2@") { name } }')
+        self.assertEqual(data['products'], [{'sku': 'SKU1'}])
+        self.assertEqual(data['customers'], [{'name': 'C2'}])
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        for sku, name in [('CAB-1', 'Steel cable'), ('WID-1', 'Blue widget'), ('BRK-1', 'Cable bracket'), ('VLV-1', 'Valve')]:
+            Product.objects.create(sku=sku, name=name, unit_price=1)
+
+    def names(self, q):
+        return [p.name for p in search(Product.objects.all(), q, SEARCH_FIELDS['product'])]
+
+    def test_prefix_matches_rank_first(self):
+        self.assertEqual(self.names('cable'), ['Cable bracket', 'Steel cable'])
+
+    def test_matches_any_field(self):
+        self.assertEqual(self.names('wid-1'), ['Blue widget'])
+
+    def test_short_terms_only_match_prefixes(self):
+        self.assertEqual(self.names('va'), ['Valve'])
+        self.assertEqual(self.names('le'), [])
+
+    def test_blank_term_is_ignored(self):
+        self.assertEqual(len(self.names('  ')), 4)
+
+
+class OrderTotalsTest(TestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="C", email="c@example.com")
+        self.prods = [Product.objects.create(sku=f"SKU{i}", name=f"P{i}", unit_price=1, stock_level=1000) for i in range(2)]
+        self.order = Order.objects.create(number="ORD1", customer=self.cust, shipping_method="standard", shipping_cost=5)
+
+    def assertTotals(self, order, items_count, subtotal, total):
+        order.refresh_from_db()
+        self.assertEqual((order.items_count, order.subtotal, order.total), (items_count, Decimal(subtotal), Decimal(total)))
+
+    def test_new_order_total_is_shipping(self):
+        self.assertTotals(self.order, 0, '0', '5')
+
+    def test_item_writes_move_totals(self):
+        item = OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=2, unit_price=19.99)
+        OrderItem.objects.create(order=self.order, product=self.prods[1], quantity=1, unit_price='0.50')
+        self.assertTotals(self.order, 2, '40.48', '45.48')
+
+        item.quantity = 3
+        item.save()
+        self.assertTotals(self.order, 2, '60.47', '65.47')
+
+        item.delete()
+        self.assertTotals(self.order, 1, '0.50', '5.50')
+
+    def test_moving_item_between_orders(self):
+        other = Order.objects.create(number="ORD2", customer=self.cust, shipping_method="standard", shipping_cost=0)
+        item = OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=1, unit_price=3)
+        item = OrderItem.objects.get(pk=item.pk)
+        item.order = other
+        item.save()
+        self.assertTotals(self.order, 0, '0', '5')
+        self.assertTotals(other, 1, '3', '3')
+
+    def test_stale_order_save_keeps_totals(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=1, unit_price=3)
+        stale.shipping_cost = Decimal('7.00')
+        stale.save()
+        self.assertEqual(stale.total, Decimal('10.00'))
+        self.assertTotals(self.order, 1, '3', '10')
+
+    def test_rebuild_command_repairs_drift(self):
+        OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=2, unit_price=4)
+        Order.objects.filter(pk=self.order.pk).update(items_count=9, subtotal=0, total=0)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_order_totals', '--check', stdout=out)
+        self.assertIn(f'order {self.order.pk}:', out.getvalue())
+
+        call_command('rebuild_order_totals', '--batch-size', '1', stdout=StringIO())
+        self.assertTotals(self.order, 1, '8', '13')
+        call_command('rebuild_order_totals', '--check', stdout=StringIO())
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="C", email="c@example.com")
+        self.prods = [Product.objects.create(sku=f"SKU{i}", name=f"P{i}", unit_price=1, stock_level=10) for i in range(2)]
+        self.order = Order.objects.create(number="ORD1", customer=self.cust, shipping_method="standard", shipping_cost=0)
+
+    def assertStock(self, *levels):
+        self.assertEqual([Product.objects.get(pk=p.pk).stock_level for p in self.prods], list(levels))
+
+    def test_item_writes_move_stock(self):
+        item = OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=4, unit_price=1)
+        self.assertStock(6, 10)
+        item.quantity = 6
+        item.save()
+        self.assertStock(4, 10)
+        item.product = self.prods[1]
+        item.save()
+        self.assertStock(10, 4)
+        item.delete()
+        self.assertStock(10, 10)
+
+    def test_insufficient_stock_writes_nothing(self):
+        OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=8, unit_price=1)
+        with self.assertRaises(InsufficientStock) as ctx:
+            OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=3, unit_price=1)
+        self.assertEqual(ctx.exception.product_ids, [self.prods[0].pk])
+        self.assertEqual(self.order.items.count(), 1)
+        self.assertStock(2, 10)
+
+    def test_cancel_releases_and_reopen_takes(self):
+        OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=4, unit_price=1)
+        OrderItem.objects.create(order=self.order, product=self.prods[1], quantity=2, unit_price=1)
+        self.order.status = 'cancelled'
+        self.order.save()
+        self.assertStock(10, 10)
+
+        # items on a cancelled order hold nothing
+        OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=1, unit_price=1)
+        self.assertStock(10, 10)
+
+        self.order.status = 'pending'
+        self.order.save()
+        self.assertStock(5, 8)
+
+    def test_reopen_without_stock_keeps_cancelled(self):
+        OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=4, unit_price=1)
+        self.order.status = 'cancelled'
+        self.order.save()
+        Product.objects.filter(pk=self.prods[0].pk).update(stock_level=3)
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = 'pending'
+        with self.assertRaises(InsufficientStock):
+            order.save()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'cancelled')
+        self.assertStock(3, 10)
+
+    def test_deleting_order_releases(self):
+        OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=4, unit_price=1)
+        self.order.delete()
+        self.assertStock(10, 10)
+
+    def test_stale_orders_give_stock_back_once(self):
+        OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=4, unit_price=1)
+        first, second, third = (Order.objects.get(pk=self.order.pk) for _ in range(3))
+        Product.objects.filter(pk=self.prods[0].pk).update(stock_level=1)
+        for order in (first, second):
+            order.status = 'cancelled'
+            order.save()
+        self.assertStock(5, 10)
+        # loaded as pending, deleted once cancelled
+        third.delete()
+        self.assertStock(5, 10)
+
+    def test_item_writes_lock_the_order_before_products(self):
+        calls = mock.Mock()
+        calls.lock_orders.side_effect = stock.lock_orders
+        calls.adjust.side_effect = stock.adjust
+        with mock.patch.object(stock, 'lock_orders', calls.lock_orders), mock.patch.object(stock, 'adjust', calls.adjust):
+            OrderItem.objects.create(order=self.order, product=self.prods[0], quantity=4, unit_price=1)
+        self.assertEqual([name for name, args, kwargs in calls.mock_calls], ['lock_orders', 'adjust'])
+        self.assertStock(6, 10)
+
+
+class StatusLifecycleTest(TestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="Zoe", email="zoe@example.com")
+        self.order = Order.objects.create(number="ORD1", customer=self.cust, shipping_method="standard", shipping_cost=1)
+
+    def history(self, order):
+        return list(order.status_changes.order_by('id').values_list('from_status', 'to_status'))
+
+    def test_transitions_are_recorded(self):
+        self.order.status = 'cancelled'
+        self.order.save()
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = 'pending'
+        order.save()
+        order.shipping_cost = 2
+        order.save()
+        order.status = 'completed'
+        order.save(update_fields=['status'])
+        self.assertEqual(
+            self.history(order),
+            [('', 'pending'), ('pending', 'cancelled'), ('cancelled', 'pending'), ('pending', 'completed')],
+        )
+
+    def test_invalid_transition_writes_nothing(self):
+        self.order.status = 'completed'
+        self.order.save()
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = 'pending'
+        with self.assertRaises(InvalidTransition):
+            order.save()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'completed')
+        self.assertEqual(len(self.history(order)), 2)
+        # saves that leave the status out are not checked
+        order.save(update_fields=['shipping_cost'])
+
+    def test_transition_is_checked_against_the_stored_status(self):
+        first, second = Order.objects.get(pk=self.order.pk), Order.objects.get(pk=self.order.pk)
+        first.status = 'cancelled'
+        first.save()
+        # loaded as pending, but cancelled by now
+        second.status = 'completed'
+        with self.assertRaises(InvalidTransition):
+            second.save()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'cancelled')
+        self.assertEqual(self.history(first), [('', 'pending'), ('pending', 'cancelled')])
+
+        # and so is every row of a bulk update
+        second.status = 'completed'
+        with self.assertRaises(InvalidTransition):
+            pre_bulk_write.send(sender=Order, instances=[second])
+        second.status = 'pending'
+        pre_bulk_write.send(sender=Order, instances=[second])
+        self.assertEqual(second._loaded_status, 'cancelled')
+
+    def test_new_orders_start_anywhere(self):
+        order = Order.objects.create(
+            number="ORD2", customer=self.cust, shipping_method="standard", shipping_cost=1, status='completed',
+        )
+        self.assertEqual(self.history(order), [('', 'completed')])
+        self.assertEqual(lifecycle.next_statuses('completed'), ('cancelled',))
+
+    def test_history_is_append_only(self):
+        change = self.order.status_changes.get()
+        change.to_status = 'completed'
+        with self.assertRaises(ValueError):
+            change.save()
+
+    def test_pending_queue_has_a_partial_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Order._meta.db_table)
+        self.assertEqual(constraints['order_pending_date_idx']['columns'], ['date_and_time', 'id'])
+
+
+class StockConcurrencyTest(TransactionTestCase):
+    def test_parallel_orders_never_oversell(self):
+        out = StringIO()
+        call_command('bench_stock', threads=4, orders=25, products=3, stock=40, stdout=out)
+        self.assertIn('No stock was oversold.', out.getvalue())
+        self.assertIn('orders/sec', out.getvalue())
+
+
+class OrderNumberingTest(TestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="C", email="c@example.com")
+
+    @override_settings(ORDER_NUMBER_FORMAT='WEB-{date:%Y}-{seq:05d}')
+    def test_format_and_check_digit(self):
+        number = numbering.format_number(42, date(2026, 1, 2))
+        self.assertEqual(number[:-1], 'WEB-2026-00042')
+        self.assertTrue(numbering.is_valid(number))
+        self.assertFalse(numbering.is_valid(number[:-1] + str((int(number[-1]) + 1) % 10)))
+        with self.settings(ORDER_NUMBER_CHECK_DIGIT=False):
+            self.assertEqual(numbering.format_number(42, date(2026, 1, 2)), 'WEB-2026-00042')
+
+    def test_orders_without_a_number_get_one(self):
+        given = Order.objects.create(number="MINE-1", customer=self.cust, shipping_method="standard", shipping_cost=0)
+        first = Order.objects.create(customer=self.cust, shipping_method="standard", shipping_cost=0)
+        batch = Order.objects.bulk_create(
+            [Order(customer=self.cust, shipping_method="standard", shipping_cost=0) for _ in range(3)]
+        )
+        self.assertEqual(given.number, "MINE-1")
+        numbers = [first.number] + [order.number for order in batch]
+        self.assertEqual(len(set(numbers)), 4)
+        self.assertTrue(all(numbering.is_valid(number) for number in numbers))
+        self.assertTrue(first.number.startswith('ORD' + timezone.localdate().strftime('%y%m%d')))
+
+        ImportCommandTest.setUp(self)
+        path = ImportCommandTest.write(self, 'orders.ndjson', json.dumps({
+            'customer_email': 'c@example.com', 'shipping_method': 'standard', 'shipping_cost': '1.00',
+            'items': [],
+        }) + '\n')
+        out, _ = ImportCommandTest.run_import(self, 'orders', path)
+        self.assertIn('Loaded 1 orders', out)
+        self.assertEqual(Order.objects.exclude(number__in=[given.number, *numbers]).get().number[:3], 'ORD')
+
+
+@override_settings(ORDER_NUMBER_BLOCK_SIZE=20)
+class OrderNumberingConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        # the counter table is emptied between tests, the process's pool is not
+        numbering.allocator.clear()
+        self.addCleanup(numbering.allocator.clear)
+        self.reservations = numbering.allocator.reservations
+
+    def test_parallel_orders_get_distinct_numbers_in_blocks(self):
+        customer = Customer.objects.create(name="C", email="c@example.com")
+        threads, per_thread, errors = 4, 30, []
+
+        def worker():
+            try:
+                for _ in range(per_thread):
+                    for attempt in range(50):
+                        try:
+                            Order.objects.create(customer=customer, shipping_method="standard", shipping_cost=0)
+                            break
+                        except OperationalError:
+                            # SQLite allows one writer at a time
+                            time.sleep(0.001 * (attempt + 1))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+        numbers = list(Order.objects.values_list('number', flat=True))
+        self.assertEqual(len(numbers), threads * per_thread)
+        self.assertEqual(len(set(numbers)), len(numbers))
+        # a round trip per block of 20, not per order; orders whose insert
+        # hit the SQLite lock and were retried used up a number each
+        reservations = numbering.allocator.reservations - self.reservations
+        self.assertEqual(NumberSequence.objects.get().last_value, reservations * 20)
+        self.assertLess(reservations, threads * per_thread / 5)
+
+
+class ImportCommandTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_orders', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_products_csv_rejects_bad_rows(self):
+        Product.objects.create(sku="OLD", name="Old", unit_price=1)
+        path = self.write('products.csv', (
+            "sku,name,unit_price,stock_level\n"
+            "A1,Anvil,10.50,3\n"
+            "OLD,Again,1.00,\n"
+            "B2,Bolt,abc,1\n"
+            "C3,Cable,2.25,\n"
+            "A1,Anvil again,1.00,1\n"
+        ))
+        rejects = os.path.join(self.dir.name, 'rejects.csv')
+        out, _ = self.run_import('products', path, '--batch-size', '2', '--rejects', rejects)
+        self.assertIn('Loaded 2 products, rejected 3', out)
+        self.assertEqual(Product.objects.get(sku='C3').stock_level, 0)
+        self.assertEqual(Product.objects.get(sku='A1').name, 'Anvil')
+        with open(rejects, encoding='utf-8') as f:
+            self.assertEqual([row['line'] for row in csv.DictReader(f)], ['3', '4', '6'])
+
+    def test_customers_ndjson(self):
+        path = self.write('customers.ndjson', (
+            '{"name": "Ann", "email": "ann@example.com"}\n'
+            '{"name": "Bob", "email": "not-an-email"}\n'
+            'not json\n'
+        ))
+        out, err = self.run_import('customers', path)
+        self.assertIn('Loaded 1 customers, rejected 2', out)
+        self.assertIn('line 2: {"email"', err)
+
+    def test_orders_round_trip_through_export(self):
+        cust = Customer.objects.create(name="C", email="c@example.com")
+        prods = [Product.objects.create(sku=f"SKU{i}", name=f"P{i}", unit_price=1, stock_level=100) for i in range(2)]
+        for i in range(3):
+            order = Order.objects.create(number=f"ORD{i}", customer=cust, shipping_method="tnt", shipping_cost='1.50')
+            for p in prods[:i]:
+                OrderItem.objects.create(order=order, product=p, quantity=2, unit_price='2.25')
+        expected = list(Order.objects.order_by('number').values_list('number', 'items_count', 'subtotal', 'total'))
+
+        for fmt in ('csv', 'ndjson'):
+            exported = StringIO()
+            call_command('export_orders', '--format', fmt, stdout=exported, stderr=StringIO())
+            Order.objects.all().delete()
+            stock = list(Product.objects.order_by('pk').values_list('stock_level', flat=True))
+            out, _ = self.run_import('orders', self.write(f'orders.{fmt}', exported.getvalue()))
+            self.assertIn('Loaded 3 orders, rejected 0', out)
+            self.assertEqual(
+                list(Order.objects.order_by('number').values_list('number', 'items_count', 'subtotal', 'total')), expected
+            )
+            # historical orders leave stock alone
+            self.assertEqual(list(Product.objects.order_by('pk').values_list('stock_level', flat=True)), stock)
+
+    def test_orders_csv_without_numbers_are_one_row_each(self):
+        for n in range(2):
+            Customer.objects.create(name=f"C{n}", email=f"c{n}@example.com")
+            Product.objects.create(sku=f"SKU{n}", name=f"P{n}", unit_price=1, stock_level=100)
+        path = self.write('orders.csv', (
+            "number,customer_email,shipping_method,shipping_cost,status,item_product_sku,item_quantity,item_unit_price\n"
+            ",c0@example.com,tnt,1.00,completed,SKU0,1,2.00\n"
+            ",c1@example.com,tnt,1.00,completed,SKU1,3,2.00\n"
+        ))
+        out, _ = self.run_import('orders', path)
+        self.assertIn('Loaded 2 orders, rejected 0', out)
+        self.assertEqual(
+            sorted(Order.objects.values_list('customer__email', 'items__product__sku', 'items__quantity')),
+            [('c0@example.com', 'SKU0', 1), ('c1@example.com', 'SKU1', 3)],
+        )
+
+    def test_orders_rejects_unknown_references_and_choices(self):
+        Customer.objects.create(name="C", email="c@example.com")
+        path = self.write('orders.ndjson', (
+            '{"number": "H1", "customer_email": "c@example.com", "shipping_method": "tnt", "shipping_cost": 1, '
+            '"status": "completed", "items": [{"product_sku": "NOPE", "quantity": 1, "unit_price": 1}]}\n'
+            '{"number": "H2", "customer_email": "x@example.com", "shipping_method": "carrier pigeon", '
+            '"shipping_cost": 1, "status": "completed", "items": []}\n'
+            '{"number": "H3", "customer_email": "c@example.com", "shipping_method": "tnt", "shipping_cost": 2.1, '
+            '"date_and_time": "2020-05-01T10:00:00Z", "status": "completed", "items": []}\n'
+        ))
+        out, err = self.run_import('orders', path)
+        self.assertIn('Loaded 1 orders, rejected 2', out)
+        self.assertIn('items[0].product', err)
+        self.assertIn('shipping_method', err)
+        order = Order.objects.get()
+        self.assertEqual((order.number, order.total, order.date_and_time.year), ('H3', Decimal('2.10'), 2020))
+
+
+class SalesRollupTest(TestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="C", email="c@example.com")
+        self.prods = [Product.objects.create(sku=f"SKU{i}", name=f"P{i}", unit_price=1, stock_level=1000) for i in range(3)]
+        self.day = timezone.make_aware(datetime(2024, 3, 10, 12))
+
+    def order(self, number, days=0, method='standard', lines=()):
+        order = Order.objects.create(
+            number=number, customer=self.cust, shipping_method=method, shipping_cost='2.50',
+            date_and_time=self.day + timedelta(days=days),
+        )
+        for product, quantity, price in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=price)
+        return order
+
+    def assertRollupsCurrent(self):
+        analytics.refresh()
+        self.assertFalse(StaleRollupDay.objects.exists())
+        sales, products = defaultdict(lambda: [0, 0, Decimal('0.00'), Decimal('0.00')]), defaultdict(lambda: [set(), 0, Decimal('0.00')])
+        for order in Order.objects.prefetch_related('items'):
+            key = (analytics.order_day(order.date_and_time), order.status, order.shipping_method)
+            sales[key][0] += 1
+            sales[key][3] += order.shipping_cost
+            for item in order.items.all():
+                sales[key][1] += item.quantity
+                sales[key][2] += item.quantity * item.unit_price
+                product = products[key[0], item.product_id, order.status, order.shipping_method]
+                product[0].add(order.pk)
+                product[1] += item.quantity
+                product[2] += item.quantity * item.unit_price
+        self.assertEqual(
+            {(r.day, r.status, r.shipping_method): [r.orders, r.units, r.revenue, r.shipping] for r in DailySales.objects.all()},
+            dict(sales),
+        )
+        self.assertEqual(
+            {(r.day, r.product_id, r.status, r.shipping_method): [r.orders, r.units, r.revenue] for r in DailyProductSales.objects.all()},
+            {key: [len(orders), units, revenue] for key, (orders, units, revenue) in products.items()},
+        )
+
+    def test_rollups_follow_every_kind_of_write(self):
+        first = self.order("A", lines=[(self.prods[0], 2, '3.00'), (self.prods[1], 1, '1.25')])
+        second = self.order("B", days=1, method='tnt', lines=[(self.prods[0], 1, '3.00')])
+        self.order("C", days=1)
+        self.assertRollupsCurrent()
+
+        item = first.items.get(product=self.prods[0])
+        item.quantity = 5
+        item.save()
+        second.items.get().delete()
+        self.assertRollupsCurrent()
+
+        first.status = 'cancelled'
+        first.save()
+        second.date_and_time = self.day + timedelta(days=5)
+        second.shipping_method = 'express'
+        second.save()
+        self.assertRollupsCurrent()
+
+        OrderItem.objects.create(order=second, product=self.prods[2], quantity=4, unit_price='0.99')
+        Order.objects.get(number="C").delete()
+        self.assertRollupsCurrent()
+        # the days left without orders have no rollups at all
+        self.assertEqual(DailySales.objects.filter(day=analytics.order_day(self.day + timedelta(days=1))).count(), 0)
+
+    def test_reads_only_rebuild_stale_days(self):
+        self.order("A", lines=[(self.prods[0], 1, 1)])
+        self.order("B", days=7, lines=[(self.prods[0], 1, 1)])
+        analytics.refresh()
+        self.order("C", days=7, lines=[(self.prods[1], 1, 1)])
+        self.assertEqual(set(StaleRollupDay.objects.values_list('day', flat=True)), {analytics.order_day(self.day + timedelta(days=7))})
+        self.assertEqual(analytics.refresh(), 1)
+        self.assertEqual(analytics.refresh(), 0)
+        self.assertRollupsCurrent()
+
+    def test_import_marks_days_and_command_rebuilds_everything(self):
+        self.order("A", lines=[(self.prods[0], 1, 1)])
+        analytics.refresh()
+        DailySales.objects.update(revenue=999)
+        out = StringIO()
+        call_command('refresh_rollups', '--all', stdout=out)
+        self.assertIn('Rebuilt the rollups of 1 days', out.getvalue())
+        self.assertRollupsCurrent()
+
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            f.write(
+                '{"number": "H1", "customer_email": "c@example.com", "shipping_method": "tnt", "shipping_cost": 1, '
+                '"date_and_time": "2020-05-01T10:00:00Z", "status": "completed", '
+                '"items": [{"product_sku": "SKU2", "quantity": 3, "unit_price": 2}]}\n'
+            )
+        self.addCleanup(os.unlink, f.name)
+        call_command('import_orders', 'orders', f.name, stdout=StringIO(), stderr=StringIO())
+        self.assertRollupsCurrent()
+        self.assertEqual(DailySales.objects.get(day='2020-05-01').revenue, Decimal('6.00'))
+
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="C", email="c@example.com")
+        self.prod = Product.objects.create(sku="SKU1", name="P1", unit_price=1, stock_level=1000)
+        old = timezone.make_aware(datetime(2023, 6, 1, 12))
+        for i, status in enumerate(['completed', 'cancelled', 'pending', 'completed', 'completed']):
+            order = Order.objects.create(
+                number=f"ORD{i}", customer=self.cust, shipping_method="standard", shipping_cost=2,
+                date_and_time=old + timedelta(days=i),
+            )
+            OrderItem.objects.create(order=order, product=self.prod, quantity=i + 1, unit_price='1.50')
+            if status != 'pending':
+                order.status = status
+                order.save()
+        recent = Order.objects.get(number="ORD4")
+        recent.date_and_time = timezone.make_aware(datetime(2025, 6, 1, 12))
+        recent.save()
+        analytics.refresh()
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command('archive_orders', '--before', '2024-01-01', *args, stdout=out)
+        return out.getvalue()
+
+    def rollups(self):
+        return sorted(DailySales.objects.values_list('day', 'status', 'orders', 'units', 'revenue', 'shipping'))
+
+    def test_moves_finished_orders_in_resumable_batches(self):
+        rollups = self.rollups()
+        self.assertIn('3 orders', self.archive('--dry-run'))
+        self.archive('--limit', '1')
+        self.assertEqual(ArchivedOrder.objects.count(), 1)
+        self.archive('--batch-size', '1')
+
+        self.assertEqual(sorted(Order.objects.values_list('number', flat=True)), ['ORD2', 'ORD4'])
+        self.assertEqual(sorted(ArchivedOrder.objects.values_list('number', flat=True)), ['ORD0', 'ORD1', 'ORD3'])
+        archived = ArchivedOrder.objects.get(number="ORD1")
+        self.assertEqual(archived.items.get().quantity, 2)
+        self.assertEqual(archived.total, Decimal('5.00'))
+        self.assertEqual([change[:2] for change in archived.status_history], [['', 'pending'], ['pending', 'cancelled']])
+        self.assertFalse(OrderItem.objects.filter(order__number="ORD1").exists())
+
+        # stock held by the completed orders stays taken
+        self.assertEqual(Product.objects.get().stock_level, 1000 - 1 - 3 - 4 - 5)
+        self.assertFalse(StaleRollupDay.objects.exists())
+        analytics.mark_all()
+        analytics.refresh()
+        self.assertEqual(self.rollups(), rollups)
+        self.assertIn('Archived 0 orders', self.archive())
+
+    def test_only_finished_statuses(self):
+        with self.assertRaises(CommandError):
+            self.archive('--status', 'pending')
+        self.archive('--status', 'cancelled')
+        self.assertEqual(list(ArchivedOrder.objects.values_list('number', flat=True)), ['ORD1'])
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.cust = Customer.objects.create(name="C", email="c@example.com")
+        self.prod = Product.objects.create(sku="SKU1", name="P1", unit_price=1, stock_level=10)
+
+    def events(self):
+        return list(OutboxEvent.objects.order_by('pk').values_list('topic', 'action'))
+
+    def test_writes_append_events_in_their_transaction(self):
+        OutboxEvent.objects.all().delete()
+        order = Order.objects.create(number="ORD1", customer=self.cust, shipping_method="standard", shipping_cost=2)
+        item = OrderItem.objects.create(order=order, product=self.prod, quantity=3, unit_price=1)
+        # the item, the stock it took and the order total it changed
+        self.assertEqual(self.events(), [
+            ('order', 'saved'), ('product', 'saved'), ('orderitem', 'saved'), ('order', 'saved'),
+        ])
+        event = OutboxEvent.objects.filter(topic='order').latest('pk')
+        self.assertEqual((event.object_id, event.payload['total']), (order.pk, '5.00'))
+
+        OutboxEvent.objects.all().delete()
+        with self.assertRaises(InsufficientStock), transaction.atomic():
+            OrderItem.objects.create(order=order, product=self.prod, quantity=99, unit_price=1)
+        self.assertEqual(self.events(), [])
+        item.delete()
+        self.assertIn(('orderitem', 'deleted'), self.events())
+        with self.assertRaises(ValueError):
+            OutboxEvent.objects.first().save()
+
+    def test_relay_numbers_events_in_order(self):
+        self.assertEqual([e.sequence for e in outbox.relay(batch_size=1)], [1])
+        Product.objects.create(sku="SKU2", name="P2", unit_price=1, stock_level=1)
+        self.assertEqual(outbox.relay_all(), 1)
+        self.assertEqual(outbox.relay(), [])
+        self.assertEqual(list(OutboxEvent.objects.order_by('pk').values_list('sequence', flat=True)), [1, 2])
+        feed = list(outbox.feed(after=1))
+        self.assertEqual([(e['sequence'], e['payload']['sku']) for e in feed], [(2, 'SKU2')])
+
+    def test_relay_command_emits_json_lines(self):
+        out, err = StringIO(), StringIO()
+        call_command('relay_outbox', '--once', '--emit', stdout=out, stderr=err)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(e['sequence'], e['topic'], e['object_id']) for e in lines], [(1, 'product', self.prod.pk)])
+        self.assertIn('Relayed 1 events', err.getvalue())
+        out = StringIO()
+        call_command('relay_outbox', '--once', stdout=out)
+        self.assertIn('Relayed 0 events', out.getvalue())
+
+    def test_imports_and_archiving_emit(self):
+        OutboxEvent.objects.all().delete()
+        ProductImporter().run([(1, {'sku': 'SKU9', 'name': 'Nine', 'unit_price': '1.00', 'stock_level': '5'})])
+        self.assertEqual(self.events(), [('product', 'saved')])
+        order = Order.objects.create(
+            number="ORD1", customer=self.cust, shipping_method="standard", shipping_cost=2,
+            date_and_time=timezone.make_aware(datetime(2020, 1, 1)), status='completed',
+        )
+        OutboxEvent.objects.all().delete()
+        call_command('archive_orders', '--before', '2021-01-01', stdout=StringIO())
+        self.assertEqual(list(OutboxEvent.objects.values_list('topic', 'object_id', 'action')), [('order', order.pk, 'archived')])
+
+
+class AdminTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+
+    def changelist(self, model):
+        return reverse(f'admin:orders_{model._meta.model_name}_changelist')
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        synthetic.generate(3, 10, 40, seed=1)
+        counts = {}
+        for model in (Order, OrderItem):
+            with CaptureQueriesContext(connection) as many:
+                self.assertEqual(self.client.get(self.changelist(model)).status_code, 200)
+            counts[model] = len(many)
+        Order.objects.exclude(pk__in=Order.objects.order_by('pk').values('pk')[:3]).delete()
+        for model in (Order, OrderItem):
+            with CaptureQueriesContext(connection) as few:
+                self.client.get(self.changelist(model))
+            self.assertEqual(len(few), counts[model], model.__name__)
+
+    def test_pages_render(self):
+        synthetic.generate(2, 3, 2, seed=1)
+        order = Order.objects.first()
+        for model in (Customer, Product, Order, OrderItem, ArchivedOrder, OutboxEvent, NumberSequence):
+            self.assertEqual(self.client.get(self.changelist(model)).status_code, 200, model.__name__)
+        resp = self.client.get(reverse('admin:orders_order_change', args=[order.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, order.items.first().product.name)
+        resp = self.client.get(self.changelist(Order), {'q': order.number})
+        self.assertEqual(list(resp.context['cl'].result_list), [order])
+
+    def test_large_tables_show_estimate(self):
+        synthetic.generate(2, 3, 2, seed=1)
+        self.assertEqual(EstimatedCountPaginator(Order.objects.order_by('-id'), 10).count, 2)
+        with mock.patch('orders.admin.estimated_count', return_value=5000000):
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(self.changelist(Order))
+        self.assertEqual(resp.context['cl'].result_count, 5000000)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries))
+
+
+class JobTest(TestCase):
+    def test_job_runs_and_reports_progress(self):
+        synthetic.generate(2, 5, 12, seed=1)
+        expected = dict(Order.objects.values_list('pk', 'total'))
+        Order.objects.update(total=0)
+        job = jobs.enqueue('rebuild_order_totals', {'batch_size': 5})
+        self.assertEqual((job.status, job.attempts), (jobs.QUEUED, 0))
+
+        reports = []
+        report = jobs.report
+        with mock.patch('orders.jobs.report', side_effect=lambda *a, **k: (reports.append(a[1:]), report(*a, **k))):
+            self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(reports, [(0, 12), (5, 12), (10, 12), (12, 12)])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.done, job.total), (jobs.SUCCEEDED, 1, 12, 12))
+        self.assertEqual(job.result, {'orders': 12})
+        self.assertEqual((job.worker, job.lease_expires_at), ('', None))
+        self.assertEqual(dict(Order.objects.values_list('pk', 'total')), expected)
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_rollup_job_reports_each_batch(self):
+        customer = Customer.objects.create(name="C", email="c@example.com")
+        start = timezone.make_aware(datetime(2024, 1, 1, 12))
+        Order.objects.bulk_create([
+            Order(customer=customer, shipping_method="tnt", shipping_cost=1, date_and_time=start + timedelta(days=n))
+            for n in range(70)
+        ])
+        job = jobs.enqueue('refresh_rollups', {'rebuild_all': True})
+        reports = []
+        report = jobs.report
+        with mock.patch('orders.jobs.report', side_effect=lambda *a, **k: (reports.append(a[1:]), report(*a, **k))):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(reports, [(0, 70), (31, 70), (62, 70), (70, 70)])
+        self.assertEqual((job.status, job.result), (jobs.SUCCEEDED, {'days': 70}))
+        self.assertEqual(DailySales.objects.values('day').distinct().count(), 70)
+        self.assertFalse(StaleRollupDay.objects.exists())
+
+    def test_enqueue_checks_kind_and_params(self):
+        with self.assertRaisesMessage(jobs.InvalidJob, "Unknown job kind 'nope'"):
+            jobs.enqueue('nope')
+        with self.assertRaises(jobs.InvalidJob):
+            jobs.enqueue('refresh_rollups', {'everything': True})
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOB_RETRY_DELAY=60)
+    def test_failures_are_retried_with_backoff(self):
+        calls = []
+
+        def flaky(job):
+            calls.append(job.attempts)
+            raise RuntimeError('broker down')
+
+        with mock.patch.dict(jobs.TASKS, {'flaky': flaky}):
+            job = jobs.enqueue('flaky')
+            with self.assertLogs('orders.jobs', 'WARNING'):
+                jobs.run_pending()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (jobs.QUEUED, 1))
+            self.assertIn('RuntimeError: broker down', job.error)
+            self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=50))
+            # not due yet
+            self.assertEqual(jobs.run_pending(), 0)
+
+            for attempt in (2, 3):
+                Job.objects.update(run_at=timezone.now())
+                with self.assertLogs('orders.jobs', 'WARNING'):
+                    jobs.run_pending()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (jobs.FAILED, 3))
+            self.assertEqual(calls, [1, 2, 3])
+
+    def test_invalid_job_fails_at_once(self):
+        job = jobs.enqueue('archive_orders', {'before': 'last tuesday'})
+        with self.assertLogs('orders.jobs', 'WARNING'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (jobs.FAILED, 1))
+        self.assertIn("before must be a date or datetime", job.error)
+
+    def test_claims_oldest_due_job_once(self):
+        first, second = jobs.enqueue('refresh_rollups'), jobs.enqueue('refresh_rollups')
+        later = jobs.enqueue('refresh_rollups')
+        Job.objects.filter(pk=later.pk).update(run_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(jobs.claim('a').pk, first.pk)
+        claimed = jobs.claim('b')
+        self.assertEqual((claimed.pk, claimed.worker, claimed.status, claimed.attempts), (second.pk, 'b', jobs.RUNNING, 1))
+        self.assertIsNone(jobs.claim('c'))
+        self.assertIsNone(jobs.claim('c', kinds=['export_orders']))
+
+    def test_lapsed_lease_is_taken_back(self):
+        job = jobs.enqueue('refresh_rollups', max_attempts=2)
+        stale = jobs.claim('gone')
+        Job.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.reclaim(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (jobs.QUEUED, ''))
+        # the old worker finds out at its next report
+        with self.assertRaises(jobs.JobLost):
+            jobs.report(stale, 1)
+
+        jobs.claim('gone again')
+        Job.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        jobs.reclaim()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (jobs.FAILED, 2))
+
+    def test_delete_job_needs_a_filter(self):
+        synthetic.generate(2, 5, 6, seed=1)
+        job = jobs.enqueue('delete_orders')
+        with self.assertLogs('orders.jobs', 'WARNING'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, jobs.FAILED)
+        self.assertEqual(Order.objects.count(), 6)
+
+        ids = list(Order.objects.order_by('pk').values_list('pk', flat=True)[:5])
+        job = jobs.enqueue('delete_orders', {'ids': ids, 'batch_size': 2})
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.done), (jobs.SUCCEEDED, {'orders': 5}, 5))
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class RunWorkersTest(TransactionTestCase):
+    def test_drains_the_queue(self):
+        for _ in range(3):
+            jobs.enqueue('refresh_rollups')
+        out = StringIO()
+        call_command('run_workers', '--workers', '1', '--once', stdout=out)
+        self.assertIn('Ran 3 jobs', out.getvalue())
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {jobs.SUCCEEDED})
+        with self.assertRaises(CommandError):
+            call_command('run_workers', '--workers', '0')
+
+
+class BenchmarkTest(TestCase):
+    def test_generator_is_seeded(self):
+        synthetic.generate(5, 20, 50, seed=7)
+        rows = list(OrderItem.objects.order_by('pk').values_list('order__number', 'product__sku', 'quantity'))
+        totals = list(Order.objects.order_by('number').values_list('number', 'date_and_time', 'status', 'total'))
+        self.assertTrue(all(1 <= o.items_count <= synthetic.MAX_ITEMS for o in Order.objects.all()))
+        self.assertEqual(
+            [(o.subtotal, o.items_count) for o in Order.objects.order_by('pk')],
+            [(sum((i.quantity * i.unit_price for i in o.items.all()), Decimal('0.00')), o.items.count())
+             for o in Order.objects.order_by('pk')],
+        )
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        synthetic.generate(5, 20, 50, seed=7)
+        self.assertEqual(list(OrderItem.objects.order_by('pk').values_list('order__number', 'product__sku', 'quantity')), rows)
+        self.assertEqual(list(Order.objects.order_by('number').values_list('number', 'date_and_time', 'status', 'total')), totals)
+
+    def test_command_reports_and_flags_regressions(self):
+        out = StringIO()
+        call_command('bench_api', '--in-place', '--orders', '30', '--customers', '3', '--products', '10',
+                     '--requests', '3', '--warmup', '1', '--memory-requests', '1', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['scenarios']), {'order-list', 'order-detail', 'order-items-filter', 'graphql-search', 'bulk-create'})
+        self.assertEqual(report['data']['orders'], 30)
+
+        baseline = {'scenarios': {'order-list': {'p50_ms': 5.0, 'p99_ms': 9.0, 'queries': 2, 'peak_kb': 100}}}
+        same = {'scenarios': {'order-list': {'p50_ms': 5.5, 'p99_ms': 9.0, 'queries': 2, 'peak_kb': 110}}}
+        worse = {'scenarios': {'order-list': {'p50_ms': 12.0, 'p99_ms': 9.0, 'queries': 3, 'peak_kb': 100}}}
+        self.assertEqual(compare(same, baseline, 0.25), [])
+        self.assertEqual(compare(worse, baseline, 0.25), ['order-list: p50_ms 5.0 -> 12.0', 'order-list: queries 2 -> 3'])
+
+    def test_graphql_command_reports_cached_and_uncached(self):
+        out = StringIO()
+        call_command('bench_graphql', '--in-place', '--requests', '3', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['scenarios']), {'uncached', 'cached', 'persisted'})
+        self.assertLess(report['prepare_cached_us'], report['prepare_uncached_us'])
+
+    def test_fastpath_command_compares_both_paths(self):
+        out = StringIO()
+        args = ('--in-place', '--orders', '30', '--customers', '3', '--products', '10', '--repeat', '1')
+        call_command('bench_fastpath', *args, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['lists']), {'orders', 'items'})
+        self.assertEqual(report['lists']['orders']['rows'], 30)
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, 'Below 1000.0x'):
+            call_command('bench_fastpath', *args, '--min-speedup', '1000', stdout=StringIO())
+
+
+@unittest.skipUnless('replica' in settings.DATABASES, 'needs the replica alias')
+@override_settings(DATABASE_REPLICAS=['replica'])
+class BenchmarkScratchDatabaseTest(TransactionTestCase):
+    # the scratch database is this test's own, so creating it is skipped;
+    # a real replica would not have it, so nothing may be read from there
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        health.reset()
+
+    def test_benchmarks_read_from_the_primary(self):
+        for command, *args in (
+            ('bench_api', '--orders', '30', '--customers', '3', '--products', '10',
+             '--requests', '3', '--warmup', '1', '--memory-requests', '1'),
+            ('bench_graphql', '--requests', '3'),
+        ):
+            replica = []
+            # recorded rather than run, and as they come: every request
+            # clears the connections' query logs
+            with mock.patch.object(connection.creation, 'create_test_db') as create, \
+                    mock.patch.object(connection.creation, 'destroy_test_db') as destroy, \
+                    connections['replica'].execute_wrapper(lambda execute, sql, *a: replica.append(sql)):
+                call_command(command, *args, stdout=StringIO())
+            create.assert_called_once()
+            destroy.assert_called_once()
+            self.assertEqual(replica, [], command)
+            Customer.objects.all().delete()
+            Product.objects.all().delete()
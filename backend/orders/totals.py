@@ -0,0 +1,99 @@
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Now
+
+# Order.items_count/subtotal/total are denormalized from the order's items.
+# Single row writes move them by a delta with F() expressions, so concurrent
+# writers to the same order never lose an update; bulk writes recompute the
+# affected orders in one UPDATE. Either way the order's updated_at moves too,
+# so incremental readers see item changes.
+
+TOTAL_FIELDS = ('items_count', 'subtotal', 'total')
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def to_money(value):
+    return Decimal(str(value)).quantize(CENT)
+
+
+def line_total(quantity, unit_price):
+    return (Decimal(quantity) * to_money(unit_price)).quantize(CENT)
+
+
+def apply_delta(order_id, count, amount):
+    """
+    Move one order's totals by ``count`` lines and ``amount`` of value, and
+    mark it updated.
+    """
+    from .models import Order
+
+    Order.objects.filter(pk=order_id).update(
+        items_count=F('items_count') + count,
+        subtotal=F('subtotal') + Value(amount),
+        total=F('total') + Value(amount),
+        updated_at=Now(),
+    )
+
+
+def computed_totals():
+    """
+    Expressions computing an order's totals from its items, for use in
+    annotate() or update() on an Order queryset.
+    """
+    from .models import OrderItem
+
+    money = DecimalField(max_digits=12, decimal_places=2)
+    lines = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    count = lines.annotate(n=Count('pk')).values('n')
+    amount = lines.annotate(s=Sum(F('quantity') * F('unit_price'), output_field=money)).values('s')
+    subtotal = Coalesce(Subquery(amount, output_field=money), Value(ZERO), output_field=money)
+    return {
+        'items_count': Coalesce(Subquery(count), Value(0)),
+        'subtotal': subtotal,
+        'total': subtotal + F('shipping_cost'),
+    }
+
+
+def recalculate(queryset, touch=False):
+    """
+    Recompute the totals of every order in ``queryset`` from its items.
+    ``touch`` also stamps updated_at, for when the items really changed.
+    """
+    values = computed_totals()
+    if touch:
+        values['updated_at'] = Now()
+    return queryset.order_by().update(**values)
+
+
+def id_ranges(batch_size):
+    """
+    Yield (first, last, count) over the order primary keys, ``batch_size``
+    orders per range, for updates one range at a time.
+    """
+    from .models import Order
+
+    last = 0
+    while True:
+        ids = list(Order.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids[0], ids[-1], len(ids)
+        last = ids[-1]
+
+
+def refresh(orders):
+    """
+    Reload the totals of in-memory orders after they were written in SQL.
+    """
+    from .models import Order
+
+    fields = (*TOTAL_FIELDS, 'updated_at')
+    orders = [order for order in orders if order.pk is not None]
+    rows = Order.objects.filter(pk__in=[o.pk for o in orders]).values_list('pk', *fields)
+    found = {pk: values for pk, *values in rows}
+    for order in orders:
+        for name, value in zip(fields, found.get(order.pk, ())):
+            setattr(order, name, value)
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Each model has a data version in the shared cache that changes whenever
+# one of its rows does. Cached reads are keyed on the versions they depend
+# on, so a write invalidates exactly the entries built from that model.
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _key(model):
+    return f'data-version:{model._meta.label_lower}'
+
+
+def get_versions(models):
+    """
+    Return the current version of each model, in order.
+    """
+    cache = _cache()
+    keys = [_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # a version evicted from the cache must never come back as an old value
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*models):
+    """
+    Move the given models to a new version. Inside a transaction the bump is
+    repeated on commit, so a read racing the write cannot cache stale rows
+    under the new version.
+    """
+    def _bump():
+        _cache().set_many({_key(model): time.time_ns() for model in models}, None)
+
+    _bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(_bump)
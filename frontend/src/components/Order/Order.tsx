@@ -28,8 +28,23 @@ export interface NewOrderType {
     items: ExistingOrderItemType[];
 }
 
+// An item written together with its order; lines with an id update that item
+export interface OrderLineType {
+    id?: number;
+    product: number;
+    quantity: number;
+    unit_price: number;
+}
+
+export interface NewOrderWithItemsType extends Omit<NewOrderType, 'items'> {
+    items: OrderLineType[];
+}
+
 export interface ExistingOrderType extends NewOrderType {
     id: number;
+    items_count: number;
+    subtotal: string;
+    total: string;
     created_at: string;
     updated_at: string;
 }
@@ -70,6 +85,10 @@ export const Order = ({order}: ExistingOrderProps) => {
                                 <label className="block text-sm font-medium text-gray-500">Shipping Cost</label>
                                 <p className="text-gray-600">${order.shipping_cost}</p>
                             </div>
+                            <div>
+                                <label className="block text-sm font-medium text-gray-500">Total</label>
+                                <p className="text-gray-600">${order.total} ({order.items_count} items)</p>
+                            </div>
                             <div>
                                 <label className="block text-sm font-medium text-gray-500">Status</label>
                                 <p className="text-gray-600 capitalize">{order.status}</p>
@@ -3,12 +3,11 @@ import {zodResolver} from "@hookform/resolvers/zod";
 import {useFieldArray, useForm} from "react-hook-form";
 import {useOrderStore} from "../../stores/orderStore.ts";
 import {useProducts} from "../../hooks/useProducts.ts";
-import type {ExistingOrderType, NewOrderType} from "./Order.tsx";
+import type {ExistingOrderType, NewOrderWithItemsType, OrderLineType} from "./Order.tsx";
 import {useOrders} from "../../hooks/useOrders.ts";
 import {useDebounce} from "use-debounce";
 import {type CustomerOption, getCustomer, searchCustomerNameEmail} from "../../hooks/useCustomerSearch.ts";
 import {useEffect, useState} from "react";
-import {useOrderItems} from "../../hooks/useOrderItems.ts";
 import {useProductSearch, getProduct} from "../../hooks/useProductSearch.ts";
 import {Product} from "../Product/Product.tsx";
 import {Customer} from "../Customer/Customer.tsx";
@@ -58,8 +57,7 @@ export const OrderForm = ({order, onCancel, onSuccess}: OrderFormProps) => {
     const [selectedCustomer, setSelectedCustomer] = useState<CustomerOption>()
     const [customerSearch, setCustomerSearch] = useState<string>("")
     const [productSearch, setProductSearch] = useState<string>("")
-    const {createAsyncOrder, updateOrder} = useOrders();
-    const {createOrderItem, deleteOrderItem} = useOrderItems();
+    const {createOrderWithItems, updateOrderWithItems} = useOrders();
     const {products} = useProducts();
     const {
         register,
@@ -129,27 +127,9 @@ export const OrderForm = ({order, onCancel, onSuccess}: OrderFormProps) => {
 
     const onSubmit = handleSubmit(async (data: OrderFormData) => {
         try {
-            const orderData: NewOrderType = {
-                number: data.number,
-                date_and_time: new Date(data.date_and_time).toISOString(),
-                customer: data.customer,
-                shipping_method: data.shipping_method,
-                shipping_cost: parseFloat(data.shipping_cost),
-                status: data.status,
-                items: []
-            };
-            let orderId;
-            if (order?.id) {
-                updateOrder({id: order.id, order: orderData});
-                orderId = order.id;
-            } else {
-                const createdOrder = await createAsyncOrder(orderData);
-                orderId = createdOrder.id;
-            }
-            const itemsByProduct = data.items.reduce((acc, item) => {
+            const itemsByProduct = data.items.reduce<Record<number, OrderLineType>>((acc, item) => {
                 if (!acc[item.product]) {
                     acc[item.product] = {
-                        order: orderId,
                         product: item.product,
                         quantity: 0,
                         unit_price: parseFloat(item.unit_price)
@@ -158,19 +138,21 @@ export const OrderForm = ({order, onCancel, onSuccess}: OrderFormProps) => {
                 acc[item.product].quantity += parseInt(item.quantity);
                 return acc;
             }, {});
-            /*if order items exist, delete them first, then create new ones.*/
-            if (order?.items) {
-                await Promise.all(order.items.map(item => deleteOrderItem(item.id)));
+            const orderData: NewOrderWithItemsType = {
+                number: data.number,
+                date_and_time: new Date(data.date_and_time).toISOString(),
+                customer: data.customer,
+                shipping_method: data.shipping_method,
+                shipping_cost: parseFloat(data.shipping_cost),
+                status: data.status,
+                items: Object.values(itemsByProduct),
+            };
+            /*the order and its items are written in one request; on edit, the old items are replaced*/
+            if (order?.id) {
+                await updateOrderWithItems({id: order.id, order: orderData});
+            } else {
+                await createOrderWithItems(orderData);
             }
-            const itemPromises = Object.values(itemsByProduct).map(async (item) => {
-                return createOrderItem({
-                    order: item.order,
-                    product: item.product,
-                    quantity: item.quantity,
-                    unit_price: item.unit_price
-                });
-            });
-            await Promise.all(itemPromises);
             clearForm();
         } catch (error) {
             console.error("Error submitting form:", error);
@@ -1,14 +1,21 @@
 import {useMutation, useQuery, useQueryClient} from "@tanstack/react-query";
-import {createCustomer, deleteCustomer, fetchCustomers, putCustomer} from "../services/customerService.ts";
-import type {NewCustomerType} from "../components/Customer/Customer.tsx";
+import {createCustomer, deleteCustomer, fetchCustomers, fetchCustomersPage, putCustomer} from "../services/customerService.ts";
+import type {ExistingCustomerType, NewCustomerType} from "../components/Customer/Customer.tsx";
+import {singlePage, type Page} from "../services/pagination.ts";
+import {useCustomerStore} from "../stores/customerStore.ts";
 
 export const useCustomers = () => {
     const queryClient = useQueryClient();
 
-    const { data: customers = [], isLoading, error } = useQuery({
-        queryKey: ['customers'],
-        queryFn: fetchCustomers,
+    const { paginate, pageCursor, setPageCursor } = useCustomerStore();
+
+    const { data: page, isLoading, error } = useQuery({
+        queryKey: paginate ? ['customers', 'page', pageCursor] : ['customers'],
+        queryFn: (): Promise<Page<ExistingCustomerType>> => paginate
+            ? fetchCustomersPage(pageCursor)
+            : fetchCustomers().then(singlePage),
     });
+    const customers = page?.results ?? [];
 
     const createMutation = useMutation({
         mutationFn: (newCustomer: NewCustomerType) => createCustomer(newCustomer),
@@ -41,6 +48,8 @@ export const useCustomers = () => {
         isCreating: createMutation.isPending,
         isUpdating: updateMutation.isPending,
         isDeleting: deleteMutation.isPending,
+        nextPage: page?.next ? () => setPageCursor(page.next) : undefined,
+        previousPage: page?.previous ? () => setPageCursor(page.previous) : undefined,
     };
 
 }
\ No newline at end of file
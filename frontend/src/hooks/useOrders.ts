@@ -1,14 +1,21 @@
 import {useMutation, useQuery, useQueryClient} from "@tanstack/react-query";
-import {createOrder, fetchOrders, putOrder, removeOrder} from "../services/OrderService.ts";
-import type {NewOrderType} from "../components/Order/Order.tsx";
+import {createOrder, createOrderWithItems, fetchOrders, fetchOrdersPage, putOrder, putOrderWithItems, removeOrder} from "../services/OrderService.ts";
+import type {ExistingOrderType, NewOrderType, NewOrderWithItemsType} from "../components/Order/Order.tsx";
+import {singlePage, type Page} from "../services/pagination.ts";
+import {useOrderStore} from "../stores/orderStore.ts";
 
 export const useOrders = () => {
     const queryClient = useQueryClient();
 
-    const {data: orders = [], isLoading, isError} = useQuery({
-        queryKey: ['orders'],
-        queryFn: fetchOrders,
+    const {paginate, pageCursor, setPageCursor} = useOrderStore();
+
+    const {data: page, isLoading, isError} = useQuery({
+        queryKey: paginate ? ['orders', 'page', pageCursor] : ['orders'],
+        queryFn: (): Promise<Page<ExistingOrderType>> => paginate
+            ? fetchOrdersPage(pageCursor)
+            : fetchOrders().then(singlePage),
     });
+    const orders = page?.results ?? [];
 
     const createMutation = useMutation({
         mutationFn: (order: NewOrderType) => createOrder(order),
@@ -24,6 +31,22 @@ export const useOrders = () => {
         },
     });
 
+    const createWithItemsMutation = useMutation({
+        mutationFn: (order: NewOrderWithItemsType) => createOrderWithItems(order),
+        onSuccess: () => {
+            queryClient.invalidateQueries({queryKey: ['orders']});
+            queryClient.invalidateQueries({queryKey: ['order-items']});
+        },
+    });
+
+    const updateWithItemsMutation = useMutation({
+        mutationFn: ({id, order}: {id: number, order: NewOrderWithItemsType}) => putOrderWithItems(id, order),
+        onSuccess: () => {
+            queryClient.invalidateQueries({queryKey: ['orders']});
+            queryClient.invalidateQueries({queryKey: ['order-items']});
+        },
+    });
+
     const deleteMutation = useMutation({
         mutationFn: (id: number) => removeOrder(id),
         onSuccess: () => {
@@ -38,9 +61,13 @@ export const useOrders = () => {
         createOrder: createMutation.mutate,
         createAsyncOrder: createMutation.mutateAsync,
         updateOrder: updateMutation.mutate,
+        createOrderWithItems: createWithItemsMutation.mutateAsync,
+        updateOrderWithItems: updateWithItemsMutation.mutateAsync,
         deleteOrder: deleteMutation.mutate,
-        isCreating: createMutation.isPending,
-        isUpdating: updateMutation.isPending,
+        isCreating: createMutation.isPending || createWithItemsMutation.isPending,
+        isUpdating: updateMutation.isPending || updateWithItemsMutation.isPending,
         isDeleting: deleteMutation.isPending,
+        nextPage: page?.next ? () => setPageCursor(page.next) : undefined,
+        previousPage: page?.previous ? () => setPageCursor(page.previous) : undefined,
     }
 }
\ No newline at end of file
@@ -1,15 +1,22 @@
 import {useMutation, useQuery, useQueryClient} from "@tanstack/react-query";
-import {createProduct, removeProduct, fetchProducts, putProduct} from "../services/productService.ts";
-import type {NewProductType} from "../components/Product/Product.tsx";
+import {createProduct, removeProduct, fetchProducts, fetchProductsPage, putProduct} from "../services/productService.ts";
+import type {ExistingProductType, NewProductType} from "../components/Product/Product.tsx";
+import {singlePage, type Page} from "../services/pagination.ts";
+import {useProductStore} from "../stores/productStore.ts";
 
 
 export const useProducts = () => {
     const queryClient = useQueryClient();
 
-    const {data: products = [], isLoading, error} = useQuery({
-        queryKey: ['products'],
-        queryFn: fetchProducts,
+    const {paginate, pageCursor, setPageCursor} = useProductStore();
+
+    const {data: page, isLoading, error} = useQuery({
+        queryKey: paginate ? ['products', 'page', pageCursor] : ['products'],
+        queryFn: (): Promise<Page<ExistingProductType>> => paginate
+            ? fetchProductsPage(pageCursor)
+            : fetchProducts().then(singlePage),
     });
+    const products = page?.results ?? [];
 
     const createMutation = useMutation({
         mutationFn: (product: NewProductType) => createProduct(product),
@@ -42,5 +49,7 @@ export const useProducts = () => {
         isCreating: createMutation.isPending,
         isUpdating: updateMutation.isPending,
         isDeleting: deleteMutation.isPending,
+        nextPage: page?.next ? () => setPageCursor(page.next) : undefined,
+        previousPage: page?.previous ? () => setPageCursor(page.previous) : undefined,
     }
 }
\ No newline at end of file
@@ -30,6 +30,25 @@ export async function createOrderItem(item: NewOrderItemType) {
     }
 }
 
+export async function createOrderItems(items: NewOrderItemType[]): Promise<ExistingOrderItemType[]> {
+    try {
+        const response = await api.post("/order-items/", items);
+        return response.data;
+    } catch (error) {
+        console.error("OrderItem bulk create error:", error);
+        throw error;
+    }
+}
+
+export async function deleteOrderItems(ids: number[]) {
+    try {
+        await api.delete("/order-items/bulk/", {data: {ids}});
+    } catch (error) {
+        console.error("OrderItem bulk delete error:", error);
+        throw error;
+    }
+}
+
 export async function deleteOrderItem(id: number) {
     try {
         await api.delete(`/order-items/${id}/`);
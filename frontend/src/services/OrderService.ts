@@ -1,6 +1,7 @@
 import {apiurl} from "./apiconfig.tsx";
-import type {ExistingOrderType, NewOrderType} from "../components/Order/Order.tsx";
+import type {ExistingOrderType, NewOrderType, NewOrderWithItemsType} from "../components/Order/Order.tsx";
 import axios from "axios";
+import {fetchPage, type Page} from "./pagination.ts";
 
 
 const api = axios.create({
@@ -21,6 +22,15 @@ export async function fetchOrders(): Promise<ExistingOrderType[]> {
     }
 }
 
+export async function fetchOrdersPage(cursor: string | null): Promise<Page<ExistingOrderType>> {
+    try {
+        return await fetchPage<ExistingOrderType>(api, "/orders/", cursor);
+    } catch (error) {
+        console.error("Order page fetch error:", error);
+        throw error;
+    }
+}
+
 export async function createOrder(order: NewOrderType): Promise<ExistingOrderType> {
     try {
         const response = await api.post<ExistingOrderType>("/orders/", order);
@@ -31,6 +41,28 @@ export async function createOrder(order: NewOrderType): Promise<ExistingOrderTyp
     }
 }
 
+// Writes the order and all of its items in one request and one transaction
+export async function createOrderWithItems(order: NewOrderWithItemsType): Promise<ExistingOrderType> {
+    try {
+        const response = await api.post<ExistingOrderType>("/orders/bulk/", order);
+        return response.data;
+    } catch (error) {
+        console.error("Order bulk create error:", error);
+        throw error;
+    }
+}
+
+// Items missing from `order.items` are deleted, lines without an id are created
+export async function putOrderWithItems(id: number, order: NewOrderWithItemsType): Promise<ExistingOrderType> {
+    try {
+        const response = await api.put<ExistingOrderType>(`/orders/${id}/bulk/`, order);
+        return response.data;
+    } catch (error) {
+        console.error("Order bulk update error:", error);
+        throw error;
+    }
+}
+
 export async function removeOrder(id: number): Promise<void> {
     try {
         await api.delete(`/orders/${id}/`);
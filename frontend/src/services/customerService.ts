@@ -1,6 +1,7 @@
 import axios from "axios";
 import type {ExistingCustomerType, NewCustomerType} from "../components/Customer/Customer.tsx";
 import { apiurl } from "./apiconfig";
+import {fetchPage, type Page} from "./pagination.ts";
 
 const api = axios.create({
     baseURL: apiurl,
@@ -21,6 +22,15 @@ export async function fetchCustomers(): Promise<ExistingCustomerType[]> {
     }
 }
 
+export async function fetchCustomersPage(cursor: string | null): Promise<Page<ExistingCustomerType>> {
+    try {
+        return await fetchPage<ExistingCustomerType>(api, "/customers/", cursor);
+    } catch (error) {
+        console.error("Customer page fetch error:", error);
+        throw error;
+    }
+}
+
 export async function createCustomer(customer: NewCustomerType): Promise<NewCustomerType> {
     try {
         const response = await api.post<NewCustomerType>("/customers/", customer);
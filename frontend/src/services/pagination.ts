@@ -0,0 +1,23 @@
+import type {AxiosInstance} from "axios";
+
+// Shape of a keyset-paginated list response from the API
+export interface Page<T> {
+    next: string | null;
+    previous: string | null;
+    results: T[];
+}
+
+export const defaultPageSize = 100;
+
+// Fetch one page: the first one from `path`, later ones from the server-built cursor URL
+export async function fetchPage<T>(api: AxiosInstance, path: string, cursor: string | null, pageSize = defaultPageSize): Promise<Page<T>> {
+    const response = cursor
+        ? await api.get<Page<T>>(cursor)
+        : await api.get<Page<T>>(path, {params: {page_size: pageSize}});
+    return response.data;
+}
+
+// Wrap an unpaginated list so hooks can treat both modes the same way
+export function singlePage<T>(results: T[]): Page<T> {
+    return {next: null, previous: null, results};
+}
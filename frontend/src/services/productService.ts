@@ -1,6 +1,7 @@
 import axios from "axios";
 import {apiurl} from "./apiconfig.tsx";
 import type {ExistingProductType, NewProductType} from "../components/Product/Product.tsx";
+import {fetchPage, type Page} from "./pagination.ts";
 
 const api = axios.create({
     baseURL: apiurl,
@@ -17,6 +18,15 @@ export async function fetchProducts(): Promise<ExistingProductType[]> {
     }
 }
 
+export async function fetchProductsPage(cursor: string | null): Promise<Page<ExistingProductType>> {
+    try {
+        return await fetchPage<ExistingProductType>(api, "/products/", cursor);
+    } catch (error) {
+        console.error("Product Page Fetch Error:", error);
+        throw error;
+    }
+}
+
 export async function createProduct(product: NewProductType ): Promise<NewProductType> {
     try {
         const response = await api.post("/products/", product);
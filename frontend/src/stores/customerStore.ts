@@ -5,6 +5,10 @@ interface CustomerUIState {
     editCustomer: number | null;
     setShowAddForm: (show: boolean) => void;
     setEditCustomer: (id: number | null) => void;
+    paginate: boolean;
+    pageCursor: string | null;
+    setPaginate: (paginate: boolean) => void;
+    setPageCursor: (cursor: string | null) => void;
 }
 
 export const useCustomerStore = create<CustomerUIState>((set) => ({
@@ -12,4 +16,8 @@ export const useCustomerStore = create<CustomerUIState>((set) => ({
     editCustomer: null,
     setShowAddForm: (show) => set({ showAddForm: show }),
     setEditCustomer: (id) => set({ editCustomer: id }),
+    paginate: false,
+    pageCursor: null,
+    setPaginate: (paginate) => set({ paginate, pageCursor: null }),
+    setPageCursor: (cursor) => set({ pageCursor: cursor }),
 }))
\ No newline at end of file
@@ -5,6 +5,10 @@ interface OrderUIState {
     editOrderID: number | null; //to display form (edit mode)
     setShowAddForm: (show: boolean) => void;
     setEditProductID: (id: number | null) => void;
+    paginate: boolean; // opt-in keyset pagination of the order list
+    pageCursor: string | null; // cursor URL of the page being shown, null for the first page
+    setPaginate: (paginate: boolean) => void;
+    setPageCursor: (cursor: string | null) => void;
 }
 
 export const useOrderStore = create<OrderUIState>((set) => ({
@@ -12,4 +16,8 @@ export const useOrderStore = create<OrderUIState>((set) => ({
     editOrderID: null,
     setShowAddForm: (show) => set({ showAddForm: show }),
     setEditProductID: (id) => set({ editOrderID: id }),
+    paginate: false,
+    pageCursor: null,
+    setPaginate: (paginate) => set({ paginate, pageCursor: null }),
+    setPageCursor: (cursor) => set({ pageCursor: cursor }),
 }))
\ No newline at end of file
@@ -5,6 +5,10 @@ interface ProductUIState {
     editProductID: number | null; // to display form (edit mode)
     setShowAddForm: (show: boolean) => void;
     setEditProductID: (id: number | null) => void;
+    paginate: boolean; // opt-in keyset pagination of the product list
+    pageCursor: string | null; // cursor URL of the page being shown, null for the first page
+    setPaginate: (paginate: boolean) => void;
+    setPageCursor: (cursor: string | null) => void;
 }
 
 export const useProductStore = create<ProductUIState>((set) => ({
@@ -12,4 +16,8 @@ export const useProductStore = create<ProductUIState>((set) => ({
     editProductID: null,
     setShowAddForm: (show) => set({ showAddForm: show }),
     setEditProductID: (id) => set({ editProductID: id }),
+    paginate: false,
+    pageCursor: null,
+    setPaginate: (paginate) => set({ paginate, pageCursor: null }),
+    setPageCursor: (cursor) => set({ pageCursor: cursor }),
 }))
\ No newline at end of file